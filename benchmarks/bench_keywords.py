@@ -0,0 +1,86 @@
+"""Micro-benchmark for the on_message keyword matcher.
+
+Compares the old lower() + substring scans against KeywordMatcher in each of
+its modes over a corpus of chat-like lines.
+
+    python benchmarks/bench_keywords.py [--lines 200000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from meowbot import DEFAULT_KEYWORDS, KeywordMatcher  # noqa: E402
+
+SAMPLE_LINES = [
+    "lol",
+    "good morning everyone",
+    "meow",
+    "MEOW MEOW MEOW",
+    "did anyone catch the stream last night? that clutch was insane",
+    "brb getting food",
+    "my dog won't stop barking at the mailman",
+    "woof",
+    "meowmeowmeowmeow",
+    "can someone link the rules channel",
+    "gg wp",
+    "I think the new patch nerfed the sniper way too hard tbh",
+    "🐱🐱🐱 meow?",
+    "the cat just knocked my coffee off the desk again",
+    "who's playing valorant tonight, I need 2 more",
+    "Bark bark! (sorry)",
+    "ok",
+    "https://twitch.tv/someone is live go watch",
+    "nah I'm a cat person, meow forever",
+    "what time does the event start?",
+    "hahahaha",
+    "tree bark is actually pretty interesting if you think about it",
+    "this message is long on purpose so the scan has to walk a few hundred characters "
+    "before it finds anything interesting, like when someone pastes a wall of text into "
+    "general chat about their weekend plans and then ends it with a single meow",
+    "Straße meow",
+]
+
+
+def build_corpus(size, seed=1234):
+    rng = random.Random(seed)
+    return [rng.choice(SAMPLE_LINES) for _ in range(size)]
+
+
+def legacy_count(line):
+    """The original on_message logic."""
+    content = line.lower()
+    counts = {}
+    if 'meow' in content:
+        counts['meow'] = content.count('meow')
+    if 'woof' in content or 'bark' in content:
+        counts['bark'] = content.count('woof') + content.count('bark')
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=200_000, help='corpus size')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs per variant (best is reported)')
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.lines)
+    extras = {**DEFAULT_KEYWORDS, 'nya': 'meow', 'purr': 'meow', 'arf': 'bark', 'bork': 'bark'}
+    variants = [
+        ("legacy lower()+count", legacy_count),
+        ("matcher", KeywordMatcher(DEFAULT_KEYWORDS, word_boundary=False, casefold=False).count),
+        ("matcher word-boundary", KeywordMatcher(DEFAULT_KEYWORDS, word_boundary=True, casefold=False).count),
+        ("matcher casefold", KeywordMatcher(DEFAULT_KEYWORDS, word_boundary=False, casefold=True).count),
+        ("matcher +4 guild extras", KeywordMatcher(extras, word_boundary=False, casefold=False).count),
+    ]
+
+    print(f"{len(corpus):,} lines, best of {args.repeat}")
+    for name, count in variants:
+        best = min(timeit.repeat(lambda: [count(line) for line in corpus], number=1, repeat=args.repeat))
+        print(f"  {name:<26} {len(corpus) / best:>12,.0f} lines/s  {best / len(corpus) * 1e9:>8.0f} ns/line")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,551 @@
+"""Offline replay benchmark for the message, command, reminder, poller and EventSub hot paths.
+
+Drives a real TwitchBot without a Discord connection: synthetic messages and
+interactions, a temporary SQLite file and a local fake Twitch server (Helix
+plus EventSub over a websocket). Every scenario uses a fixed seed, so runs
+are comparable across commits.
+
+  messages      TwitchBot.on_message over a chat-like corpus, then a final flush
+  leaderboards  /top_meows and /top_barks against the data the messages left
+  reminders     scheduler insert/cancel, then delivery of a batch of due reminders
+  poller        poll ticks against the fake Helix server with streamers going live/offline
+  eventsub      subscribing every streamer through failures and the subscription
+                limit, then stream.online pushes until the go-live post is sent
+
+    python benchmarks/bench_replay.py [--messages 50000] [--streamers 500] [--ticks 30] [--notifications 100] [--repeat 3]
+                                      [--save results.json] [--compare baseline.json]
+
+--compare exits non-zero when a throughput drops, or a latency or per-item
+cost rises, by more than --tolerance (default 15%) against the baseline.
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import meowbot  # noqa: E402
+from cogs.reminders import ReminderRecord, ReminderScheduler  # noqa: E402
+
+from aiohttp import web  # noqa: E402
+
+CHAT_LINES = [
+    "lol", "good morning everyone", "meow", "MEOW MEOW MEOW", "brb getting food",
+    "my dog won't stop barking at the mailman", "woof", "gg wp", "meowmeowmeowmeow",
+    "did anyone catch the stream last night? that clutch was insane",
+    "can someone link the rules channel", "nah I'm a cat person, meow forever", "ok",
+]
+
+_ids = itertools.count(10**17)
+
+
+class FakeUser:
+    bot = False
+
+    def __init__(self, user_id):
+        self.id = user_id
+        self.display_name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+
+
+class FakeMessage:
+    def __init__(self, message_id, channel=None):
+        self.id = message_id
+        self.channel = channel
+
+    async def edit(self, **kwargs):
+        pass
+
+
+class FakeChannel:
+    def __init__(self, channel_id, guild=None, on_send=None):
+        self.id = channel_id
+        self.guild = guild
+        self.on_send = on_send
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+        if self.on_send:
+            self.on_send()
+        return FakeMessage(next(_ids), self)
+
+    def get_partial_message(self, message_id):
+        return FakeMessage(message_id, self)
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+    def get_member(self, user_id):
+        return FakeUser(user_id)
+
+
+class FakeChatMessage:
+    # commands.Context copies this; no prefixed commands are replayed, so it is never used
+    _state = None
+
+    def __init__(self, author, guild, channel, content):
+        self.id = next(_ids)
+        self.author = author
+        self.guild = guild
+        self.channel = channel
+        self.content = content
+
+
+class FakeResponse:
+    async def defer(self, **kwargs):
+        pass
+
+    async def send_message(self, *args, **kwargs):
+        pass
+
+
+class FakeFollowup:
+    async def send(self, *args, **kwargs):
+        pass
+
+
+class FakeInteraction:
+    def __init__(self, guild, user):
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+        self.extras = {}
+
+
+class FakeTwitch:
+    """Local stand-in for the Twitch token, Helix and EventSub endpoints.
+
+    EventSub follows the websocket transport: /ws greets each connection with
+    session_welcome, notify() pushes an event down the latest one, and new
+    subscriptions are refused with a 429 past SUBSCRIPTION_LIMIT. User ids in
+    fail_once get a 500 on their first subscription attempt.
+    """
+
+    SUBSCRIPTION_LIMIT = 300  # Enabled subscriptions allowed per websocket session
+    PAGE_SIZE = 100
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.live = set()
+        self.requests = []
+        self.subscriptions = {}
+        self.fail_once = set()
+        self.sockets = []
+        self._ids = itertools.count(1)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/token', self.token)
+        app.router.add_get('/helix/users', self.users)
+        app.router.add_get('/helix/streams', self.streams)
+        app.router.add_post('/helix/eventsub/subscriptions', self.subscribe)
+        app.router.add_get('/helix/eventsub/subscriptions', self.list_subscriptions)
+        app.router.add_delete('/helix/eventsub/subscriptions', self.unsubscribe)
+        app.router.add_get('/ws', self.websocket)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def settings(self, **settings):
+        return dict(
+            helix_url=f'http://127.0.0.1:{self.port}/helix', twitch_token_url=f'http://127.0.0.1:{self.port}/token',
+            twitch_client_id='replay', twitch_secret='replay', eventsub_ws_url=f'ws://127.0.0.1:{self.port}/ws',
+            **settings
+        )
+
+    async def close(self):
+        for ws in self.sockets:
+            await ws.close()
+        await self.runner.cleanup()
+
+    async def token(self, request):
+        self.requests.append('token')
+        return web.json_response({'access_token': 'replay', 'expires_in': 3600})
+
+    async def users(self, request):
+        self.requests.append('users')
+        return web.json_response({'data': [{'login': login, 'id': f'id-{login}'} for login in request.query.getall('login')]})
+
+    async def streams(self, request):
+        self.requests.append('streams')
+        data = [
+            {'id': f'stream-{user_id}', 'user_id': user_id, 'user_name': user_id[3:], 'title': 'replay',
+             'game_name': 'Just Chatting', 'viewer_count': self.rng.randrange(1000),
+             'started_at': '2030-01-01T00:00:00Z', 'thumbnail_url': ''}
+            for user_id in request.query.getall('user_id') if user_id[3:] in self.live
+        ]
+        return web.json_response({'data': data})
+
+    async def subscribe(self, request):
+        self.requests.append('subscribe')
+        body = await request.json()
+        user_id = body['condition']['broadcaster_user_id']
+        if user_id in self.fail_once:
+            self.fail_once.discard(user_id)
+            return web.json_response({'error': 'Internal Server Error', 'status': 500}, status=500)
+        for existing in self.subscriptions.values():
+            if (existing['type'], existing['condition'], existing['transport']) == (body['type'], body['condition'], body['transport']):
+                return web.json_response({'error': 'Conflict', 'status': 409}, status=409)
+        if len(self.subscriptions) >= self.SUBSCRIPTION_LIMIT:
+            return web.json_response({'error': 'Too Many Requests', 'status': 429}, status=429)
+        subscription = {
+            'id': f'sub-{next(self._ids)}', 'type': body['type'], 'version': body['version'], 'status': 'enabled',
+            'condition': body['condition'], 'transport': body['transport'], 'created_at': '2030-01-01T00:00:00Z'
+        }
+        self.subscriptions[subscription['id']] = subscription
+        return web.json_response({'data': [subscription], 'total': len(self.subscriptions)}, status=202)
+
+    async def list_subscriptions(self, request):
+        self.requests.append('list')
+        start = int(request.query.get('after', 0))
+        page = list(self.subscriptions.values())[start:start + self.PAGE_SIZE]
+        more = start + self.PAGE_SIZE < len(self.subscriptions)
+        return web.json_response({
+            'data': page, 'total': len(self.subscriptions),
+            'pagination': {'cursor': str(start + self.PAGE_SIZE)} if more else {}
+        })
+
+    async def unsubscribe(self, request):
+        self.requests.append('unsubscribe')
+        if self.subscriptions.pop(request.query.get('id'), None) is None:
+            return web.Response(status=404)
+        return web.Response(status=204)
+
+    async def websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.sockets.append(ws)
+        await ws.send_json({
+            'metadata': {'message_id': f'msg-{next(self._ids)}', 'message_type': 'session_welcome'},
+            'payload': {'session': {'id': f'session-{next(self._ids)}', 'status': 'connected', 'keepalive_timeout_seconds': 30}}
+        })
+        async for _ in ws:
+            pass
+        return ws
+
+    async def notify(self, subscription_type, user_id):
+        login = user_id[3:]
+        await self.sockets[-1].send_json({
+            'metadata': {'message_id': f'msg-{next(self._ids)}', 'message_type': 'notification',
+                         'subscription_type': subscription_type},
+            'payload': {'event': {'id': f'stream-{user_id}', 'broadcaster_user_id': user_id,
+                                  'broadcaster_user_login': login, 'type': 'live',
+                                  'started_at': '2030-01-01T00:00:00Z'}}
+        })
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def drain(bot):
+    """Wait until the outbox has delivered everything queued so far."""
+    while len(bot.outbox):
+        await asyncio.sleep(0.001)
+
+
+def db_writes(bot):
+    return sum(count for labels, count, _, _ in bot.metrics.summary('meowbot_db_seconds') if labels['kind'] == 'write')
+
+
+class Replay:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.directory = tempfile.mkdtemp(prefix='meowbot-replay-')
+        self.results = {}
+
+    async def new_bot(self, name, **settings):
+        settings = meowbot.Settings(database_path=os.path.join(self.directory, f'{name}.db'), **settings)
+        bot = meowbot.create_bot(settings)
+        await bot.__aenter__()
+        await bot.setup_hook()
+        # process_commands compares authors with the logged-in user; stand in for it
+        bot._connection.user = FakeUser(0)
+        # Fake channels have no rate limits; measure the outbox itself, not its buckets
+        bot.outbox.channel_limit = (10**9, 1.0)
+        bot.outbox.global_bucket = meowbot.RateBucket(10**9, 1.0)
+        bot.outbox.start()
+        return bot
+
+    async def close_bot(self, bot):
+        await bot.__aexit__(None, None, None)
+
+    async def messages(self):
+        guilds = [FakeGuild(guild_id) for guild_id in range(1, 6)]
+        channels = [FakeChannel(100 + i, guilds[i % len(guilds)]) for i in range(20)]
+        users = [FakeUser(1000 + i) for i in range(2000)]
+        corpus = [
+            FakeChatMessage(self.rng.choice(users), channel.guild, channel, self.rng.choice(CHAT_LINES))
+            for channel in (self.rng.choice(channels) for _ in range(self.args.messages))
+        ]
+
+        bot = await self.new_bot('messages')
+        latencies = []
+        start = time.perf_counter()
+        for message in corpus:
+            t = time.perf_counter()
+            await bot.on_message(message)
+            latencies.append(time.perf_counter() - t)
+        await bot.counters.flush()
+        elapsed = time.perf_counter() - start
+
+        self.results['messages'] = {
+            'messages_per_sec': len(corpus) / elapsed,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'db_writes_per_message': db_writes(bot) / len(corpus),
+        }
+        self.message_bot = bot
+        self.guilds = guilds
+
+    async def leaderboards(self):
+        bot = self.message_bot
+        meow_cog = bot.get_cog('MeowCog')
+        commands = [meow_cog.top_meows, meow_cog.top_barks]
+        latencies = []
+        start = time.perf_counter()
+        for i in range(self.args.commands):
+            interaction = FakeInteraction(self.guilds[i % len(self.guilds)], FakeUser(1000))
+            t = time.perf_counter()
+            await commands[i % 2].callback(meow_cog, interaction)
+            latencies.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+        self.results['leaderboards'] = {
+            'commands_per_sec': self.args.commands / elapsed,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+        }
+        await self.close_bot(bot)
+
+    async def reminders(self):
+        count = self.args.reminders
+        now = datetime.datetime(2030, 1, 1)
+        reminders = [
+            ReminderRecord(i, self.rng.randrange(500), None, now + datetime.timedelta(seconds=self.rng.randrange(7 * 86400)), 'x')
+            for i in range(count)
+        ]
+
+        scheduler = ReminderScheduler(now)
+        start = time.perf_counter()
+        for reminder in reminders:
+            scheduler.add(reminder)
+        for reminder in reminders[::10]:
+            scheduler.remove(reminder.id)
+        scheduler.pop_due(now + datetime.timedelta(days=8))
+        scheduler_elapsed = time.perf_counter() - start
+
+        # Delivery: a burst of reminders that are all due, handed to the outbox and sent
+        bot = await self.new_bot('reminders')
+        cog = bot.get_cog('RemindersCog')
+        cog.check_reminders.cancel()
+        channels = {}
+        bot.get_channel = lambda channel_id: channels.setdefault(channel_id, FakeChannel(channel_id))
+        due = min(count, 2000)
+        for i in range(due):
+            # Spread over 20 channels, with every tenth reminder repeating daily
+            row = await bot.repo.add_reminder(1000 + i % 50, 1 + i % 20, datetime.datetime(2000, 1, 1), 'replay',
+                                              'daily' if i % 10 == 0 else None)
+            cog.scheduler.add(ReminderRecord.from_row(row))
+        writes_before = db_writes(bot)
+        start = time.perf_counter()
+        await cog.check_reminders.coro(cog)
+        await drain(bot)
+        delivery_elapsed = time.perf_counter() - start
+
+        self.results['reminders'] = {
+            'scheduler_ops_per_sec': (count + count // 10 + count) / scheduler_elapsed,
+            'deliveries_per_sec': due / delivery_elapsed,
+            'db_writes_per_delivery': (db_writes(bot) - writes_before) / due,
+            'messages_per_delivery': sum(channel.sent for channel in channels.values()) / due,
+        }
+        await self.close_bot(bot)
+
+    async def poller(self):
+        streamers = [f'streamer{i}' for i in range(self.args.streamers)]
+        fake = FakeTwitch(self.rng)
+        await fake.start()
+        live = fake.live
+        requests = fake.requests
+
+        bot = await self.new_bot('poller', **fake.settings())
+        channels = {}
+        bot.get_channel = lambda channel_id: channels.setdefault(channel_id, FakeChannel(channel_id))
+        for i, login in enumerate(streamers):
+            # A few popular streamers followed by many guilds, most followed by one or two
+            for guild_id in range(1, 2 + (40 if i < 5 else i % 2)):
+                bot.streamers.add(login, guild_id, 10_000 + guild_id)
+
+        latencies = []
+        requests_per_tick = []
+        writes_before = db_writes(bot)
+        start = time.perf_counter()
+        for tick in range(self.args.ticks):
+            # About 10% of streamers live; each tick some go live and some end
+            for login in streamers:
+                if self.rng.random() < 0.02:
+                    live.symmetric_difference_update({login})
+            sent_before = len(requests)
+            t = time.perf_counter()
+            await bot.poll_streamers(streamers, time.monotonic(), False)
+            latencies.append(time.perf_counter() - t)
+            requests_per_tick.append(len(requests) - sent_before)
+            await drain(bot)
+        elapsed = time.perf_counter() - start
+
+        self.results['poller'] = {
+            'ticks_per_sec': self.args.ticks / elapsed,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            # The first tick also resolves user ids; report steady state
+            'http_requests_per_tick': statistics.mean(requests_per_tick[1:] or requests_per_tick),
+            'db_writes_per_tick': (db_writes(bot) - writes_before) / self.args.ticks,
+            'messages_sent_per_tick': sum(channel.sent for channel in channels.values()) / self.args.ticks,
+        }
+        await self.close_bot(bot)
+        await fake.close()
+
+    async def eventsub(self):
+        streamers = [f'streamer{i}' for i in range(self.args.streamers)]
+        fake = FakeTwitch(self.rng)
+        # Every tenth streamer's first subscription attempt hits a server error
+        fake.fail_once = {f'id-{login}' for login in streamers[::10]}
+        await fake.start()
+
+        # The injected failures and the limit are logged as errors; they are expected here
+        logging.getLogger('meowbot.twitch').setLevel(logging.CRITICAL)
+
+        bot = await self.new_bot('eventsub', **fake.settings(eventsub_mode='websocket', eventsub_user_token='replay'))
+        sent = asyncio.Event()
+        channels = {}
+        bot.get_channel = lambda channel_id: channels.setdefault(channel_id, FakeChannel(channel_id, on_send=sent.set))
+        for login in streamers:
+            bot.streamers.add(login, 1, 10_001)
+        eventsub = bot.eventsub
+        await bot.get_twitch_token()
+        await eventsub.start()
+        while not eventsub.session_id:
+            await asyncio.sleep(0.001)
+
+        # The first tick resolves ids and subscribes until the limit; the next retries the failures
+        await bot.poll_streamers(streamers, time.monotonic(), True)
+        eventsub.retry_at.clear()
+        eventsub.blocked_until = 0.0
+        await bot.poll_streamers(streamers, time.monotonic(), True)
+        covered = [user_id for user_id in bot.tracked_user_ids() if eventsub.covers(user_id)]
+
+        # Push go-lives one at a time and time each until its post reaches the channel
+        latencies = []
+        start = time.perf_counter()
+        for user_id in covered[:self.args.notifications]:
+            fake.live.add(user_id[3:])
+            sent.clear()
+            t = time.perf_counter()
+            await fake.notify('stream.online', user_id)
+            await sent.wait()
+            latencies.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+
+        self.results['eventsub'] = {
+            'notifications_per_sec': len(latencies) / elapsed if latencies else 0.0,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'subscribe_requests_per_covered': fake.requests.count('subscribe') / max(1, len(covered)),
+            # Left on the adaptive poller: past the subscription limit, or still failing
+            'uncovered_streamers': len(streamers) - len(covered),
+        }
+        await self.close_bot(bot)
+        await fake.close()
+
+    async def run(self):
+        await self.messages()
+        await self.leaderboards()
+        await self.reminders()
+        await self.poller()
+        await self.eventsub()
+        return self.results
+
+
+# Metrics where a higher value is better; everything else regresses by going up
+HIGHER_IS_BETTER = ('_per_sec',)
+
+
+def best_of(runs):
+    """Merge repeated runs, keeping the best value of each metric to damp scheduler noise."""
+    best = {}
+    for scenario, metrics in runs[0].items():
+        best[scenario] = {
+            name: (max if name.endswith(HIGHER_IS_BETTER) else min)(run[scenario][name] for run in runs)
+            for name in metrics
+        }
+    return best
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for scenario, metrics in results.items():
+        for name, value in metrics.items():
+            before = baseline.get(scenario, {}).get(name)
+            if not before:
+                continue
+            change = (value - before) / before
+            worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+            flag = '  REGRESSION' if worse > tolerance else ''
+            print(f"  {scenario + '.' + name:<40} {before:>12.3f} -> {value:>12.3f}  {change:+7.1%}{flag}")
+            if flag:
+                regressions.append(f'{scenario}.{name}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=50_000, help='chat messages to replay')
+    parser.add_argument('--commands', type=int, default=2_000, help='leaderboard commands to replay')
+    parser.add_argument('--reminders', type=int, default=50_000, help='reminders for the scheduler run')
+    parser.add_argument('--streamers', type=int, default=500, help='tracked streamers for the poller run')
+    parser.add_argument('--ticks', type=int, default=30, help='poller ticks')
+    parser.add_argument('--notifications', type=int, default=100, help='stream.online pushes for the EventSub run')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per scenario (best is reported)')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--save', help='write results as JSON')
+    parser.add_argument('--compare', help='baseline JSON from an earlier --save')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative regression for --compare')
+    args = parser.parse_args()
+
+    results = best_of([asyncio.run(Replay(args).run()) for _ in range(args.repeat)])
+
+    for scenario, metrics in results.items():
+        print(scenario)
+        for name, value in metrics.items():
+            print(f"  {name:<28} {value:>14,.3f}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"compared with {args.compare} (tolerance {args.tolerance:.0%})")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            sys.exit(f"regressed: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
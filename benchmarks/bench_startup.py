@@ -0,0 +1,102 @@
+"""Startup benchmark: how long until the bot is ready.
+
+Runs each phase in a fresh interpreter and reports the best and median of
+several runs:
+
+  import      `import meowbot` (should do no I/O)
+  create      create_bot(): settings, lazy database init, bot object
+  setup_hook  migrations, state loads, cog extensions
+  ready       login and gateway connection until on_ready (--live only)
+
+    python benchmarks/bench_startup.py [--runs 5] [--database PATH] [--live]
+
+Each run uses a fresh temporary database unless --database is given (it is
+copied first, so a real database can be measured without modifying it).
+--live needs DISCORD_BOT_TOKEN and connects to Discord.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Runs in the child interpreter; prints one JSON object with phase timings in seconds
+CHILD = r'''
+import time
+start = time.perf_counter()
+import asyncio, json, os, shutil, sys, tempfile
+timings = {}
+sys.path.insert(0, REPO_DIR)
+t = time.perf_counter()
+import meowbot
+timings['import'] = time.perf_counter() - t
+
+async def run():
+    database = os.path.join(tempfile.mkdtemp(prefix='meowbot-startup-'), 'bot_data.db')
+    if SOURCE_DB:
+        shutil.copy(SOURCE_DB, database)
+    settings = meowbot.Settings.from_env(dotenv=LIVE)
+    settings = meowbot.Settings(**{**settings.__dict__, 'database_path': database})
+    t = time.perf_counter()
+    bot = meowbot.create_bot(settings)
+    timings['create'] = time.perf_counter() - t
+    if LIVE:
+        # setup_hook runs inside login(); time it separately from the gateway connect
+        original = bot.setup_hook
+        async def timed_setup_hook():
+            t = time.perf_counter()
+            await original()
+            timings['setup_hook'] = time.perf_counter() - t
+        bot.setup_hook = timed_setup_hook
+        t = time.perf_counter()
+        task = asyncio.create_task(bot.start(settings.discord_bot_token))
+        await bot.wait_until_ready()
+        timings['ready'] = time.perf_counter() - t - timings['setup_hook']
+        timings['total'] = time.perf_counter() - start
+        await bot.close()
+        await task
+    else:
+        # Entering the client initialises it as login() would, minus the network
+        async with bot:
+            t = time.perf_counter()
+            await bot.setup_hook()
+            timings['setup_hook'] = time.perf_counter() - t
+            timings['total'] = time.perf_counter() - start
+
+asyncio.run(run())
+print(json.dumps(timings))
+'''
+
+
+def run_once(source_db, live):
+    code = f'REPO_DIR = {REPO_DIR!r}\nSOURCE_DB = {source_db!r}\nLIVE = {live!r}\n' + CHILD
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"Startup run failed:\n{result.stderr}")
+    # The bot prints progress; the timings are the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to time')
+    parser.add_argument('--database', help='database to copy into each run instead of starting empty')
+    parser.add_argument('--live', action='store_true', help='also connect to Discord and time until on_ready')
+    args = parser.parse_args()
+
+    if args.live and not os.getenv('DISCORD_BOT_TOKEN'):
+        parser.error('--live needs DISCORD_BOT_TOKEN')
+    source_db = os.path.abspath(args.database) if args.database else None
+
+    runs = [run_once(source_db, args.live) for _ in range(args.runs)]
+    print(f"{args.runs} runs, {'copy of ' + args.database if args.database else 'empty database'}")
+    for phase in runs[0]:
+        values = [run[phase] * 1000 for run in runs]
+        print(f"  {phase:<11} best {min(values):>8.1f} ms   median {statistics.median(values):>8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
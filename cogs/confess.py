@@ -0,0 +1,136 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+import logging
+
+from meowbot import Outbox, TwitchBot
+
+log = logging.getLogger('meowbot.confess')
+
+class ConfessionButtons(discord.ui.View):
+    def __init__(self, bot):
+        super().__init__(timeout=None)  # Persistent view
+        self.bot = bot
+
+    @discord.ui.button(label="Submit a confession!", style=discord.ButtonStyle.blurple, emoji="💭")
+    async def submit_confession(self, interaction: discord.Interaction, button: discord.ui.Button):
+        """Button to submit a new confession"""
+        # Check if we're in the confessions channel
+        if interaction.channel_id != self.bot.settings.confess_channel_id:
+            await interaction.response.send_message(
+                "❌ You can only submit confessions in the confessions channel.",
+                ephemeral=True
+            )
+            return
+        
+        # Create a modal for confession input
+        modal = ConfessionModal(self.bot)
+        await interaction.response.send_modal(modal)
+
+class ConfessionModal(discord.ui.Modal):
+    def __init__(self, bot):
+        super().__init__(title="Submit Anonymous Confession")
+        self.bot = bot
+
+    confession_text = discord.ui.TextInput(
+        label="Your Confession",
+        placeholder="Type your anonymous confession here...",
+        style=discord.TextStyle.paragraph,
+        max_length=2000,
+        required=True
+    )
+
+    async def on_submit(self, interaction: discord.Interaction):
+        confess_cog = self.bot.get_cog('ConfessCog')
+        if not confess_cog:
+            await interaction.response.send_message("❌ Error: Confession system not available.", ephemeral=True)
+            return
+        await confess_cog.post_confession(interaction, self.confession_text.value)
+
+class ConfessCog(commands.Cog):
+    def __init__(self, bot: TwitchBot):
+        super().__init__()
+        self.bot = bot
+
+    async def post_confession(self, interaction: discord.Interaction, text: str):
+        """Number a confession, post it, then queue its log entry."""
+        confess_channel = self.bot.get_channel(self.bot.settings.confess_channel_id)
+        if not confess_channel:
+            await interaction.response.send_message(
+                "❌ Confessions channel not found.",
+                ephemeral=True
+            )
+            return
+
+        try:
+            number = await self.bot.repo.next_confession_number()
+        except Exception as e:
+            log.error("Error numbering confession: %s", e)
+            await interaction.response.send_message(
+                "❌ Something went wrong sending your confession. Please try again.",
+                ephemeral=True
+            )
+            return
+
+        embed = discord.Embed(
+            title=f"💭 Anonymous Confession (#{number})",
+            description=text,
+            color=discord.Color.blurple()
+        )
+        try:
+            # Add the buttons to the confession embed
+            await confess_channel.send(embed=embed, view=ConfessionButtons(self.bot))
+        except Exception as e:
+            log.error("Error posting confession #%s: %s", number, e)
+            # Hand the number back so a failed post doesn't leave a gap in the numbering
+            try:
+                await self.bot.repo.release_confession_number(number)
+            except Exception as e:
+                log.error("Error releasing confession #%s: %s", number, e)
+            await interaction.response.send_message(
+                "❌ Something went wrong sending your confession. Please try again.",
+                ephemeral=True
+            )
+            return
+
+        # Log confession with username to the log channel, through the outbox so it isn't lost.
+        # Queued only once the confession is up, so a released number is never logged twice.
+        if self.bot.settings.confess_log_channel_id:
+            log_embed = discord.Embed(
+                title=f"Confession Log (#{number})",
+                description=text,
+                color=discord.Color.red()
+            )
+            log_embed.set_footer(text=f"User: {interaction.user} ({interaction.user.id})")
+            try:
+                await self.bot.outbox.enqueue(
+                    [Outbox.message('confession_log', channel_id=self.bot.settings.confess_log_channel_id, embed=log_embed)]
+                )
+            except Exception as e:
+                log.error("Error queueing log for confession #%s: %s", number, e)
+
+        await interaction.response.send_message(
+            "✅ Your confession has been sent anonymously.",
+            ephemeral=True
+        )
+
+    @app_commands.command(
+        name="confess",
+        description="Send an anonymous confession to the confessions channel."
+    )
+    @app_commands.describe(
+        message="What do you want to confess?"
+    )
+    async def confess(self, interaction: discord.Interaction, message: str):
+        # Only allow in the confessions channel
+        if interaction.channel_id != self.bot.settings.confess_channel_id:
+            await interaction.response.send_message(
+                "❌ You can only use this command in the confessions channel.",
+                ephemeral=True
+            )
+            return
+
+        await self.post_confession(interaction, message)
+
+async def setup(bot):
+    await bot.add_cog(ConfessCog(bot))
@@ -0,0 +1,161 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+import logging
+
+from meowbot import DM_GUILD_ID, LEADERBOARD_SIZE, TwitchBot
+
+log = logging.getLogger('meowbot.meow')
+
+class MeowCog(commands.Cog):
+    def __init__(self, bot: TwitchBot):
+        super().__init__()
+        self.bot = bot
+
+    async def add_leaderboard_fields(self, embed, guild, entries, label):
+        """Add one field per leaderboard entry, resolving names in a single batch."""
+        names = await self.bot.display_names.resolve(guild, [user_id for user_id, _ in entries])
+        for i, (user_id, count) in enumerate(entries, 1):
+            embed.add_field(
+                name=f"{i}. {names[user_id]}",
+                value=f"{label}: {count}",
+                inline=False
+            )
+
+    @app_commands.command(name="top_meows")
+    async def top_meows(self, interaction: discord.Interaction):
+        """Check the top meow users"""
+        try:
+            await interaction.response.defer()
+            
+            # Served from memory; reflects counts as of the last counter flush
+            guild_id = interaction.guild_id or DM_GUILD_ID
+            leaderboard = await self.bot.counters.meow_leaderboard(guild_id)
+            all_meow_counts = leaderboard.ranked()
+
+            if not all_meow_counts:
+                await interaction.followup.send("No users have said 'meow' yet.")
+                return
+
+            embed = discord.Embed(
+                title="🏆 Top Meow Users",
+                description=f"Here are the top {LEADERBOARD_SIZE} meow users:",
+                color=discord.Color.blue()
+            )
+            await self.add_leaderboard_fields(embed, interaction.guild, all_meow_counts, "Meows")
+
+            await interaction.followup.send(embed=embed)
+        except Exception as e:
+            log.error("Error in top_meows command: %s", e)
+            await interaction.followup.send("❌ An error occurred while fetching top meows.", ephemeral=True)
+
+    @app_commands.command(name="top_barks")
+    async def top_barks(self, interaction: discord.Interaction):
+        """Check the top bark users"""
+        try:
+            await interaction.response.defer()
+            
+            guild_id = interaction.guild_id or DM_GUILD_ID
+            leaderboard = await self.bot.counters.bark_leaderboard(guild_id)
+            all_infractions = leaderboard.ranked()
+
+            if not all_infractions:
+                await interaction.followup.send("No barks recorded yet.")
+                return
+
+            embed = discord.Embed(
+                title="😾 Top Bark/Woof Users",
+                description=f"Here are the top {LEADERBOARD_SIZE} users who need to remember we're cat people:",
+                color=discord.Color.red()
+            )
+            await self.add_leaderboard_fields(embed, interaction.guild, all_infractions, "Barks/Woofs")
+
+            await interaction.followup.send(embed=embed)
+        except Exception as e:
+            log.error("Error in top_barks command: %s", e)
+            await interaction.followup.send("❌ An error occurred while fetching top barks.", ephemeral=True)
+
+    @app_commands.command(name="meow_count")
+    async def meow_count(self, interaction: discord.Interaction):
+        """Check your meow count"""
+        try:
+            await interaction.response.defer()
+            
+            # Includes meows still waiting in the write-behind buffer
+            total = await self.bot.counters.get_meow_count(interaction.guild_id or DM_GUILD_ID, interaction.user.id)
+
+            if total:
+                embed = discord.Embed(
+                    title="😺 Your Meow Stats",
+                    description=f"You have meowed {total} times!",
+                    color=discord.Color.green()
+                )
+            else:
+                embed = discord.Embed(
+                    title="😿 Your Meow Stats",
+                    description="You haven't meowed yet! Try saying meow in chat!",
+                    color=discord.Color.orange()
+                )
+
+            await interaction.followup.send(embed=embed)
+        except Exception as e:
+            log.error("Error in meow_count command: %s", e)
+            await interaction.followup.send("❌ An error occurred while fetching your meow count.", ephemeral=True)
+
+    @app_commands.command(name="add_keyword")
+    @app_commands.describe(
+        keyword="Word to count",
+        category="Count it as a meow or as a bark"
+    )
+    @app_commands.choices(category=[
+        app_commands.Choice(name="meow", value="meow"),
+        app_commands.Choice(name="bark", value="bark")
+    ])
+    @app_commands.guild_only()
+    async def add_keyword(self, interaction: discord.Interaction, keyword: str, category: app_commands.Choice[str]):
+        """Count an extra word as a meow or a bark in this server."""
+        if not interaction.user.guild_permissions.manage_guild:
+            await interaction.response.send_message("❌ You need the 'Manage Server' permission to use this command.", ephemeral=True)
+            return
+
+        keyword = keyword.strip().lower()
+        if not keyword or len(keyword) > 32:
+            await interaction.response.send_message("❌ Keywords must be between 1 and 32 characters.", ephemeral=True)
+            return
+
+        try:
+            await self.bot.repo.save_guild_keyword(interaction.guild_id, keyword, category.value)
+            keywords = dict(self.bot.keywords.guild_keywords.get(interaction.guild_id, {}))
+            keywords[keyword] = category.value
+            self.bot.keywords.set_guild_keywords(interaction.guild_id, keywords)
+            await interaction.response.send_message(f"✅ **{keyword}** now counts as a {category.value}.", ephemeral=True)
+        except Exception as e:
+            log.error("Error in add_keyword command: %s", e)
+            await interaction.response.send_message("❌ An error occurred while saving the keyword.", ephemeral=True)
+
+    @app_commands.command(name="remove_keyword")
+    @app_commands.describe(keyword="Extra word to stop counting")
+    @app_commands.guild_only()
+    async def remove_keyword(self, interaction: discord.Interaction, keyword: str):
+        """Stop counting an extra word in this server."""
+        if not interaction.user.guild_permissions.manage_guild:
+            await interaction.response.send_message("❌ You need the 'Manage Server' permission to use this command.", ephemeral=True)
+            return
+
+        keyword = keyword.strip().lower()
+        keywords = dict(self.bot.keywords.guild_keywords.get(interaction.guild_id, {}))
+        if keyword not in keywords:
+            await interaction.response.send_message("This keyword isn't configured for this server.", ephemeral=True)
+            return
+
+        try:
+            await self.bot.repo.delete_guild_keyword(interaction.guild_id, keyword)
+            del keywords[keyword]
+            self.bot.keywords.set_guild_keywords(interaction.guild_id, keywords)
+            await interaction.response.send_message(f"🚫 Stopped counting **{keyword}**.", ephemeral=True)
+        except Exception as e:
+            log.error("Error in remove_keyword command: %s", e)
+            await interaction.response.send_message("❌ An error occurred while removing the keyword.", ephemeral=True)
+
+async def setup(bot):
+    await bot.add_cog(MeowCog(bot))
@@ -0,0 +1,362 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+import asyncio
+import datetime
+import logging
+import re
+from typing import Optional
+
+from meowbot import TwitchBot
+
+log = logging.getLogger('meowbot.polls')
+
+# Number emojis for reactions (using Discord's number emojis)
+NUMBER_EMOJIS = ["1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
+
+class PollTally:
+    """Live vote counts for one poll, kept current from raw reaction events.
+
+    votes maps user id -> the options they have reacted with, oldest first.
+    In a single-choice poll only a user's most recent reaction counts, so
+    switching options moves their vote and removing the latest reaction
+    falls back to the one before it. counts is updated incrementally.
+    """
+
+    def __init__(self, poll):
+        self.poll = poll
+        self.votes = {}
+        self.counts = [0] * len(poll['options'])
+        # After a restart the current reactions are read once (the loading
+        # task); events that arrive meanwhile are held in pending and replayed
+        self.loaded = False
+        self.loading = None
+        self.pending = []
+        self.edit_task = None
+
+    @property
+    def single_choice(self):
+        return self.poll['single_choice']
+
+    def counted(self, options):
+        if not options:
+            return ()
+        return options[-1:] if self.single_choice else options
+
+    def add(self, user_id, option):
+        options = self.votes.setdefault(user_id, [])
+        if option in options:
+            return False
+        before = list(self.counted(options))
+        options.append(option)
+        return self._recount(before, self.counted(options))
+
+    def remove(self, user_id, option):
+        options = self.votes.get(user_id)
+        if not options or option not in options:
+            return False
+        before = list(self.counted(options))
+        options.remove(option)
+        if not options:
+            del self.votes[user_id]
+        return self._recount(before, self.counted(options))
+
+    def clear(self, option=None):
+        """Drop every vote, or every vote for one option (a moderator cleared reactions)."""
+        if option is None:
+            self.votes = {}
+            self.counts = [0] * len(self.counts)
+            return True
+        changed = False
+        for user_id in [user_id for user_id, options in self.votes.items() if option in options]:
+            changed = self.remove(user_id, option) or changed
+        return changed
+
+    def _recount(self, before, after):
+        for option in before:
+            self.counts[option] -= 1
+        for option in after:
+            self.counts[option] += 1
+        return list(before) != list(after)
+
+    @property
+    def voters(self):
+        return len(self.votes)
+
+def option_for(emoji):
+    """Return the option index for a reaction emoji, or None if it isn't a poll number."""
+    try:
+        return NUMBER_EMOJIS.index(str(emoji))
+    except ValueError:
+        return None
+
+class PollsCog(commands.Cog):
+    # Live result edits wait this long so a burst of votes becomes one edit
+    LIVE_EDIT_DELAY = 5.0
+
+    def __init__(self, bot: TwitchBot):
+        super().__init__()
+        self.bot = bot
+        # poll message id -> PollTally
+        self.polls = {}
+        # poll message id -> task reading a live poll's votes after a restart, then editing it
+        self.load_tasks = {}
+
+    async def cog_load(self):
+        try:
+            for poll in await self.bot.repo.load_polls():
+                self.polls[poll['message_id']] = PollTally(poll)
+            log.info("Loaded %s polls", len(self.polls))
+        except Exception as e:
+            log.error("Error loading polls: %s", e)
+
+    async def cog_unload(self):
+        for task in self.load_tasks.values():
+            task.cancel()
+        for tally in self.polls.values():
+            if tally.loading:
+                tally.loading.cancel()
+            if tally.edit_task:
+                tally.edit_task.cancel()
+
+    def build_embed(self, tally, results=False):
+        poll = tally.poll
+        embed = discord.Embed(
+            title="📊 Poll",
+            description=f"**{poll['question']}**",
+            color=discord.Color.blue(),
+            timestamp=poll['created_at'].replace(tzinfo=datetime.timezone.utc)
+        )
+
+        # Add choices to embed, with their votes once results are shown
+        choices_text = ""
+        for i, choice in enumerate(poll['options']):
+            if results:
+                choices_text += f"{NUMBER_EMOJIS[i]} {choice} — **{tally.counts[i]}**\n"
+            else:
+                choices_text += f"{NUMBER_EMOJIS[i]} {choice}\n"
+
+        embed.add_field(
+            name="Choices:",
+            value=choices_text,
+            inline=False
+        )
+
+        footer = f"Poll created by {poll['author_name']}"
+        if poll['single_choice']:
+            footer += " · one vote per person"
+        if results:
+            footer += f" · {tally.voters} voter{'s' if tally.voters != 1 else ''}"
+        embed.set_footer(text=footer)
+        return embed
+
+    @app_commands.command(name="poll")
+    @app_commands.describe(
+        question="The poll question",
+        choices="Poll choices separated by commas (max 10 choices)",
+        single_choice="Only count each person's latest vote",
+        live_results="Keep the vote counts on the poll up to date"
+    )
+    async def poll(self, interaction: discord.Interaction, question: str, choices: str,
+                   single_choice: bool = False, live_results: bool = False):
+        """Create a poll with reaction voting."""
+        # Parse choices by splitting on commas and cleaning up
+        choice_list = [choice.strip() for choice in choices.split(',') if choice.strip()]
+
+        # Validate number of choices
+        if len(choice_list) < 2:
+            await interaction.response.send_message(
+                "❌ You need at least 2 choices for a poll. Separate choices with commas.",
+                ephemeral=True
+            )
+            return
+
+        if len(choice_list) > 10:
+            await interaction.response.send_message(
+                "❌ Maximum 10 choices allowed per poll.",
+                ephemeral=True
+            )
+            return
+
+        poll = {
+            'message_id': None,
+            'channel_id': interaction.channel_id,
+            'guild_id': interaction.guild_id,
+            'question': question,
+            'options': choice_list,
+            'author_name': interaction.user.display_name,
+            'single_choice': single_choice,
+            'live_results': live_results,
+            'created_at': datetime.datetime.utcnow()
+        }
+        tally = PollTally(poll)
+        tally.loaded = True
+
+        # Send the poll
+        await interaction.response.send_message(embed=self.build_embed(tally, results=live_results))
+
+        # Get the message to add reactions
+        poll_message = await interaction.original_response()
+        poll['message_id'] = poll_message.id
+        self.polls[poll_message.id] = tally
+        try:
+            await self.bot.repo.save_poll(poll)
+        except Exception as e:
+            log.error("Error saving poll %s: %s", poll_message.id, e)
+
+        # Queue every reaction at once: discord.py's rate limiter releases them in
+        # order as the reaction bucket allows, with no round trip between them
+        results = await asyncio.gather(
+            *(poll_message.add_reaction(emoji) for emoji in NUMBER_EMOJIS[:len(choice_list)]),
+            return_exceptions=True
+        )
+        for emoji, result in zip(NUMBER_EMOJIS, results):
+            if isinstance(result, Exception):
+                # The other reactions are still added even if one fails
+                log.error("Error adding reaction %s: %s", emoji, result)
+
+    @app_commands.command(name="poll_results")
+    @app_commands.describe(
+        poll="Link or message ID of the poll (defaults to the latest poll in this channel)"
+    )
+    async def poll_results(self, interaction: discord.Interaction, poll: Optional[str] = None):
+        """Show the current results of a poll."""
+        if poll:
+            digits = re.findall(r'\d+', poll)
+            tally = self.polls.get(int(digits[-1])) if digits else None
+        else:
+            in_channel = [tally for tally in self.polls.values() if tally.poll['channel_id'] == interaction.channel_id]
+            tally = max(in_channel, key=lambda tally: tally.poll['message_id'], default=None)
+
+        if tally is None:
+            await interaction.response.send_message("❌ Couldn't find that poll.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        try:
+            await self.ensure_loaded(tally)
+        except discord.NotFound:
+            await self.forget([tally.poll['message_id']])
+            await interaction.followup.send("❌ That poll has been deleted.", ephemeral=True)
+            return
+        except discord.HTTPException as e:
+            log.error("Error reading poll %s: %s", tally.poll['message_id'], e)
+            await interaction.followup.send("❌ Couldn't read that poll's votes right now.", ephemeral=True)
+            return
+        await interaction.followup.send(embed=self.build_embed(tally, results=True), ephemeral=True)
+
+    async def ensure_loaded(self, tally):
+        """Count the reactions already on a poll the first time it is used after a restart."""
+        if tally.loaded:
+            return
+        if tally.loading is None:
+            tally.loading = asyncio.create_task(self.load_votes(tally))
+        try:
+            await asyncio.shield(tally.loading)
+        finally:
+            if not tally.loaded:
+                tally.loading = None
+
+    async def load_votes(self, tally):
+        poll = tally.poll
+        channel = self.bot.get_channel(poll['channel_id']) or self.bot.get_partial_messageable(poll['channel_id'])
+        message = await channel.fetch_message(poll['message_id'])
+        for reaction in message.reactions:
+            option = option_for(reaction.emoji)
+            if option is None or option >= len(tally.counts):
+                continue
+            async for user in reaction.users():
+                if user.id != self.bot.user.id:
+                    tally.add(user.id, option)
+        for added, user_id, option in tally.pending:
+            (tally.add if added else tally.remove)(user_id, option)
+        tally.pending = []
+        tally.loaded = True
+
+    async def apply(self, payload, added):
+        tally = self.polls.get(payload.message_id)
+        if tally is None or payload.user_id == self.bot.user.id:
+            return
+        option = option_for(payload.emoji)
+        if option is None or option >= len(tally.counts):
+            return
+        if not tally.loaded:
+            if tally.loading:
+                tally.pending.append((added, payload.user_id, option))
+            elif tally.poll['live_results'] and payload.message_id not in self.load_tasks:
+                # Live polls need a full count to show; others wait for /poll_results
+                self.load_tasks[payload.message_id] = asyncio.create_task(self.load_and_edit(tally))
+            return
+        changed = tally.add(payload.user_id, option) if added else tally.remove(payload.user_id, option)
+        if changed:
+            self.schedule_edit(tally)
+
+    async def load_and_edit(self, tally):
+        try:
+            await self.ensure_loaded(tally)
+            self.schedule_edit(tally)
+        except discord.HTTPException as e:
+            log.error("Error reading poll %s: %s", tally.poll['message_id'], e)
+        finally:
+            self.load_tasks.pop(tally.poll['message_id'], None)
+
+    def schedule_edit(self, tally):
+        if tally.poll['live_results'] and tally.edit_task is None:
+            tally.edit_task = asyncio.create_task(self.edit_results(tally))
+
+    async def edit_results(self, tally):
+        """Edit the poll to show its counts, once per LIVE_EDIT_DELAY however many votes arrive."""
+        try:
+            await asyncio.sleep(self.LIVE_EDIT_DELAY)
+            poll = tally.poll
+            channel = self.bot.get_channel(poll['channel_id']) or self.bot.get_partial_messageable(poll['channel_id'])
+            with self.bot.metrics.timer('meowbot_discord_request_seconds', call='message.edit'):
+                await channel.get_partial_message(poll['message_id']).edit(embed=self.build_embed(tally, results=True))
+        except discord.NotFound:
+            await self.forget([tally.poll['message_id']])
+        except discord.HTTPException as e:
+            log.error("Error updating poll %s: %s", tally.poll['message_id'], e)
+        finally:
+            tally.edit_task = None
+
+    async def forget(self, message_ids):
+        forgotten = [message_id for message_id in message_ids if self.polls.pop(message_id, None)]
+        if forgotten:
+            try:
+                await self.bot.repo.delete_polls(forgotten)
+            except Exception as e:
+                log.error("Error removing polls: %s", e)
+
+    # Raw events so votes on polls that aren't in the message cache still count
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        await self.apply(payload, added=True)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        await self.apply(payload, added=False)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear(self, payload):
+        tally = self.polls.get(payload.message_id)
+        if tally and tally.loaded and tally.clear():
+            self.schedule_edit(tally)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload):
+        tally = self.polls.get(payload.message_id)
+        option = option_for(payload.emoji)
+        if tally and tally.loaded and option is not None and tally.clear(option):
+            self.schedule_edit(tally)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        await self.forget([payload.message_id])
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        await self.forget(payload.message_ids)
+
+async def setup(bot):
+    await bot.add_cog(PollsCog(bot))
@@ -0,0 +1,574 @@
+import discord
+from discord.ext import commands, tasks
+from discord import app_commands
+import datetime
+import asyncio
+import heapq
+import logging
+import math
+from collections import defaultdict
+from typing import Optional
+import parsedatetime
+
+from meowbot import Outbox, TwitchBot
+
+log = logging.getLogger('meowbot.reminders')
+
+class ReminderRecord:
+    """One pending reminder, kept small since hundreds of thousands can be scheduled."""
+
+    __slots__ = ('id', 'user_id', 'channel_id', 'remind_time', 'text', 'repeat', 'tick', 'bucket')
+
+    def __init__(self, id, user_id, channel_id, remind_time, text, repeat=None):
+        self.id = id
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.remind_time = remind_time
+        self.text = text
+        self.repeat = repeat
+        self.tick = None
+        self.bucket = None
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a record from a Repository reminder dict."""
+        return cls(row['id'], row['user_id'], row['channel_id'], row['remind_time'], row['text'], row.get('repeat'))
+
+class CronSchedule:
+    """Five-field cron expression (minute hour day-of-month month day-of-week).
+
+    Fields take '*', numbers, ranges (1-5), lists (1,15) and steps (*/15);
+    day-of-week is 0-6 from Sunday, with 7 also meaning Sunday. As in cron,
+    when both day fields are restricted a day matching either one counts.
+    """
+
+    FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7))
+    # How far ahead next_after() looks before deciding an expression never matches
+    SEARCH_DAYS = 366 * 5
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError("a cron expression has five fields: minute hour day month weekday")
+        values = [self._parse(part, name, low, high) for part, (name, low, high) in zip(parts, self.FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = values
+        # Sunday is 0 or 7 in cron; Python's weekday() is 0 for Monday
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+
+    @staticmethod
+    def _parse(field, name, low, high):
+        values = set()
+        for item in field.split(','):
+            item, _, step = item.partition('/')
+            if item == '*':
+                start, end = low, high
+            elif '-' in item:
+                start, end = (int(value) for value in item.split('-', 1))
+            else:
+                start = end = int(item)
+            if not low <= start <= end <= high:
+                raise ValueError(f"{name} must be between {low} and {high}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return sorted(values)
+
+    def matches_day(self, date):
+        day_ok = date.day in self.days
+        weekday_ok = date.weekday() in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment):
+        """Return the first matching minute after moment, or None if there isn't one."""
+        start = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        date = start.date()
+        for _ in range(self.SEARCH_DAYS):
+            if date.month in self.months and self.matches_day(date):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime.datetime.combine(date, datetime.time(hour, minute))
+                        if candidate >= start:
+                            return candidate
+            date += datetime.timedelta(days=1)
+        return None
+
+# Fixed-interval repeats; anything else is read as a cron expression
+REPEAT_INTERVALS = {'daily': datetime.timedelta(days=1), 'weekly': datetime.timedelta(weeks=1)}
+
+def next_occurrence(repeat, remind_time, now):
+    """Return when a recurring reminder is next due after now, skipping occurrences missed while offline."""
+    interval = REPEAT_INTERVALS.get(repeat)
+    if interval:
+        missed = (now - remind_time) // interval + 1
+        return remind_time + interval * max(missed, 1)
+    return CronSchedule(repeat).next_after(max(remind_time, now))
+
+class WheelBucket:
+    __slots__ = ('expiration', 'records')
+
+    def __init__(self, expiration):
+        self.expiration = expiration
+        self.records = {}
+
+class ReminderScheduler:
+    """Pending reminders in a hierarchical timing wheel.
+
+    Time is counted in one-second ticks. Level 0 has one slot per second for
+    the next WHEEL_SIZE seconds, and each level above has slots WHEEL_SIZE
+    times wider, so six levels of 64 slots reach decades ahead. A reminder
+    goes in the finest level whose span covers it. Insert and cancel are a
+    dict insert/delete in its slot. When a wider slot comes due, its
+    reminders drop into finer slots (or are due), so each reminder moves at
+    most once per level.
+
+    Non-empty slots sit in a small heap keyed by their start time, which
+    gives next_due() without scanning. There are at most LEVELS * WHEEL_SIZE
+    slots, however many reminders are pending. A per-user index backs
+    /view_reminders and /cancel_reminder.
+    """
+
+    WHEEL_SIZE = 64
+    LEVELS = 6
+
+    def __init__(self, now=None):
+        self.current = int((now or datetime.datetime.now()).timestamp())
+        self._units = [self.WHEEL_SIZE ** level for level in range(self.LEVELS)]
+        # (level, slot) -> WheelBucket, and a heap of (expiration, (level, slot))
+        self._buckets = {}
+        self._heap = []
+        # Reminders that were already due when added
+        self._expired = WheelBucket(0)
+        self._reminders = {}
+        self._by_user = defaultdict(dict)
+        # Set whenever a reminder becomes the new earliest one
+        self.wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._reminders)
+
+    def add(self, reminder):
+        # The reminder loop recomputes its sleep when woken; skip the lookup if it already will
+        next_tick = None if self.wakeup.is_set() else self._next_tick()
+        reminder.tick = math.ceil(reminder.remind_time.timestamp())
+        self._reminders[reminder.id] = reminder
+        self._by_user[reminder.user_id][reminder.id] = reminder
+        self._place(reminder)
+        if next_tick is None or reminder.tick < next_tick:
+            self.wakeup.set()
+
+    def remove(self, reminder_id):
+        reminder = self._reminders.pop(reminder_id, None)
+        if reminder:
+            reminder.bucket.records.pop(reminder_id, None)
+            reminder.bucket = None
+            user_reminders = self._by_user[reminder.user_id]
+            user_reminders.pop(reminder_id, None)
+            if not user_reminders:
+                del self._by_user[reminder.user_id]
+        return reminder
+
+    def get(self, reminder_id):
+        return self._reminders.get(reminder_id)
+
+    def for_user(self, user_id):
+        """Return a user's pending reminders, earliest first."""
+        return sorted(self._by_user.get(user_id, {}).values(), key=lambda r: r.remind_time)
+
+    def next_due(self):
+        """Return the earliest time a reminder can be due, or None.
+
+        For a wider slot this is the slot's start, which may be before its
+        first reminder; waking then just moves the reminders to finer slots.
+        """
+        tick = self._next_tick()
+        return None if tick is None else datetime.datetime.fromtimestamp(tick)
+
+    def _next_tick(self):
+        if self._expired.records:
+            return self.current
+        while self._heap:
+            expiration, key = self._heap[0]
+            bucket = self._buckets.get(key)
+            if bucket is not None and bucket.expiration == expiration and bucket.records:
+                return expiration
+            heapq.heappop(self._heap)
+            if bucket is not None and bucket.expiration == expiration:
+                del self._buckets[key]
+        return None
+
+    def pop_due(self, now):
+        """Remove and return every reminder due at or before now, earliest first."""
+        # A clock stepped backwards leaves the wheel where it was
+        self.current = max(self.current, int(now.timestamp()))
+        due = list(self._expired.records.values())
+        self._expired.records.clear()
+        while self._heap and self._heap[0][0] <= self.current:
+            expiration, key = heapq.heappop(self._heap)
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket.expiration != expiration:
+                continue
+            del self._buckets[key]
+            for reminder in bucket.records.values():
+                if reminder.tick <= self.current:
+                    due.append(reminder)
+                else:
+                    self._place(reminder)
+        for reminder in due:
+            reminder.bucket = self._expired
+            self.remove(reminder.id)
+        due.sort(key=lambda r: r.remind_time)
+        return due
+
+    def _place(self, reminder):
+        tick = reminder.tick
+        if tick <= self.current:
+            bucket = self._expired
+        else:
+            for level, unit in enumerate(self._units):
+                if tick < (self.current // unit + self.WHEEL_SIZE) * unit:
+                    break
+            slot = tick // unit
+            start = slot * unit
+            key = (level, slot % self.WHEEL_SIZE)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = WheelBucket(start)
+                heapq.heappush(self._heap, (start, key))
+            elif start < bucket.expiration:
+                # Only past the top level's span can a slot hold two revolutions; keep the earlier
+                bucket.expiration = start
+                heapq.heappush(self._heap, (start, key))
+        bucket.records[reminder.id] = reminder
+        reminder.bucket = bucket
+
+class RemindersCog(commands.Cog):
+    # Upper bound on a single sleep, so wall clock jumps (DST, NTP) are noticed
+    MAX_SLEEP_SECONDS = 900
+    # Wait before retrying reminders the database couldn't queue
+    RETRY_SECONDS = 30
+
+    def __init__(self, bot: TwitchBot):
+        super().__init__()
+        self.bot = bot
+        self.cal = parsedatetime.Calendar()
+        self.scheduler = ReminderScheduler()
+        # Reminders popped for delivery and not yet re-armed, and the ones cancelled meanwhile
+        self.in_flight = {}
+        self.cancelled = set()
+        self.bot.outbox.register('reminder', undeliverable=self.reminder_dms)
+        self.check_reminders.start()
+
+    async def cog_unload(self):
+        self.check_reminders.cancel()
+
+    async def cog_load(self):
+        # Reload saved reminders; any that came due while offline are delivered once ready
+        try:
+            for row in await self.bot.repo.load_reminders():
+                self.scheduler.add(ReminderRecord.from_row(row))
+            log.info("Loaded %s reminders", len(self.scheduler))
+        except Exception as e:
+            log.error("Error loading reminders: %s", e)
+
+    @app_commands.command(
+        name="reminder",
+        description="Set a reminder. Example: /reminder text:Take a break time:in 10 minutes"
+    )
+    @app_commands.describe(
+        text="What do you want to be reminded about?",
+        time="When should I remind you? (e.g. 'in 10 minutes', '2 hours', 'next Saturday')",
+        repeat="Repeat 'daily', 'weekly' or on a cron schedule like '0 9 * * 1-5' (minute hour day month weekday)"
+    )
+    async def reminder(self, interaction: discord.Interaction, text: str, time: Optional[str] = None,
+                       repeat: Optional[str] = None):
+        """Set a reminder for yourself."""
+        await interaction.response.defer()
+        now = datetime.datetime.now()
+
+        cron = None
+        if repeat:
+            repeat = repeat.strip().lower()
+            if repeat not in REPEAT_INTERVALS:
+                try:
+                    cron = CronSchedule(repeat)
+                except ValueError as e:
+                    await interaction.followup.send(
+                        f"❌ Repeat must be 'daily', 'weekly' or a cron schedule like `0 9 * * 1-5` "
+                        f"(minute hour day month weekday): {e}.",
+                        ephemeral=True
+                    )
+                    return
+
+        if time:
+            # Try to parse the time string
+            time_struct, parse_status = self.cal.parse(time, now)
+            remind_time = datetime.datetime(*time_struct[:6])
+            valid = parse_status != 0 and remind_time > now
+        elif cron:
+            # A cron schedule can start at its next match
+            remind_time = cron.next_after(now)
+            valid = remind_time is not None
+        else:
+            valid = False
+        if not valid:
+            await interaction.followup.send(
+                "❌ Sorry, I couldn't understand the time frame. Try something like 'in 10 minutes', '2 hours', or 'next Saturday'.",
+                ephemeral=True
+            )
+            return
+
+        # Store the reminder
+        row = await self.bot.repo.add_reminder(interaction.user.id, interaction.channel_id, remind_time, text, repeat)
+        self.scheduler.add(ReminderRecord.from_row(row))
+
+        # Confirm to the user (post in chat, not private)
+        description = f"I'll remind {interaction.user.mention} to **{text}** at <t:{int(remind_time.timestamp())}:F>"
+        description += f", repeating {self.describe_repeat(repeat)}." if repeat else "."
+        embed = discord.Embed(
+            title="⏰ Reminder Set!",
+            description=description,
+            color=discord.Color.gold()
+        )
+        await interaction.followup.send(embed=embed)
+
+    @staticmethod
+    def describe_repeat(repeat):
+        return repeat if repeat in REPEAT_INTERVALS else f"on `{repeat}`"
+
+    @app_commands.command(
+        name="cancel_reminder",
+        description="Cancel one of your reminders"
+    )
+    @app_commands.describe(reminder="The reminder to cancel")
+    async def cancel_reminder(self, interaction: discord.Interaction, reminder: str):
+        """Cancel one of your pending or recurring reminders."""
+        reminder_id = int(reminder) if reminder.isdigit() else None
+        record = self.scheduler.get(reminder_id) or self.in_flight.get(reminder_id)
+        if record is None or record.user_id != interaction.user.id:
+            await interaction.response.send_message(
+                "❌ Couldn't find that reminder. Pick one from the list, or check /view_reminders.",
+                ephemeral=True
+            )
+            return
+
+        # Out of the wheel before the delete's await, so a delivery running meanwhile can't re-arm it
+        self.scheduler.remove(record.id)
+        if record.id in self.in_flight:
+            self.cancelled.add(record.id)
+        try:
+            await self.bot.repo.delete_reminder(record.id)
+        except Exception as e:
+            log.error("Error cancelling reminder %s: %s", record.id, e)
+            if record.id in self.cancelled:
+                self.cancelled.discard(record.id)
+            else:
+                self.scheduler.add(record)
+            await interaction.response.send_message("❌ Couldn't cancel that reminder right now, try again.", ephemeral=True)
+            return
+        await interaction.response.send_message(
+            f"🗑️ Cancelled your reminder to **{record.text}**.",
+            ephemeral=True
+        )
+
+    @cancel_reminder.autocomplete('reminder')
+    async def cancel_reminder_autocomplete(self, interaction: discord.Interaction, current: str):
+        current = current.lower()
+        choices = []
+        for record in self.scheduler.for_user(interaction.user.id):
+            if current in record.text.lower():
+                when = record.remind_time.strftime('%b %d %H:%M')
+                label = f"{when} · {record.text}" + (f" (🔁 {record.repeat})" if record.repeat else "")
+                choices.append(app_commands.Choice(name=label[:100], value=str(record.id)))
+            if len(choices) == 25:  # Discord's limit
+                break
+        return choices
+
+    @app_commands.command(
+        name="view_reminders",
+        description="View all your active reminders"
+    )
+    async def view_reminders(self, interaction: discord.Interaction):
+        """View all your active reminders."""
+        await interaction.response.defer(ephemeral=True)
+        
+        # Reminders for the current user, earliest first
+        user_reminders = self.scheduler.for_user(interaction.user.id)
+        
+        if not user_reminders:
+            await interaction.followup.send(
+                "📝 You don't have any active reminders set.",
+                ephemeral=True
+            )
+            return
+        
+        embed = discord.Embed(
+            title="⏰ Your Active Reminders",
+            description=f"You have {len(user_reminders)} active reminder{'s' if len(user_reminders) != 1 else ''}:",
+            color=discord.Color.gold()
+        )
+        
+        for i, reminder in enumerate(user_reminders[:10], 1):  # Show max 10 reminders
+            remind_time = reminder.remind_time
+            text = reminder.text
+            
+            # Calculate time remaining
+            now = datetime.datetime.now()
+            time_diff = remind_time - now
+            
+            if time_diff.total_seconds() > 0:
+                # Future reminder
+                days = time_diff.days
+                hours, remainder = divmod(time_diff.seconds, 3600)
+                minutes, _ = divmod(remainder, 60)
+                
+                if days > 0:
+                    time_remaining = f"in {days}d {hours}h {minutes}m"
+                elif hours > 0:
+                    time_remaining = f"in {hours}h {minutes}m"
+                else:
+                    time_remaining = f"in {minutes}m"
+            else:
+                # Overdue reminder (shouldn't happen but just in case)
+                time_remaining = "⚠️ Overdue"
+            
+            embed.add_field(
+                name=f"{i}. {text[:50]}{'...' if len(text) > 50 else ''}",
+                value=f"📅 <t:{int(remind_time.timestamp())}:F>\n⏱️ {time_remaining}"
+                      + (f"\n🔁 Repeats {self.describe_repeat(reminder.repeat)}" if reminder.repeat else ""),
+                inline=False
+            )
+        
+        if len(user_reminders) > 10:
+            embed.add_field(
+                name="📝 Note",
+                value=f"Showing first 10 reminders. You have {len(user_reminders) - 10} more.",
+                inline=False
+            )
+        
+        embed.set_footer(text="Reminders are saved and will still be delivered after a restart")
+        
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    @tasks.loop()
+    async def check_reminders(self):
+        """Sleep until the next reminder is due (or a sooner one is added), then deliver."""
+        next_due = self.scheduler.next_due()
+        now = datetime.datetime.now()
+        if next_due is None or next_due > now:
+            delay = self.MAX_SLEEP_SECONDS
+            if next_due is not None:
+                delay = min(delay, (next_due - now).total_seconds())
+            self.scheduler.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.scheduler.wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+        due = self.scheduler.pop_due(datetime.datetime.now())
+        if not due:
+            return
+        self.in_flight.update((reminder.id, reminder) for reminder in due)
+        try:
+            await self.deliver(due)
+        finally:
+            for reminder in due:
+                self.in_flight.pop(reminder.id, None)
+                self.cancelled.discard(reminder.id)
+
+    async def deliver(self, due):
+        """Queue due reminders and re-arm the recurring ones, unless they were cancelled meanwhile."""
+        with self.bot.metrics.timer('meowbot_event_seconds', event='check_reminders'):
+            now = datetime.datetime.now()
+            next_times = {}
+            for reminder in due:
+                if reminder.repeat:
+                    next_time = next_occurrence(reminder.repeat, reminder.remind_time, now)
+                    if next_time:
+                        next_times[reminder.id] = next_time
+
+            # Hand the whole batch to the outbox; one-shot reminders are deleted and
+            # recurring ones moved to their next time in the same transaction
+            try:
+                await self.bot.outbox.enqueue(
+                    self.reminder_messages(due),
+                    delete_reminder_ids=[reminder.id for reminder in due if reminder.id not in next_times],
+                    reminder_times=next_times
+                )
+            except Exception as e:
+                log.error("Error queueing %s reminders: %s", len(due), e)
+                await asyncio.sleep(self.RETRY_SECONDS)
+                for reminder in due:
+                    if reminder.id not in self.cancelled:
+                        self.scheduler.add(reminder)
+                return
+
+            for reminder in due:
+                if reminder.id in next_times and reminder.id not in self.cancelled:
+                    reminder.remind_time = next_times[reminder.id]
+                    self.scheduler.add(reminder)
+
+    # Reminder texts in a grouped delivery are cut to this length to keep the embed under Discord's limit
+    GROUPED_TEXT_LIMIT = 300
+    # Reminders per grouped delivery
+    GROUP_SIZE = 10
+
+    def reminder_messages(self, due):
+        """Outbox messages for due reminders: in their channel, or by DM if they have none.
+
+        Reminders due together for the same channel (or user) go out as one
+        message listing them all.
+        """
+        groups = defaultdict(list)
+        for reminder in due:
+            groups[reminder.channel_id or ('dm', reminder.user_id)].append(reminder)
+
+        messages = []
+        for reminders in groups.values():
+            for start in range(0, len(reminders), self.GROUP_SIZE):
+                messages.append(self.reminder_message(reminders[start:start + self.GROUP_SIZE]))
+        return messages
+
+    def reminder_message(self, reminders):
+        first = reminders[0]
+        if len(reminders) == 1:
+            embed = discord.Embed(
+                title="🔔 Reminder!",
+                description=f"You asked to be reminded: **{first.text}**",
+                color=discord.Color.purple(),
+                timestamp=datetime.datetime.utcnow()
+            )
+        else:
+            lines = []
+            for reminder in reminders:
+                text = reminder.text
+                if len(text) > self.GROUPED_TEXT_LIMIT:
+                    text = text[:self.GROUPED_TEXT_LIMIT - 1] + "…"
+                lines.append(f"<@{reminder.user_id}> asked to be reminded: **{text}**" if first.channel_id else f"**{text}**")
+            embed = discord.Embed(
+                title="🔔 Reminders!",
+                description="\n".join(lines),
+                color=discord.Color.purple(),
+                timestamp=datetime.datetime.utcnow()
+            )
+        if first.channel_id:
+            mentions = " ".join(dict.fromkeys(f"<@{reminder.user_id}>" for reminder in reminders))
+            # Kept so the reminders can go out by DM if the channel turns out to be gone
+            return Outbox.message('reminder', channel_id=first.channel_id, content=mentions, embed=embed,
+                                  reminders=[[reminder.user_id, reminder.text] for reminder in reminders])
+        return Outbox.message('reminder', user_id=first.user_id, embed=embed)
+
+    async def reminder_dms(self, message):
+        """DM each person their reminders when the channel is gone or the bot can't post there."""
+        return self.reminder_messages([
+            ReminderRecord(None, user_id, None, None, text)
+            for user_id, text in message['payload']['meta'].get('reminders', ())
+        ])
+
+    @check_reminders.before_loop
+    async def before_reminders(self):
+        await self.bot.wait_until_ready()
+
+async def setup(bot):
+    await bot.add_cog(RemindersCog(bot))
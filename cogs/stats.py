@@ -0,0 +1,85 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+import time
+
+from meowbot import TwitchBot
+
+def format_ms(seconds):
+    return f"{seconds * 1000:.1f}ms"
+
+class StatsCog(commands.Cog):
+    # Discord rejects embed field values over 1024 characters
+    FIELD_LIMIT = 1024
+
+    def __init__(self, bot: TwitchBot):
+        super().__init__()
+        self.bot = bot
+
+    def field_lines(self, name, label, limit=10):
+        """One 'label: n=…, p50 …, p99 …' line per series of a metric, busiest first."""
+        lines = []
+        for labels, count, p50, p99 in self.bot.metrics.summary(name)[:limit]:
+            lines.append(f"`{label(labels)}` n={count}, p50 {format_ms(p50)}, p99 {format_ms(p99)}")
+        value = "\n".join(lines) or "No data yet"
+        if len(value) > self.FIELD_LIMIT:
+            value = value[:self.FIELD_LIMIT - 1] + "…"
+        return value
+
+    @app_commands.command(name="stats")
+    @app_commands.guild_only()
+    async def stats(self, interaction: discord.Interaction):
+        """Show the bot's handler, database, HTTP and event loop latencies."""
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("❌ You need the 'Administrator' permission to use this command.", ephemeral=True)
+            return
+
+        uptime = int(time.monotonic() - self.bot.metrics.started_at)
+        embed = discord.Embed(
+            title="📊 Bot Stats",
+            description=f"Uptime: {uptime // 3600}h {uptime % 3600 // 60}m · gateway latency {format_ms(self.bot.latency)}",
+            color=discord.Color.blue()
+        )
+        embed.add_field(
+            name="💬 Events",
+            value=self.field_lines('meowbot_event_seconds', lambda labels: labels['event']),
+            inline=False
+        )
+        embed.add_field(
+            name="⚡ Commands",
+            value=self.field_lines(
+                'meowbot_command_seconds',
+                lambda labels: f"/{labels['command']}" + (" (error)" if labels['status'] == 'error' else "")
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name="🗄️ Database",
+            value=self.field_lines('meowbot_db_seconds', lambda labels: f"{labels['kind']} query")
+            + "\n" + self.field_lines('meowbot_db_wait_seconds', lambda labels: f"{labels['kind']} queue wait"),
+            inline=False
+        )
+        embed.add_field(
+            name="🌐 HTTP",
+            value=self.field_lines(
+                'meowbot_http_seconds',
+                lambda labels: f"{labels['method']} {labels['host']}{labels['endpoint']} {labels['status']}"
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name="🤖 Discord REST",
+            value=self.field_lines('meowbot_discord_request_seconds', lambda labels: labels['call'])
+            + "\n" + self.field_lines('meowbot_rate_limit_wait_seconds', lambda labels: f"{labels['source']} bucket wait"),
+            inline=False
+        )
+        embed.add_field(
+            name="⏱️ Event Loop Lag",
+            value=self.field_lines('meowbot_event_loop_lag_seconds', lambda labels: "lag"),
+            inline=False
+        )
+        embed.set_footer(text="Latencies since startup; p50/p99 are estimated from histogram buckets")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def setup(bot):
+    await bot.add_cog(StatsCog(bot))
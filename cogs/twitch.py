@@ -0,0 +1,574 @@
+import discord
+from discord.ext import commands, tasks
+from discord import app_commands
+import datetime
+import time
+import random
+import aiohttp
+import logging
+
+from meowbot import TwitchBot
+
+log = logging.getLogger('meowbot.twitch')
+
+class QuoteIndex:
+    """Set of indexed quote message ids supporting O(1) add, remove and uniform random pick."""
+
+    def __init__(self, message_ids=()):
+        self._ids = []
+        self._positions = {}
+        for message_id in message_ids:
+            self.add(message_id)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, message_id):
+        return message_id in self._positions
+
+    def __iter__(self):
+        return iter(list(self._ids))
+
+    def add(self, message_id):
+        if message_id not in self._positions:
+            self._positions[message_id] = len(self._ids)
+            self._ids.append(message_id)
+
+    def remove(self, message_id):
+        # Swap the last id into the removed slot so removal stays O(1)
+        position = self._positions.pop(message_id, None)
+        if position is None:
+            return
+        last = self._ids.pop()
+        if position < len(self._ids):
+            self._ids[position] = last
+            self._positions[last] = position
+
+    def random(self):
+        return random.choice(self._ids)
+
+def quote_from_message(message):
+    """Return a Quote row dict for a message, or None if it isn't a quote."""
+    # Only include messages from bots (the quote bot)
+    if not (message.author.bot and (message.content or message.embeds)):
+        return None
+
+    description = None
+    image_url = None
+    color = None
+    if message.embeds:
+        original_embed = message.embeds[0]
+        if original_embed.image:
+            image_url = original_embed.image.url
+        elif original_embed.thumbnail:
+            image_url = original_embed.thumbnail.url
+        description = original_embed.description or original_embed.title
+        if original_embed.color:
+            color = original_embed.color.value
+    elif message.content:
+        description = message.content
+    else:
+        description = "*(Image quote)*"
+
+    return {
+        'message_id': message.id,
+        'channel_id': message.channel.id,
+        'author_name': message.author.display_name,
+        'author_avatar_url': message.author.display_avatar.url,
+        'description': description,
+        'image_url': image_url,
+        'color': color,
+        'created_at': message.created_at.replace(tzinfo=None)
+    }
+
+class TwitchCog(commands.Cog):
+    def __init__(self, bot: TwitchBot):
+        super().__init__()
+        self.bot = bot
+        self.quotes = QuoteIndex()
+
+    async def cog_load(self):
+        if self.bot.settings.quotes_channel_id:
+            try:
+                self.quotes = QuoteIndex(await self.bot.repo.load_quote_ids(self.bot.settings.quotes_channel_id))
+                log.info("Loaded %s indexed quotes", len(self.quotes))
+            except Exception as e:
+                log.error("Error loading quote index: %s", e)
+            self.backfill_quotes.start()
+
+    async def cog_unload(self):
+        self.backfill_quotes.cancel()
+
+    @tasks.loop(count=1)
+    async def backfill_quotes(self):
+        """Index quotes posted since the newest indexed one (the whole channel on first run).
+
+        After an incremental pass the older indexed quotes are checked
+        against the channel too, dropping any deleted while the bot was offline.
+        """
+        quotes_channel = self.bot.get_channel(self.bot.settings.quotes_channel_id)
+        if not quotes_channel:
+            log.warning("Quotes channel not found; skipping quote backfill")
+            return
+
+        try:
+            latest_id = await self.bot.repo.latest_quote_id(quotes_channel.id)
+            after = discord.Object(id=latest_id) if latest_id else None
+            batch = []
+            indexed = 0
+            async for message in quotes_channel.history(limit=None, after=after, oldest_first=True):
+                quote = quote_from_message(message)
+                if quote:
+                    batch.append(quote)
+                if len(batch) >= 100:
+                    indexed += await self.index_quotes(batch)
+                    batch = []
+            if batch:
+                indexed += await self.index_quotes(batch)
+            removed = await self.reconcile_quotes(quotes_channel, latest_id) if latest_id else 0
+            log.info("Quote backfill complete: %s new quotes, %s removed, %s total", indexed, removed, len(self.quotes))
+        except discord.Forbidden:
+            log.warning("No permission to read the quotes channel; skipping quote backfill")
+        except Exception as e:
+            log.error("Error backfilling quotes: %s", e)
+
+    @backfill_quotes.before_loop
+    async def before_backfill_quotes(self):
+        await self.bot.wait_until_ready()
+
+    async def reconcile_quotes(self, quotes_channel, latest_id):
+        """Unindex quotes up to latest_id that are no longer in the channel; returns how many."""
+        present = set()
+        async for message in quotes_channel.history(limit=None, before=discord.Object(id=latest_id + 1)):
+            if message.id in self.quotes:
+                present.add(message.id)
+        # Quotes indexed live during the walk are newer than latest_id and left alone
+        missing = [message_id for message_id in self.quotes if message_id <= latest_id and message_id not in present]
+        await self.unindex_quotes(missing)
+        return len(missing)
+
+    async def index_quotes(self, quotes):
+        await self.bot.repo.save_quotes(quotes)
+        for quote in quotes:
+            self.quotes.add(quote['message_id'])
+        return len(quotes)
+
+    async def unindex_quotes(self, message_ids):
+        message_ids = [message_id for message_id in message_ids if message_id in self.quotes]
+        if message_ids:
+            await self.bot.repo.delete_quotes(message_ids)
+            for message_id in message_ids:
+                self.quotes.remove(message_id)
+
+    def is_quotes_channel(self, channel_id):
+        return channel_id == self.bot.settings.quotes_channel_id
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        """Keep the quote index current as new quotes are posted."""
+        if not self.is_quotes_channel(message.channel.id):
+            return
+        quote = quote_from_message(message)
+        if quote:
+            try:
+                await self.index_quotes([quote])
+            except Exception as e:
+                log.error("Error indexing quote %s: %s", message.id, e)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload):
+        """Re-index edited quotes. Raw so edits to uncached (old) quotes are seen too."""
+        if not self.is_quotes_channel(payload.channel_id):
+            return
+        try:
+            quote = quote_from_message(payload.message)
+            if quote:
+                await self.index_quotes([quote])
+            else:
+                await self.unindex_quotes([payload.message_id])
+        except Exception as e:
+            log.error("Error re-indexing quote %s: %s", payload.message_id, e)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        if self.is_quotes_channel(payload.channel_id):
+            try:
+                await self.unindex_quotes([payload.message_id])
+            except Exception as e:
+                log.error("Error removing quote %s: %s", payload.message_id, e)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        if self.is_quotes_channel(payload.channel_id):
+            try:
+                await self.unindex_quotes(payload.message_ids)
+            except Exception as e:
+                log.error("Error removing quotes: %s", e)
+
+    @app_commands.command(name="check")
+    async def check(self, interaction: discord.Interaction):
+        """Check if the bot is working."""
+        await interaction.response.send_message("Bot is working!", ephemeral=True)
+
+    @app_commands.command(name="help")
+    async def help(self, interaction: discord.Interaction):
+        """Shows all available bot commands and their descriptions."""
+        embed = discord.Embed(
+            title="🐱 Meow Bot Commands",
+            description="Here are all the commands you can use:",
+            color=discord.Color.blue()
+        )
+        
+        # General Commands
+        embed.add_field(
+            name="🔧 General Commands",
+            value=(
+                "`/check` - Check if the bot is working\n"
+                "`/help` - Show this help message\n"
+                "`/avatar [user]` - Show a user's avatar in full size\n"
+                "`/clear <amount>` - Delete messages (1-100, requires Manage Messages permission)\n"
+                "`/stats` - Show bot latency statistics (requires Administrator)"
+            ),
+            inline=False
+        )
+        
+        # Meow Commands
+        embed.add_field(
+            name="😺 Meow Commands",
+            value=(
+                "`/top_meows` - See the top 10 meow users\n"
+                "`/top_barks` - See the top 10 bark/woof users\n"
+                "`/meow_count` - Check your personal meow count\n"
+                "`/add_keyword <word> <meow|bark>` - Count an extra word (requires Manage Server)\n"
+                "`/remove_keyword <word>` - Stop counting an extra word"
+            ),
+            inline=False
+        )
+        
+        # Twitch Commands
+        embed.add_field(
+            name="🎮 Twitch Commands",
+            value=(
+                "`/add_streamer <name> [channel] [role]` - Announce a streamer's go-lives (requires Manage Server)\n"
+                "`/remove_streamer <name> [channel]` - Stop announcing a streamer\n"
+                "`/streamer_stats` - Show how often each streamer is checked"
+            ),
+            inline=False
+        )
+        
+        # Utility Commands
+        embed.add_field(
+            name="⏰ Utility Commands",
+            value=(
+                "`/reminder <text> <time> [repeat]` - Set a reminder, optionally repeating\n"
+                "`/view_reminders` - View all your active reminders\n"
+                "`/cancel_reminder <reminder>` - Cancel one of your reminders\n"
+                "`/confess <message>` - Send an anonymous confession\n"
+                "`/poll <question> <choices>` - Create a poll with reaction voting\n"
+                "`/poll_results [poll]` - Show a poll's current votes\n"
+                "`/randomquote` - Get a random quote from the quotes channel"
+            ),
+            inline=False
+        )
+        
+        # Additional Info
+        embed.add_field(
+            name="ℹ️ Additional Info",
+            value=(
+                "• Say 'meow' in chat to increase the server's meow counter!\n"
+                "• Saying 'woof' or 'bark' will give you infractions (we're cat people!)\n"
+                "• Confessions can only be used in the confessions channel\n"
+                "• Bot automatically tracks Twitch streamers and announces when they go live"
+            ),
+            inline=False
+        )
+        
+        embed.set_footer(text="Meow Bot - Keeping the server purr-fectly managed! 🐾")
+        
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="avatar")
+    async def avatar(self, interaction: discord.Interaction, user: discord.User = None):
+        """Show a user's avatar in full size."""
+        # Default to the command user if no user is specified
+        target_user = user or interaction.user
+        
+        # Get the avatar URL (supports animated GIFs)
+        avatar_url = target_user.display_avatar.url
+        
+        # Create embed with the avatar
+        embed = discord.Embed(
+            title=f"🖼️ {target_user.display_name}'s Avatar",
+            color=discord.Color.blue()
+        )
+        embed.set_image(url=avatar_url)
+        embed.set_footer(text=f"User ID: {target_user.id}")
+        
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="clear")
+    @app_commands.describe(amount="Number of messages to delete (1-100)")
+    async def clear(self, interaction: discord.Interaction, amount: int):
+        """Clear/purge messages from the current channel."""
+        # Check if user has manage messages permission
+        if not interaction.user.guild_permissions.manage_messages:
+            await interaction.response.send_message("❌ You need the 'Manage Messages' permission to use this command.", ephemeral=True)
+            return
+        
+        # Check if bot has manage messages permission
+        if not interaction.guild.me.guild_permissions.manage_messages:
+            await interaction.response.send_message("❌ I need the 'Manage Messages' permission to delete messages.", ephemeral=True)
+            return
+        
+        # Validate amount
+        if amount < 1 or amount > 100:
+            await interaction.response.send_message("❌ Please specify a number between 1 and 100.", ephemeral=True)
+            return
+        
+        # Defer the response since purging might take a moment
+        await interaction.response.defer(ephemeral=True)
+        
+        try:
+            # Delete messages
+            deleted = await interaction.channel.purge(limit=amount)
+            
+            # Send confirmation (ephemeral so it doesn't clutter chat)
+            await interaction.followup.send(
+                f"✅ Successfully deleted {len(deleted)} message{'s' if len(deleted) != 1 else ''}.",
+                ephemeral=True
+            )
+        except discord.Forbidden:
+            await interaction.followup.send("❌ I don't have permission to delete messages in this channel.", ephemeral=True)
+        except discord.HTTPException as e:
+            await interaction.followup.send(f"❌ An error occurred: {e}", ephemeral=True)
+        except Exception as e:
+            log.error("Error in clear command: %s", e)
+            await interaction.followup.send("❌ An unexpected error occurred while deleting messages.", ephemeral=True)
+
+    @app_commands.command(name="add_streamer")
+    @app_commands.describe(
+        streamer_name="Twitch login to follow",
+        channel="Channel for go-live posts (defaults to this one)",
+        role="Role to mention when they go live"
+    )
+    @app_commands.guild_only()
+    async def add_streamer(self, interaction: discord.Interaction, streamer_name: str,
+                           channel: discord.TextChannel = None, role: discord.Role = None):
+        """Announce a streamer's go-lives in a channel of this server."""
+        if not interaction.user.guild_permissions.manage_guild:
+            await interaction.response.send_message("❌ You need the 'Manage Server' permission to use this command.", ephemeral=True)
+            return
+
+        streamer_name = streamer_name.strip().lower()
+        if not streamer_name:
+            await interaction.response.send_message("Streamer name cannot be empty.", ephemeral=True)
+            return
+
+        channel = channel or interaction.channel
+        role_id = role.id if role else None
+        targets = self.bot.streamers.by_streamer.get(streamer_name, {})
+        if (interaction.guild_id, channel.id) in targets and targets[(interaction.guild_id, channel.id)] == role_id:
+            await interaction.response.send_message(f"**{streamer_name}** is already announced in {channel.mention}.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        try:
+            await self.bot.repo.save_streamer_subscription(streamer_name, interaction.guild_id, channel.id, role_id)
+            created = self.bot.streamers.add(streamer_name, interaction.guild_id, channel.id, role_id)
+        except Exception as e:
+            log.error("Error in add_streamer command: %s", e)
+            await interaction.followup.send("❌ An error occurred while saving the streamer.", ephemeral=True)
+            return
+
+        if not created:
+            # Only the mention role changed; the channel already has any current announcement
+            mention = f"mentioning {role.mention}" if role else "without a role mention"
+            await interaction.followup.send(f"✅ Now announcing **{streamer_name}** in {channel.mention} {mention}", ephemeral=True)
+            return
+
+        await interaction.followup.send(f"✅ Now announcing **{streamer_name}** in {channel.mention}", ephemeral=True)
+
+        # Check right away so a streamer who is already live gets announced here
+        await self.check_and_notify_streamer(interaction, streamer_name, (interaction.guild_id, channel.id, role_id))
+
+    @app_commands.command(name="remove_streamer")
+    @app_commands.describe(
+        streamer_name="Twitch login to stop following",
+        channel="Only stop announcing in this channel"
+    )
+    @app_commands.guild_only()
+    async def remove_streamer(self, interaction: discord.Interaction, streamer_name: str,
+                              channel: discord.TextChannel = None):
+        """Stop announcing a streamer in this server."""
+        if not interaction.user.guild_permissions.manage_guild:
+            await interaction.response.send_message("❌ You need the 'Manage Server' permission to use this command.", ephemeral=True)
+            return
+
+        streamer_name = streamer_name.strip().lower()
+        if not streamer_name:
+            await interaction.response.send_message("Streamer name cannot be empty.", ephemeral=True)
+            return
+
+        if not self.bot.streamers.is_subscribed(streamer_name, interaction.guild_id):
+            await interaction.response.send_message("This streamer is not being tracked in this server.", ephemeral=True)
+            return
+
+        channel_id = channel.id if channel else None
+        try:
+            await self.bot.repo.delete_streamer_subscriptions(streamer_name, interaction.guild_id, channel_id)
+            removed = self.bot.streamers.remove(streamer_name, interaction.guild_id, channel_id)
+        except Exception as e:
+            log.error("Error in remove_streamer command: %s", e)
+            await interaction.response.send_message("❌ An error occurred while removing the streamer.", ephemeral=True)
+            return
+
+        if not removed:
+            await interaction.response.send_message(f"**{streamer_name}** isn't announced in {channel.mention}.", ephemeral=True)
+            return
+        await interaction.response.send_message(f"🚫 Stopped tracking streamer: **{streamer_name}**", ephemeral=True)
+
+        # Unsubscribe from push notifications once no guild follows the streamer
+        if self.bot.eventsub and self.bot.eventsub.running:
+            await self.bot.eventsub.sync(self.bot.tracked_user_ids())
+
+    @app_commands.command(name="streamer_stats")
+    @app_commands.guild_only()
+    async def streamer_stats(self, interaction: discord.Interaction):
+        """Show how often each streamer followed here is being checked."""
+        logins = self.bot.streamers.for_guild(interaction.guild_id)
+        if not logins:
+            await interaction.response.send_message("No streamers are tracked in this server.", ephemeral=True)
+            return
+
+        schedule = self.bot.poll_schedule
+        now = time.monotonic()
+        eventsub_active = self.bot.eventsub and self.bot.eventsub.running
+        lines = []
+        for login in logins[:25]:
+            go_lives = sum(schedule.histograms.get(login, ()))
+            if login not in schedule.intervals:
+                lines.append(f"**{login}** - not checked yet ({go_lives} go-lives recorded)")
+                continue
+            interval, reason = schedule.intervals[login]
+            next_check = max(0, int(schedule.next_check[login] - now))
+            lines.append(
+                f"**{login}** - every {interval // 60}m{interval % 60:02d}s ({reason}), "
+                f"next in {next_check // 60}m{next_check % 60:02d}s, {go_lives} go-lives recorded"
+            )
+        if len(logins) > 25:
+            lines.append(f"...and {len(logins) - 25} more")
+
+        embed = discord.Embed(
+            title="📡 Streamer Check Intervals",
+            description="\n".join(lines),
+            color=discord.Color.purple()
+        )
+        if eventsub_active:
+            embed.add_field(name="EventSub", value=f"Push notifications active; subscribed streamers are only re-checked every {self.bot.settings.twitch_reconcile_minutes:g} minutes while offline, the rest on their usual schedule", inline=False)
+        embed.set_footer(text=f"{schedule.checks} streamer checks in {schedule.requests} stream requests since startup")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    async def check_and_notify_streamer(self, interaction, streamer_name, subscriber):
+        """Check if a newly added streamer is live and announce it to the new subscriber."""
+        # Get user ID (cached after the first lookup)
+        try:
+            user_ids = await self.bot.resolve_twitch_user_ids([streamer_name])
+        except aiohttp.ClientError:
+            await interaction.followup.send("Error checking streamer status.", ephemeral=True)
+            return
+
+        if streamer_name not in user_ids:
+            await interaction.followup.send("Streamer not found.", ephemeral=True)
+            return
+        user_id = user_ids[streamer_name]
+
+        # Subscribe to push notifications for the new streamer right away
+        if self.bot.eventsub and self.bot.eventsub.running:
+            await self.bot.eventsub.sync(self.bot.tracked_user_ids())
+
+        # Check if stream is live
+        try:
+            live_streams = await self.bot.fetch_live_streams([user_id])
+        except aiohttp.ClientError:
+            await interaction.followup.send("Error checking stream status.", ephemeral=True)
+            return
+
+        stream_info = live_streams.get(user_id)
+        if stream_info:
+            # Other subscribers were already notified when the stream started
+            status = await self.bot.load_streamer_status()
+            if self.bot.is_new_stream(streamer_name, stream_info):
+                await self.bot.handle_stream_update(streamer_name, stream_info)
+            else:
+                await self.bot.notify_live(streamer_name, stream_info, [subscriber], status[streamer_name])
+            await interaction.followup.send(f"✅ Notified that **{streamer_name}** is live.", ephemeral=True)
+        else:
+            await interaction.followup.send(f"**{streamer_name}** is not live right now.", ephemeral=True)
+
+    @app_commands.command(name="randomquote")
+    async def randomquote(self, interaction: discord.Interaction):
+        """Get a random quote from the quotes channel."""
+        await interaction.response.defer()
+        
+        # Get the quotes channel ID from environment variables
+        if not self.bot.settings.quotes_channel_id:
+            await interaction.followup.send(
+                "❌ Quotes channel not configured. Please contact an administrator.",
+                ephemeral=True
+            )
+            return
+            
+        quotes_channel = self.bot.get_channel(self.bot.settings.quotes_channel_id)
+        
+        if not quotes_channel:
+            await interaction.followup.send(
+                "❌ Could not access the quotes channel. Make sure the bot has permission to read that channel.",
+                ephemeral=True
+            )
+            return
+        
+        try:
+            if not self.quotes:
+                await interaction.followup.send(
+                    "❌ No quotes found in the quotes channel.",
+                    ephemeral=True
+                )
+                return
+            
+            # Pick a random quote uniformly from the whole indexed history
+            random_quote = await self.bot.repo.get_quote(self.quotes.random())
+            
+            # Since quotes are images, display the image directly
+            quote_embed = discord.Embed(
+                title="🎲 Random Quote",
+                description=random_quote.description,
+                color=discord.Color(random_quote.color) if random_quote.color else discord.Color.blue()
+            )
+            if random_quote.image_url:
+                quote_embed.set_image(url=random_quote.image_url)
+            
+            # Add footer with attribution
+            quote_embed.set_footer(
+                text=f"From #{quotes_channel.name} • Originally by {random_quote.author_name}",
+                icon_url=random_quote.author_avatar_url
+            )
+            
+            # Add timestamp
+            quote_embed.timestamp = random_quote.created_at.replace(tzinfo=datetime.timezone.utc)
+            
+            await interaction.followup.send(embed=quote_embed)
+            
+        except discord.Forbidden:
+            await interaction.followup.send(
+                "❌ I don't have permission to read messages from the quotes channel.",
+                ephemeral=True
+            )
+        except Exception as e:
+            log.error("Error in randomquote command: %s", e)
+            await interaction.followup.send(
+                "❌ An error occurred while fetching a random quote.",
+                ephemeral=True
+            )
+
+async def setup(bot):
+    await bot.add_cog(TwitchCog(bot))
@@ -4,42 +4,85 @@ from discord.ext import commands, tasks
 from discord import app_commands
 from dotenv import load_dotenv
 import datetime
+import time
+import hashlib
+import hmac
+import json
 import asyncio
+import bisect
+import contextlib
+import functools
+import logging
+import queue
+import random
+import signal
+import sys
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
 import aiohttp
-from peewee import SqliteDatabase, Model, IntegerField, TextField, BooleanField
-import parsedatetime
+from peewee import SqliteDatabase, Model, IntegerField, TextField, BooleanField, DateTimeField, EXCLUDED, Tuple, chunked, fn
 import re
 
-# Load environment variables
-load_dotenv()
-
-# Database setup
-db_file = 'bot_data.db'
-if not os.path.exists(db_file):
-    with open(db_file, 'w') as f:
-        pass
-
-absolute_db_path = os.path.abspath(db_file)
-print(f"Database file path: {absolute_db_path}")
-
-# Define the SQLite database
-db = SqliteDatabase(db_file)
+# Subsystem loggers; the cogs also use meowbot.reminders, meowbot.confess and meowbot.polls
+log = logging.getLogger('meowbot')
+meow_log = logging.getLogger('meowbot.meow')
+twitch_log = logging.getLogger('meowbot.twitch')
+
+# The SQLite database. Its file is chosen at startup by init_database(), so
+# importing this module doesn't touch the disk.
+db = SqliteDatabase(None)
+
+# WAL lets the reader threads run alongside the single writer; the remaining
+# pragmas trade a little durability on power loss for far fewer fsyncs and a
+# warmer page cache.
+DB_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -64 * 1024,  # 64 MiB
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+
+# Counts from direct messages are stored under this guild id
+DM_GUILD_ID = 0
 
 # Define models for data storage
 class UserInfractions(Model):
-    user_id = IntegerField(unique=True)
+    guild_id = IntegerField(default=DM_GUILD_ID)
+    user_id = IntegerField()
     infractions = IntegerField(default=0)
 
     class Meta:
         database = db
+        indexes = (
+            (('guild_id', 'user_id'), True),
+        )
 
 class UserMeowCounts(Model):
-    user_id = IntegerField(unique=True)
+    guild_id = IntegerField(default=DM_GUILD_ID)
+    user_id = IntegerField()
+    meow_count = IntegerField(default=0)
+
+    class Meta:
+        database = db
+        indexes = (
+            (('guild_id', 'user_id'), True),
+        )
+
+class GuildMeowTotal(Model):
+    guild_id = IntegerField(primary_key=True)
     meow_count = IntegerField(default=0)
 
     class Meta:
         database = db
 
+# Per-guild leaderboard indexes: a top-N query reads N index entries, not the table
+UserInfractions.add_index(UserInfractions.index(UserInfractions.guild_id, UserInfractions.infractions.desc()))
+UserMeowCounts.add_index(UserMeowCounts.index(UserMeowCounts.guild_id, UserMeowCounts.meow_count.desc()))
+
 class ConfessionCounter(Model):
     id = IntegerField(primary_key=True)
     count = IntegerField(default=0)
@@ -47,26 +90,2153 @@ class ConfessionCounter(Model):
     class Meta:
         database = db
 
-# Connect to the database and create tables
-db.connect()
-db.create_tables([UserInfractions, UserMeowCounts, ConfessionCounter], safe=True)
-
-# Global counter
-meow_counter = 0
-
-# Get credentials from environment variables
-DISCORD_BOT_TOKEN = os.getenv('DISCORD_BOT_TOKEN')
-# Twitch credentials
-TWITCH_CLIENT_ID = os.getenv('TWITCH_CLIENT_ID')
-TWITCH_SECRET = os.getenv('TWITCH_SECRET')
-TWITCH_CHANNEL_ID = os.getenv('TWITCH_CHANNEL_ID')
-# Streamer names
-STREAMER_NAMES = os.getenv('STREAMER_NAMES', '').split(',')
-# Confession channels
-CONFESS_CHANNEL_ID = os.getenv('CONFESS_CHANNEL_ID')
-CONFESS_LOG_CHANNEL_ID = os.getenv('CONFESS_LOG_CHANNEL_ID')
-# Quotes channel
-QUOTES_CHANNEL_ID = os.getenv('QUOTES_CHANNEL_ID')
+class Reminder(Model):
+    user_id = IntegerField()
+    channel_id = IntegerField(null=True)
+    remind_time = DateTimeField(index=True)  # next delivery, naive local time
+    text = TextField()
+    # 'daily', 'weekly' or a five-field cron expression; null for one-shot reminders
+    repeat = TextField(null=True)
+
+    class Meta:
+        database = db
+
+class TwitchUser(Model):
+    login = TextField(unique=True)
+    user_id = TextField()
+
+    class Meta:
+        database = db
+
+class Quote(Model):
+    message_id = IntegerField(unique=True)
+    channel_id = IntegerField(index=True)
+    author_name = TextField()
+    author_avatar_url = TextField(null=True)
+    description = TextField(null=True)
+    image_url = TextField(null=True)
+    color = IntegerField(null=True)
+    created_at = DateTimeField()  # naive UTC
+
+    class Meta:
+        database = db
+
+def migrate_guild_scoped_counts(legacy_guild_id):
+    """Move counts from the old user_id-keyed tables to (guild_id, user_id) rows.
+
+    Existing counts are assigned to legacy_guild_id, the server the bot ran
+    in before counts were tracked per guild.
+    """
+    for model, count_field in ((UserMeowCounts, 'meow_count'), (UserInfractions, 'infractions')):
+        table = model._meta.table_name
+        if not db.table_exists(table) or 'guild_id' in [c.name for c in db.get_columns(table)]:
+            continue
+        log.info("Migrating %s to per-guild counts (guild %s)", table, legacy_guild_id)
+        with db.atomic():
+            db.execute_sql(f'ALTER TABLE "{table}" RENAME TO "{table}_legacy"')
+            # The old unique index moved with the renamed table; drop it so the name is free
+            db.execute_sql(f'DROP INDEX IF EXISTS "{table}_user_id"')
+            model.create_table()
+            db.execute_sql(
+                f'INSERT INTO "{table}" (guild_id, user_id, {count_field}) '
+                f'SELECT ?, user_id, {count_field} FROM "{table}_legacy"',
+                (legacy_guild_id,)
+            )
+            db.execute_sql(f'DROP TABLE "{table}_legacy"')
+            if model is UserMeowCounts:
+                GuildMeowTotal.create_table(safe=True)
+                GuildMeowTotal.replace(
+                    guild_id=legacy_guild_id,
+                    meow_count=UserMeowCounts.select(fn.COALESCE(fn.SUM(UserMeowCounts.meow_count), 0))
+                        .where(UserMeowCounts.guild_id == legacy_guild_id)
+                ).execute()
+
+class GuildKeyword(Model):
+    guild_id = IntegerField()
+    keyword = TextField()
+    category = TextField()  # 'meow' or 'bark'
+
+    class Meta:
+        database = db
+        indexes = (
+            (('guild_id', 'keyword'), True),
+        )
+
+class StreamerSubscription(Model):
+    login = TextField()
+    guild_id = IntegerField(index=True)
+    channel_id = IntegerField()
+    role_id = IntegerField(null=True)  # Role to mention on go-live
+
+    class Meta:
+        database = db
+        indexes = (
+            # Leading login column also serves streamer -> subscribers lookups
+            (('login', 'guild_id', 'channel_id'), True),
+        )
+
+class StreamerStatus(Model):
+    login = TextField(unique=True)
+    # Helix stream id and started_at of the current broadcast; null while offline
+    stream_id = TextField(null=True)
+    started_at = TextField(null=True)
+    peak_viewers = IntegerField(default=0)
+
+    class Meta:
+        database = db
+
+class StreamNotification(Model):
+    """A go-live message that is edited while the stream runs."""
+    login = TextField()
+    channel_id = IntegerField()
+    message_id = IntegerField()
+    embed_hash = TextField()  # Hash of the embed last sent, to skip no-op edits
+
+    class Meta:
+        database = db
+        indexes = (
+            (('login', 'channel_id'), True),
+        )
+
+class StreamerSchedule(Model):
+    login = TextField(unique=True)
+    # Go-lives per UTC hour of the week (168 comma-separated counts, Monday 00:00 first)
+    histogram = TextField()
+    last_live_at = DateTimeField(null=True)  # naive UTC
+
+    class Meta:
+        database = db
+
+class BotState(Model):
+    """Small key/value store for bookkeeping such as the last synced command tree."""
+    key = TextField(primary_key=True)
+    value = TextField()
+
+    class Meta:
+        database = db
+
+class Poll(Model):
+    """A reaction poll; votes are tallied in memory from reaction events."""
+    message_id = IntegerField(unique=True)
+    channel_id = IntegerField()
+    guild_id = IntegerField(null=True)
+    question = TextField()
+    options = TextField()  # JSON list of choice labels, in emoji order
+    author_name = TextField()
+    single_choice = BooleanField(default=False)
+    live_results = BooleanField(default=False)
+    created_at = DateTimeField()  # naive UTC
+
+    class Meta:
+        database = db
+
+class OutboxMessage(Model):
+    """A message waiting for the Outbox workers, kept until Discord accepts it."""
+    kind = TextField()  # 'go_live', 'reminder' or 'confession_log'
+    # Destination: a channel, or a user's DMs when channel_id is null
+    channel_id = IntegerField(null=True)
+    user_id = IntegerField(null=True)
+    payload = TextField()  # JSON: content, embed, allowed_mentions, meta
+    attempts = IntegerField(default=0)
+    next_attempt_at = DateTimeField(null=True)  # naive UTC; null means now
+
+    class Meta:
+        database = db
+
+def migrate_streamer_status():
+    """Add columns introduced after the streamerstatus table was first created."""
+    if db.table_exists('streamerstatus') and 'peak_viewers' not in [c.name for c in db.get_columns('streamerstatus')]:
+        db.execute_sql('ALTER TABLE "streamerstatus" ADD COLUMN "peak_viewers" INTEGER NOT NULL DEFAULT 0')
+
+def migrate_reminders():
+    """Add the repeat column to reminder tables created before recurring reminders."""
+    if db.table_exists('reminder') and 'repeat' not in [c.name for c in db.get_columns('reminder')]:
+        db.execute_sql('ALTER TABLE "reminder" ADD COLUMN "repeat" TEXT')
+
+MODELS = [UserInfractions, UserMeowCounts, GuildMeowTotal, ConfessionCounter, Reminder, TwitchUser, Quote,
+          GuildKeyword, StreamerSubscription, StreamerStatus, StreamNotification, StreamerSchedule, BotState,
+          Poll, OutboxMessage]
+
+def init_database(path):
+    """Point the models at the SQLite file at path. Connections open lazily on first query."""
+    db.init(path, pragmas=DB_PRAGMAS, timeout=10)
+
+def prepare_database(legacy_guild_id):
+    """Migrate old schemas and create missing tables. Blocking; runs on the writer thread."""
+    log.info("Database file path: %s", os.path.abspath(db.database))
+    migrate_guild_scoped_counts(legacy_guild_id)
+    migrate_streamer_status()
+    migrate_reminders()
+    db.create_tables(MODELS, safe=True)
+
+class LogSampler(logging.Filter):
+    """Let the first `burst` warnings/errors from each call site through per `window` seconds.
+
+    A failing channel or an unreachable API can log the same error once per
+    message or tick; past the burst the rest are counted, not formatted, and
+    the next record that gets through carries how many were dropped.
+    """
+
+    def __init__(self, burst=5, window=60.0):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        # (logger, file, line) -> [window start, records let through, records dropped]
+        self.sites = {}
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = record.created
+        site = self.sites.get(key)
+        if site is None or now - site[0] >= self.window:
+            dropped = site[2] if site else 0
+            self.sites[key] = [now, 1, 0]
+            if dropped:
+                record.suppressed = dropped
+            return True
+        if site[1] < self.burst:
+            site[1] += 1
+            return True
+        site[2] += 1
+        return False
+
+class LogQueueHandler(QueueHandler):
+    """QueueHandler for a same-process listener.
+
+    The stock prepare() formats the whole record (traceback included) on the
+    calling thread so it can be pickled; here only the message arguments are
+    resolved, and formatting is left to the listener thread.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+class LogFormatter(logging.Formatter):
+    """One line per record: JSON objects for ingestion, or plain text for a terminal."""
+
+    def __init__(self, json_output=False):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+        self.json_output = json_output
+
+    def format(self, record):
+        suppressed = getattr(record, 'suppressed', 0)
+        if not self.json_output:
+            line = super().format(record)
+            return f"{line} ({suppressed} similar suppressed)" if suppressed else line
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if suppressed:
+            entry['suppressed'] = suppressed
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+def setup_logging(level='INFO', json_output=False, stream=None):
+    """Route all logging through a queue to a listener thread that formats and writes it.
+
+    Returns the started QueueListener; stop() it on exit to flush what is queued.
+    """
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(LogFormatter(json_output))
+    log_queue = queue.SimpleQueue()
+    handler = LogQueueHandler(log_queue)
+    handler.addFilter(LogSampler())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    return listener
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus style."""
+
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf; counts are per slot, made cumulative when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate the q-quantile by interpolating inside the bucket that holds it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+class Metrics:
+    """In-process latency histograms, rendered as Prometheus text or summarised for /stats.
+
+    Series are keyed by metric name plus a sorted tuple of label pairs.
+    Everything runs on the event loop except Repository timings, which are
+    recorded from worker threads; a single observe() is a few integer adds,
+    so a lost update under contention would only skew a count by one.
+    """
+
+    HELP = {
+        'meowbot_event_seconds': 'Time spent handling a gateway event or background task iteration.',
+        'meowbot_command_seconds': 'Time from app command dispatch to completion.',
+        'meowbot_db_seconds': 'Time spent executing a database query on a worker thread.',
+        'meowbot_db_wait_seconds': 'Time a database query waited for a free worker thread.',
+        'meowbot_http_seconds': 'Outgoing aiohttp request time (Twitch API, EventSub).',
+        'meowbot_discord_request_seconds': 'Time spent in discord.py REST calls, including its rate limiting.',
+        'meowbot_rate_limit_wait_seconds': 'Time spent waiting for the local send buckets, by source (meow/bark replies, outbox sends, go-live edits).',
+        'meowbot_event_loop_lag_seconds': 'How late the event loop woke a sleeping sampler task.',
+    }
+
+    def __init__(self):
+        self.series = {}
+        self.started_at = time.monotonic()
+        self._runner = None
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.series.get(key)
+        if histogram is None:
+            histogram = self.series[key] = Histogram()
+        histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Observe the time spent in the with block (works inside coroutines too)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def summary(self, name):
+        """Return [(labels dict, count, p50, p99), ...] for one metric, busiest first."""
+        rows = [
+            (dict(labels), histogram.count, histogram.quantile(0.5), histogram.quantile(0.99))
+            for (series_name, labels), histogram in list(self.series.items()) if series_name == name
+        ]
+        return sorted(rows, key=lambda row: row[1], reverse=True)
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = [
+            '# HELP meowbot_uptime_seconds Seconds since the bot process started.',
+            '# TYPE meowbot_uptime_seconds gauge',
+            f'meowbot_uptime_seconds {time.monotonic() - self.started_at:.3f}'
+        ]
+        by_name = defaultdict(list)
+        for (name, labels), histogram in list(self.series.items()):
+            by_name[name].append((labels, histogram))
+        for name in sorted(by_name):
+            lines.append(f'# HELP {name} {self.HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, histogram in sorted(by_name[name], key=lambda item: item[0]):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{self._labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{self._labels(labels)} {histogram.sum:.6f}')
+                lines.append(f'{name}_count{self._labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    async def sample_loop_lag(self, interval=0.5):
+        """Sleep for interval over and over, recording how late each wakeup is."""
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.observe('meowbot_event_loop_lag_seconds', max(0.0, time.perf_counter() - start - interval))
+
+    def trace_config(self):
+        """aiohttp tracing that records every request by host, path, method and status."""
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            context.started_at = time.perf_counter()
+
+        async def on_request_end(session, context, params):
+            self._observe_request(context, params, params.response.status)
+
+        async def on_request_exception(session, context, params):
+            self._observe_request(context, params, 'error')
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        return trace
+
+    def _observe_request(self, context, params, status):
+        self.observe(
+            'meowbot_http_seconds', time.perf_counter() - context.started_at,
+            host=params.url.host, endpoint=params.url.path, method=params.method, status=status
+        )
+
+    async def start_server(self, host, port):
+        """Serve render() at http://host:port/metrics."""
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=self.render(), content_type='text/plain', charset='utf-8',
+                                headers={'X-Content-Type-Options': 'nosniff'})
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        log.info("Serving metrics on http://%s:%s/metrics", host, port)
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+class Repository:
+    """Async data access for the bot's models.
+
+    Queries run off the event loop: writes on one dedicated thread so SQLite
+    never sees competing writers, reads on a small thread pool. peewee keeps
+    one connection per thread, so each worker reuses its own connection.
+    """
+
+    def __init__(self, database, readers=4, metrics=None):
+        self.db = database
+        self.metrics = metrics
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-reader')
+
+    async def read(self, func, *args, **kwargs):
+        """Run a blocking read query on the reader pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, functools.partial(self._timed, 'read', time.perf_counter(), func, *args, **kwargs))
+
+    async def write(self, func, *args, **kwargs):
+        """Run a blocking write on the writer thread inside a transaction."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, functools.partial(self._timed, 'write', time.perf_counter(), self._atomic, func, *args, **kwargs))
+
+    def _atomic(self, func, *args, **kwargs):
+        with self.db.atomic():
+            return func(*args, **kwargs)
+
+    def _timed(self, kind, queued_at, func, *args, **kwargs):
+        if self.metrics is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        self.metrics.observe('meowbot_db_wait_seconds', start - queued_at, kind=kind)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.metrics.observe('meowbot_db_seconds', time.perf_counter() - start, kind=kind)
+
+    async def close(self):
+        """Wait for queued queries to finish and stop the worker threads."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._writer, self.db.close)
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+
+    # Meow / bark counts
+
+    async def load_guild_meow_totals(self):
+        """Return {guild_id: meow_count} from the running per-guild totals."""
+        query = GuildMeowTotal.select(GuildMeowTotal.guild_id, GuildMeowTotal.meow_count)
+        return await self.read(lambda: dict(query.tuples()))
+
+    async def get_meow_count(self, guild_id, user_id):
+        row = await self.read(UserMeowCounts.get_or_none, guild_id=guild_id, user_id=user_id)
+        return row.meow_count if row else 0
+
+    async def get_infractions(self, guild_id, user_id):
+        row = await self.read(UserInfractions.get_or_none, guild_id=guild_id, user_id=user_id)
+        return row.infractions if row else 0
+
+    async def top_meows(self, guild_id, limit=10):
+        """Return [(user_id, meow_count), ...] for a guild's top meowers."""
+        query = (UserMeowCounts
+                 .select(UserMeowCounts.user_id, UserMeowCounts.meow_count)
+                 .where(UserMeowCounts.guild_id == guild_id)
+                 .order_by(UserMeowCounts.meow_count.desc())
+                 .limit(limit))
+        return await self.read(lambda: list(query.tuples()))
+
+    async def top_barks(self, guild_id, limit=10):
+        """Return [(user_id, infractions), ...] for a guild's top barkers."""
+        query = (UserInfractions
+                 .select(UserInfractions.user_id, UserInfractions.infractions)
+                 .where(UserInfractions.guild_id == guild_id)
+                 .order_by(UserInfractions.infractions.desc())
+                 .limit(limit))
+        return await self.read(lambda: list(query.tuples()))
+
+    async def apply_counter_deltas(self, meows, barks):
+        """UPSERT meow/bark deltas keyed by (guild_id, user_id) in one transaction.
+
+        Also advances each guild's running meow total. Returns
+        ({(guild_id, user_id): meow_count}, {(guild_id, user_id): infractions})
+        with the new totals of every row that was touched.
+        """
+        return await self.write(self._apply_counter_deltas, meows, barks)
+
+    @staticmethod
+    def _apply_counter_deltas(meows, barks):
+        for batch in chunked(meows.items(), 100):
+            (UserMeowCounts
+             .insert_many([(g, u, n) for (g, u), n in batch],
+                          fields=[UserMeowCounts.guild_id, UserMeowCounts.user_id, UserMeowCounts.meow_count])
+             .on_conflict(
+                 conflict_target=[UserMeowCounts.guild_id, UserMeowCounts.user_id],
+                 update={UserMeowCounts.meow_count: UserMeowCounts.meow_count + EXCLUDED.meow_count})
+             .execute())
+        for batch in chunked(barks.items(), 100):
+            (UserInfractions
+             .insert_many([(g, u, n) for (g, u), n in batch],
+                          fields=[UserInfractions.guild_id, UserInfractions.user_id, UserInfractions.infractions])
+             .on_conflict(
+                 conflict_target=[UserInfractions.guild_id, UserInfractions.user_id],
+                 update={UserInfractions.infractions: UserInfractions.infractions + EXCLUDED.infractions})
+             .execute())
+
+        guild_meows = defaultdict(int)
+        for (guild_id, _), amount in meows.items():
+            guild_meows[guild_id] += amount
+        for batch in chunked(guild_meows.items(), 100):
+            (GuildMeowTotal
+             .insert_many(batch, fields=[GuildMeowTotal.guild_id, GuildMeowTotal.meow_count])
+             .on_conflict(
+                 conflict_target=[GuildMeowTotal.guild_id],
+                 update={GuildMeowTotal.meow_count: GuildMeowTotal.meow_count + EXCLUDED.meow_count})
+             .execute())
+
+        meow_totals = {}
+        for batch in chunked(meows, 100):
+            query = (UserMeowCounts
+                     .select(UserMeowCounts.guild_id, UserMeowCounts.user_id, UserMeowCounts.meow_count)
+                     .where(Tuple(UserMeowCounts.guild_id, UserMeowCounts.user_id).in_(batch)))
+            meow_totals.update(((g, u), n) for g, u, n in query.tuples())
+        bark_totals = {}
+        for batch in chunked(barks, 100):
+            query = (UserInfractions
+                     .select(UserInfractions.guild_id, UserInfractions.user_id, UserInfractions.infractions)
+                     .where(Tuple(UserInfractions.guild_id, UserInfractions.user_id).in_(batch)))
+            bark_totals.update(((g, u), n) for g, u, n in query.tuples())
+        return meow_totals, bark_totals
+
+    # Keywords
+
+    async def load_guild_keywords(self):
+        """Return {guild_id: {keyword: category}} for every guild with extra keywords."""
+        def load():
+            keywords = defaultdict(dict)
+            for guild_id, keyword, category in GuildKeyword.select(
+                    GuildKeyword.guild_id, GuildKeyword.keyword, GuildKeyword.category).tuples():
+                keywords[guild_id][keyword] = category
+            return dict(keywords)
+        return await self.read(load)
+
+    async def save_guild_keyword(self, guild_id, keyword, category):
+        await self.write(lambda: GuildKeyword
+                         .insert(guild_id=guild_id, keyword=keyword, category=category)
+                         .on_conflict(conflict_target=[GuildKeyword.guild_id, GuildKeyword.keyword],
+                                      update={GuildKeyword.category: category})
+                         .execute())
+
+    async def delete_guild_keyword(self, guild_id, keyword):
+        return await self.write(lambda: GuildKeyword.delete()
+                                .where((GuildKeyword.guild_id == guild_id) & (GuildKeyword.keyword == keyword))
+                                .execute())
+
+    # Reminders
+
+    async def load_reminders(self):
+        """Return every stored reminder as a dict, earliest first."""
+        query = Reminder.select().order_by(Reminder.remind_time)
+        return await self.read(lambda: list(query.dicts()))
+
+    async def add_reminder(self, user_id, channel_id, remind_time, text, repeat=None):
+        """Store a reminder and return it as a dict including its id."""
+        reminder = await self.write(
+            Reminder.create, user_id=user_id, channel_id=channel_id, remind_time=remind_time, text=text, repeat=repeat
+        )
+        return {
+            "id": reminder.id,
+            "user_id": user_id,
+            "channel_id": channel_id,
+            "remind_time": remind_time,
+            "text": text,
+            "repeat": repeat
+        }
+
+    async def delete_reminder(self, reminder_id):
+        await self.write(lambda: Reminder.delete().where(Reminder.id == reminder_id).execute())
+
+    # Twitch
+
+    async def load_twitch_user_ids(self):
+        """Return the cached {login: user_id} map."""
+        return await self.read(lambda: dict(TwitchUser.select(TwitchUser.login, TwitchUser.user_id).tuples()))
+
+    async def save_twitch_user_ids(self, user_ids):
+        def upsert():
+            for batch in chunked(user_ids.items(), 100):
+                (TwitchUser
+                 .insert_many(batch, fields=[TwitchUser.login, TwitchUser.user_id])
+                 .on_conflict(conflict_target=[TwitchUser.login], update={TwitchUser.user_id: EXCLUDED.user_id})
+                 .execute())
+        await self.write(upsert)
+
+    async def load_streamer_subscriptions(self):
+        """Return every (login, guild_id, channel_id, role_id) subscription."""
+        query = StreamerSubscription.select(
+            StreamerSubscription.login, StreamerSubscription.guild_id,
+            StreamerSubscription.channel_id, StreamerSubscription.role_id
+        )
+        return await self.read(lambda: list(query.tuples()))
+
+    async def save_streamer_subscription(self, login, guild_id, channel_id, role_id):
+        await self.write(lambda: StreamerSubscription
+                         .insert(login=login, guild_id=guild_id, channel_id=channel_id, role_id=role_id)
+                         .on_conflict(conflict_target=[StreamerSubscription.login, StreamerSubscription.guild_id,
+                                                       StreamerSubscription.channel_id],
+                                      update={StreamerSubscription.role_id: role_id})
+                         .execute())
+
+    async def delete_streamer_subscriptions(self, login, guild_id, channel_id=None):
+        condition = (StreamerSubscription.login == login) & (StreamerSubscription.guild_id == guild_id)
+        if channel_id is not None:
+            condition &= StreamerSubscription.channel_id == channel_id
+        return await self.write(lambda: StreamerSubscription.delete().where(condition).execute())
+
+    async def load_streamer_status(self):
+        """Return {login: status record} for streamers last seen live, including their notification messages."""
+        def load():
+            status = {
+                row.login: {
+                    'stream_id': row.stream_id,
+                    'started_at': row.started_at,
+                    'peak_viewers': row.peak_viewers,
+                    'messages': {}
+                }
+                for row in StreamerStatus.select().where(StreamerStatus.stream_id.is_null(False))
+            }
+            for login, channel_id, message_id, embed_hash in StreamNotification.select(
+                StreamNotification.login, StreamNotification.channel_id,
+                StreamNotification.message_id, StreamNotification.embed_hash
+            ).tuples():
+                if login in status:
+                    status[login]['messages'][channel_id] = (message_id, embed_hash)
+            return status
+        return await self.read(load)
+
+    async def save_streamer_status(self, login, stream_id, started_at, peak_viewers=0):
+        await self.write(self._upsert_streamer_status, login, stream_id, started_at, peak_viewers)
+
+    @staticmethod
+    def _upsert_streamer_status(login, stream_id, started_at, peak_viewers=0):
+        (StreamerStatus
+         .insert(login=login, stream_id=stream_id, started_at=started_at, peak_viewers=peak_viewers)
+         .on_conflict(conflict_target=[StreamerStatus.login],
+                      update={StreamerStatus.stream_id: stream_id,
+                              StreamerStatus.started_at: started_at,
+                              StreamerStatus.peak_viewers: peak_viewers})
+         .execute())
+
+    async def save_stream_notifications(self, login, messages):
+        """Upsert {channel_id: (message_id, embed_hash)} for login's live notification."""
+        rows = [(login, channel_id, message_id, embed_hash) for channel_id, (message_id, embed_hash) in messages.items()]
+        fields = [StreamNotification.login, StreamNotification.channel_id,
+                  StreamNotification.message_id, StreamNotification.embed_hash]
+
+        def upsert():
+            for batch in chunked(rows, 100):
+                (StreamNotification
+                 .insert_many(batch, fields=fields)
+                 .on_conflict(conflict_target=[StreamNotification.login, StreamNotification.channel_id],
+                              update={StreamNotification.message_id: EXCLUDED.message_id,
+                                      StreamNotification.embed_hash: EXCLUDED.embed_hash})
+                 .execute())
+        await self.write(upsert)
+
+    async def delete_stream_notifications(self, login):
+        await self.write(lambda: StreamNotification.delete().where(StreamNotification.login == login).execute())
+
+    async def load_streamer_schedules(self):
+        """Return {login: (histogram list, last_live_at)}."""
+        query = StreamerSchedule.select(StreamerSchedule.login, StreamerSchedule.histogram, StreamerSchedule.last_live_at)
+        return await self.read(lambda: {
+            login: ([int(count) for count in histogram.split(',')], last_live_at)
+            for login, histogram, last_live_at in query.tuples()
+        })
+
+    async def save_streamer_schedule(self, login, histogram, last_live_at):
+        encoded = ','.join(map(str, histogram))
+        await self.write(lambda: StreamerSchedule
+                         .insert(login=login, histogram=encoded, last_live_at=last_live_at)
+                         .on_conflict(conflict_target=[StreamerSchedule.login],
+                                      update={StreamerSchedule.histogram: encoded,
+                                              StreamerSchedule.last_live_at: last_live_at})
+                         .execute())
+
+    # Bookkeeping
+
+    async def get_state(self, key):
+        query = BotState.select(BotState.value).where(BotState.key == key)
+        return await self.read(query.scalar)
+
+    async def set_state(self, key, value):
+        await self.write(lambda: BotState.replace(key=key, value=value).execute())
+
+    # Quotes
+
+    async def load_quote_ids(self, channel_id):
+        query = Quote.select(Quote.message_id).where(Quote.channel_id == channel_id)
+        return await self.read(lambda: [row[0] for row in query.tuples()])
+
+    async def latest_quote_id(self, channel_id):
+        query = Quote.select(fn.MAX(Quote.message_id)).where(Quote.channel_id == channel_id)
+        return await self.read(query.scalar)
+
+    async def get_quote(self, message_id):
+        return await self.read(Quote.get_or_none, Quote.message_id == message_id)
+
+    async def save_quotes(self, quotes):
+        """Insert or replace quote rows (dicts keyed by Quote field name)."""
+        def upsert():
+            for batch in chunked(quotes, 100):
+                Quote.insert_many(batch).on_conflict_replace().execute()
+        await self.write(upsert)
+
+    async def delete_quotes(self, message_ids):
+        await self.write(lambda: Quote.delete().where(Quote.message_id.in_(list(message_ids))).execute())
+
+    # Polls
+
+    async def load_polls(self):
+        """Return every stored poll as a dict with its options decoded."""
+        def load():
+            polls = list(Poll.select().dicts())
+            for poll in polls:
+                poll['options'] = json.loads(poll['options'])
+            return polls
+        return await self.read(load)
+
+    async def save_poll(self, poll):
+        """Store a poll dict (keyed by Poll field name)."""
+        await self.write(lambda: Poll.insert(**{**poll, 'options': json.dumps(poll['options'])}).execute())
+
+    async def delete_polls(self, message_ids):
+        await self.write(lambda: Poll.delete().where(Poll.message_id.in_(list(message_ids))).execute())
+
+    # Outbox
+
+    async def load_outbox(self):
+        """Return every undelivered outbox message as a dict, oldest first."""
+        query = OutboxMessage.select().order_by(OutboxMessage.id)
+
+        def load():
+            messages = list(query.dicts())
+            for message in messages:
+                message['payload'] = json.loads(message['payload'])
+            return messages
+        return await self.read(load)
+
+    async def add_outbox_messages(self, messages, delete_reminder_ids=(), reminder_times=None, streamer_status=None):
+        """Store messages, setting each one's 'id'.
+
+        Reminders passed along are deleted, or for recurring ones moved to
+        their next time ({id: remind_time}), in the same transaction, so each
+        occurrence is handed to the outbox exactly once. Likewise a
+        streamer_status (save_streamer_status arguments) is only marked live
+        if its go-live posts are stored.
+        """
+        def insert():
+            for message in messages:
+                message['id'] = OutboxMessage.insert(
+                    kind=message['kind'], channel_id=message['channel_id'], user_id=message['user_id'],
+                    payload=json.dumps(message['payload']), attempts=message['attempts'],
+                    next_attempt_at=message['next_attempt_at']
+                ).execute()
+            if delete_reminder_ids:
+                Reminder.delete().where(Reminder.id.in_(list(delete_reminder_ids))).execute()
+            for reminder_id, remind_time in (reminder_times or {}).items():
+                Reminder.update(remind_time=remind_time).where(Reminder.id == reminder_id).execute()
+            if streamer_status:
+                self._upsert_streamer_status(*streamer_status)
+        await self.write(insert)
+
+    async def delete_outbox_message(self, message_id):
+        await self.write(lambda: OutboxMessage.delete().where(OutboxMessage.id == message_id).execute())
+
+    async def reschedule_outbox_message(self, message_id, attempts, next_attempt_at):
+        await self.write(lambda: OutboxMessage
+                         .update(attempts=attempts, next_attempt_at=next_attempt_at)
+                         .where(OutboxMessage.id == message_id)
+                         .execute())
+
+    # Confessions
+
+    async def next_confession_number(self):
+        """Allocate the next confession number with one upsert, so concurrent callers never share one."""
+        query = (ConfessionCounter
+                 .insert(id=1, count=1)
+                 .on_conflict(conflict_target=[ConfessionCounter.id],
+                              update={ConfessionCounter.count: ConfessionCounter.count + 1})
+                 .returning(ConfessionCounter.count))
+        return await self.write(lambda: query.tuples().execute()[0][0])
+
+    async def release_confession_number(self, number):
+        """Give back a number that was never posted, unless a later confession already took the next one."""
+        await self.write(lambda: ConfessionCounter
+                         .update(count=ConfessionCounter.count - 1)
+                         .where((ConfessionCounter.id == 1) & (ConfessionCounter.count == number))
+                         .execute())
+
+@dataclass(frozen=True)
+class Settings:
+    """Bot configuration, read once from the environment (and .env) by Settings.from_env()."""
+    discord_bot_token: Optional[str] = None
+    # The server the bot ran in before counts were tracked per guild
+    discord_guild_id: Optional[int] = None
+    database_path: str = 'bot_data.db'
+
+    # Twitch credentials
+    twitch_client_id: Optional[str] = None
+    twitch_secret: Optional[str] = None
+    # Discord channel that announces STREAMER_NAMES
+    twitch_channel_id: Optional[int] = None
+    streamer_names: tuple = ()
+    helix_url: str = 'https://api.twitch.tv/helix'
+    twitch_token_url: str = 'https://id.twitch.tv/oauth2/token'
+    # The poller wakes every tick and checks the streamers whose adaptive interval is up
+    twitch_poll_tick: float = 60.0
+
+    # Optional EventSub push mode: '' (polling only), 'websocket' or 'webhook'
+    eventsub_mode: str = ''
+    eventsub_ws_url: str = 'wss://eventsub.wss.twitch.tv/ws'
+    # Defaults to {helix_url}/eventsub/subscriptions
+    eventsub_subscriptions_url: Optional[str] = None
+    # WebSocket subscriptions must be created with a user access token for twitch_client_id
+    eventsub_user_token: Optional[str] = None
+    # Webhook transport: public HTTPS callback that forwards to the local receiver
+    eventsub_callback_url: Optional[str] = None
+    eventsub_secret: Optional[str] = None
+    eventsub_host: str = '0.0.0.0'
+    eventsub_port: int = 8080
+    # With EventSub active, streamers it covers are only polled this often, to catch missed events
+    twitch_reconcile_minutes: float = 30.0
+
+    # Confession channels
+    confess_channel_id: Optional[int] = None
+    confess_log_channel_id: Optional[int] = None
+    # Quotes channel
+    quotes_channel_id: Optional[int] = None
+
+    # Write-behind counter settings (seconds between flushes, pending users before an early flush)
+    counter_flush_interval: float = 5.0
+    counter_flush_threshold: int = 500
+    # Meow/bark replies in a channel are merged into at most one message per window
+    reply_coalesce_window: float = 2.0
+    # Members joining within this many seconds of each other are welcomed in one message
+    welcome_batch_window: float = 2.0
+    # Keyword matching modes: whole words only, Unicode case folding
+    keyword_word_boundary: bool = False
+    keyword_casefold: bool = False
+    # Sync the global command tree on startup even if its fingerprint is unchanged
+    force_command_sync: bool = False
+    # Prometheus text endpoint at http://metrics_host:metrics_port/metrics; off unless a port is set
+    metrics_port: Optional[int] = None
+    metrics_host: str = '127.0.0.1'
+    # Workers delivering queued go-live posts, reminders and confession logs
+    outbox_workers: int = 4
+    # Log level and format: 'text' for a terminal, 'json' for one JSON object per line
+    log_level: str = 'INFO'
+    log_format: str = 'text'
+
+    @property
+    def legacy_guild_id(self):
+        return self.discord_guild_id or DM_GUILD_ID
+
+    @property
+    def subscriptions_url(self):
+        return self.eventsub_subscriptions_url or f'{self.helix_url}/eventsub/subscriptions'
+
+    @classmethod
+    def from_env(cls, dotenv=True):
+        """Build settings from environment variables, loading .env first unless dotenv is False."""
+        if dotenv:
+            load_dotenv()
+        env = os.environ
+
+        def optional_int(name):
+            value = env.get(name, '').strip()
+            return int(value) if value else None
+
+        def flag(name):
+            return env.get(name, 'false').strip().lower() == 'true'
+
+        defaults = cls()
+        return cls(
+            discord_bot_token=env.get('DISCORD_BOT_TOKEN'),
+            discord_guild_id=optional_int('DISCORD_GUILD_ID'),
+            database_path=env.get('DATABASE_PATH', defaults.database_path),
+            twitch_client_id=env.get('TWITCH_CLIENT_ID'),
+            twitch_secret=env.get('TWITCH_SECRET'),
+            twitch_channel_id=optional_int('TWITCH_CHANNEL_ID'),
+            streamer_names=tuple(name.strip().lower() for name in env.get('STREAMER_NAMES', '').split(',') if name.strip()),
+            helix_url=env.get('TWITCH_HELIX_URL', defaults.helix_url),
+            twitch_token_url=env.get('TWITCH_TOKEN_URL', defaults.twitch_token_url),
+            twitch_poll_tick=float(env.get('TWITCH_POLL_TICK', defaults.twitch_poll_tick)),
+            eventsub_mode=env.get('TWITCH_EVENTSUB_MODE', '').strip().lower(),
+            eventsub_ws_url=env.get('TWITCH_EVENTSUB_WS_URL', defaults.eventsub_ws_url),
+            eventsub_subscriptions_url=env.get('TWITCH_EVENTSUB_SUBSCRIPTIONS_URL'),
+            eventsub_user_token=env.get('TWITCH_EVENTSUB_USER_TOKEN'),
+            eventsub_callback_url=env.get('TWITCH_EVENTSUB_CALLBACK_URL'),
+            eventsub_secret=env.get('TWITCH_EVENTSUB_SECRET'),
+            eventsub_host=env.get('TWITCH_EVENTSUB_HOST', defaults.eventsub_host),
+            eventsub_port=int(env.get('TWITCH_EVENTSUB_PORT', defaults.eventsub_port)),
+            twitch_reconcile_minutes=float(env.get('TWITCH_RECONCILE_MINUTES', defaults.twitch_reconcile_minutes)),
+            confess_channel_id=optional_int('CONFESS_CHANNEL_ID'),
+            confess_log_channel_id=optional_int('CONFESS_LOG_CHANNEL_ID'),
+            quotes_channel_id=optional_int('QUOTES_CHANNEL_ID'),
+            counter_flush_interval=float(env.get('COUNTER_FLUSH_INTERVAL', defaults.counter_flush_interval)),
+            counter_flush_threshold=int(env.get('COUNTER_FLUSH_THRESHOLD', defaults.counter_flush_threshold)),
+            reply_coalesce_window=float(env.get('REPLY_COALESCE_WINDOW', defaults.reply_coalesce_window)),
+            welcome_batch_window=float(env.get('WELCOME_BATCH_WINDOW', defaults.welcome_batch_window)),
+            keyword_word_boundary=flag('KEYWORD_WORD_BOUNDARY'),
+            keyword_casefold=flag('KEYWORD_CASEFOLD'),
+            force_command_sync=flag('FORCE_COMMAND_SYNC'),
+            metrics_port=optional_int('METRICS_PORT'),
+            metrics_host=env.get('METRICS_HOST', defaults.metrics_host),
+            outbox_workers=int(env.get('OUTBOX_WORKERS', defaults.outbox_workers)),
+            log_level=env.get('LOG_LEVEL', defaults.log_level).strip().upper(),
+            log_format=env.get('LOG_FORMAT', defaults.log_format).strip().lower()
+        )
+
+# Refresh the app token this many seconds before Twitch says it expires
+TWITCH_TOKEN_REFRESH_MARGIN = 600
+# Helix accepts at most 100 repeated login/user_id values per request
+HELIX_BATCH_SIZE = 100
+# Per-streamer check intervals in seconds, picked from their go-live history
+TWITCH_POLL_INTERVALS = {
+    'live': 120,        # Catch the end of the stream and keep the viewer count fresh
+    'usual time': 60,   # Within an hour of a time slot they often go live in
+    'learning': 300,    # Too little history to predict; the old fixed cadence
+    'off hours': 900,   # Has a schedule, and this isn't part of it
+    'dormant': 1800     # Hasn't been live for TWITCH_DORMANT_DAYS
+}
+TWITCH_DORMANT_DAYS = 30
+# A live announcement is refreshed at most this often (seconds); the offline summary is not held back
+GO_LIVE_EDIT_INTERVAL = 300
+# Number of users shown on /top_meows and /top_barks
+LEADERBOARD_SIZE = 10
+# Built-in keywords and the categories keywords can count towards
+DEFAULT_KEYWORDS = {'meow': 'meow', 'woof': 'bark', 'bark': 'bark'}
+KEYWORD_CATEGORIES = ('meow', 'bark')
+
+# Local model of Discord's per-channel send bucket (messages per period, in seconds)
+CHANNEL_SEND_LIMIT = (5, 5.0)
+# Outbox sends across all channels per second, under Discord's global limit of 50
+GLOBAL_SEND_LIMIT = (45, 1.0)
+# Discord's limit on message content length
+MESSAGE_LIMIT = 2000
+
+# Cogs, loaded as extensions so they can be reloaded without reconnecting
+EXTENSIONS = ('cogs.twitch', 'cogs.meow', 'cogs.reminders', 'cogs.confess', 'cogs.polls', 'cogs.stats')
+
+class KeywordMatcher:
+    """Counts keyword hits per category in a single scan of the message.
+
+    Every keyword is compiled into one alternation, so a single findall pass
+    over the lowercased (or case-folded) text yields all counts. Matches
+    don't overlap, which only differs from separate str.count() calls when
+    two keywords share letters at a boundary (e.g. 'meowoof').
+    """
+
+    def __init__(self, rules, word_boundary=False, casefold=False):
+        # Case folding also handles ß/ss and friends, at a small cost over lower()
+        self._normalize = str.casefold if casefold else str.lower
+        self._categories = {self._normalize(keyword): category for keyword, category in rules.items()}
+        # Longest first so 'meowmeow' wins over 'meow' when both are keywords
+        keywords = sorted(self._categories, key=len, reverse=True)
+        pattern = '|'.join(re.escape(keyword) for keyword in keywords)
+        if word_boundary:
+            pattern = rf'\b(?:{pattern})\b'
+        self._regex = re.compile(pattern)
+
+    def count(self, text):
+        """Return {category: hits} for the categories that matched at least once."""
+        counts = {}
+        for keyword in self._regex.findall(self._normalize(text)):
+            category = self._categories[keyword]
+            counts[category] = counts.get(category, 0) + 1
+        return counts
+
+class KeywordRules:
+    """Compiled keyword matchers: the default set plus per-guild extras."""
+
+    def __init__(self, guild_keywords=None, word_boundary=False, casefold=False):
+        self._options = {'word_boundary': word_boundary, 'casefold': casefold}
+        self.default = KeywordMatcher(DEFAULT_KEYWORDS, **self._options)
+        self.guild_keywords = {}
+        self._matchers = {}
+        for guild_id, keywords in (guild_keywords or {}).items():
+            self.set_guild_keywords(guild_id, keywords)
+
+    def matcher_for(self, guild_id):
+        return self._matchers.get(guild_id, self.default)
+
+    def set_guild_keywords(self, guild_id, keywords):
+        """Recompile a guild's matcher after its extra keywords change."""
+        if keywords:
+            self.guild_keywords[guild_id] = dict(keywords)
+            self._matchers[guild_id] = KeywordMatcher({**DEFAULT_KEYWORDS, **keywords}, **self._options)
+        else:
+            self.guild_keywords.pop(guild_id, None)
+            self._matchers.pop(guild_id, None)
+
+class Leaderboard:
+    """The top LEADERBOARD_SIZE users by count, kept current as counts change.
+
+    Counts only ever go up, so a user outside the board can only join it by
+    passing the lowest score on it. Feeding every new total through update()
+    therefore keeps the board exact without ever re-querying the table.
+    """
+
+    def __init__(self, entries=(), size=LEADERBOARD_SIZE):
+        self.size = size
+        self._scores = dict(entries)
+
+    def __len__(self):
+        return len(self._scores)
+
+    def update(self, user_id, total):
+        if user_id in self._scores or len(self._scores) < self.size:
+            self._scores[user_id] = total
+            return
+        lowest_id = min(self._scores, key=self._scores.get)
+        if total > self._scores[lowest_id]:
+            del self._scores[lowest_id]
+            self._scores[user_id] = total
+
+    def ranked(self):
+        """Return [(user_id, count), ...] highest first."""
+        return sorted(self._scores.items(), key=lambda item: item[1], reverse=True)
+
+class DisplayNameCache:
+    """TTL cache of user display names for users outside the guild member cache."""
+
+    def __init__(self, bot, ttl=3600):
+        self.bot = bot
+        self.ttl = ttl
+        self._names = {}
+
+    async def resolve(self, guild, user_ids):
+        """Return {user_id: display name}, fetching unknown users concurrently."""
+        names = {}
+        missing = []
+        now = time.monotonic()
+        for user_id in user_ids:
+            # Try to get guild member first (for the server nickname)
+            member = guild.get_member(user_id) if guild else None
+            if member:
+                names[user_id] = member.display_name
+            elif user_id in self._names and self._names[user_id][1] > now:
+                names[user_id] = self._names[user_id][0]
+            else:
+                missing.append(user_id)
+
+        if missing:
+            results = await asyncio.gather(*(self._fetch_user(user_id) for user_id in missing), return_exceptions=True)
+            for user_id, user in zip(missing, results):
+                if isinstance(user, Exception):
+                    # Final fallback - show user ID
+                    names[user_id] = f"User ID: {user_id}"
+                else:
+                    names[user_id] = user.display_name
+                    self._names[user_id] = (user.display_name, now + self.ttl)
+        return names
+
+    async def _fetch_user(self, user_id):
+        with self.bot.metrics.timer('meowbot_discord_request_seconds', call='fetch_user'):
+            return await self.bot.fetch_user(user_id)
+
+class CounterBuffer:
+    """Write-behind buffer for per-guild meow and bark tallies.
+
+    Deltas are accumulated in memory keyed by (guild_id, user_id) and written
+    to the database in a single transaction using an UPSERT, instead of one
+    get_or_create/save round trip per message.
+    """
+
+    def __init__(self, repo, flush_threshold=500):
+        self.repo = repo
+        self.flush_threshold = flush_threshold
+        self.meow_deltas = {}
+        self.bark_deltas = {}
+        self.guild_meow_deltas = {}
+        # Last persisted totals, so replies don't need a read per message
+        self.bark_totals = {}
+        self.guild_meow_totals = {}
+        self._inflight_meows = {}
+        self._inflight_barks = {}
+        self._inflight_guild_meows = {}
+        self._flush_lock = asyncio.Lock()
+        # guild_id -> Leaderboard, seeded lazily the first time a guild asks
+        self.meow_leaderboards = {}
+        self.bark_leaderboards = {}
+
+    async def load_guild_totals(self):
+        """Load the running per-guild meow totals (once, at startup)."""
+        async with self._flush_lock:
+            self.guild_meow_totals = await self.repo.load_guild_meow_totals()
+
+    async def meow_leaderboard(self, guild_id):
+        return await self._leaderboard(self.meow_leaderboards, self.repo.top_meows, guild_id)
+
+    async def bark_leaderboard(self, guild_id):
+        return await self._leaderboard(self.bark_leaderboards, self.repo.top_barks, guild_id)
+
+    async def _leaderboard(self, leaderboards, load, guild_id):
+        if guild_id not in leaderboards:
+            # Seed under the flush lock so no flush lands between the read and the cache
+            async with self._flush_lock:
+                if guild_id not in leaderboards:
+                    leaderboards[guild_id] = Leaderboard(await load(guild_id, LEADERBOARD_SIZE))
+        return leaderboards[guild_id]
+
+    def __len__(self):
+        return len(self.meow_deltas) + len(self.bark_deltas)
+
+    @property
+    def should_flush(self):
+        return len(self) >= self.flush_threshold
+
+    def add_meows(self, guild_id, user_id, amount):
+        key = (guild_id, user_id)
+        self.meow_deltas[key] = self.meow_deltas.get(key, 0) + amount
+        self.guild_meow_deltas[guild_id] = self.guild_meow_deltas.get(guild_id, 0) + amount
+
+    def add_barks(self, guild_id, user_id, amount):
+        key = (guild_id, user_id)
+        self.bark_deltas[key] = self.bark_deltas.get(key, 0) + amount
+
+    def pending_meows(self, guild_id, user_id):
+        key = (guild_id, user_id)
+        return self.meow_deltas.get(key, 0) + self._inflight_meows.get(key, 0)
+
+    def pending_barks(self, guild_id, user_id):
+        key = (guild_id, user_id)
+        return self.bark_deltas.get(key, 0) + self._inflight_barks.get(key, 0)
+
+    def guild_meow_total(self, guild_id):
+        """Return a guild's exact meow total in O(1), including pending deltas."""
+        return (self.guild_meow_totals.get(guild_id, 0)
+                + self.guild_meow_deltas.get(guild_id, 0)
+                + self._inflight_guild_meows.get(guild_id, 0))
+
+    async def get_meow_count(self, guild_id, user_id):
+        """Return the exact meow total for a user, including pending deltas."""
+        # Hold the flush lock so a concurrent flush can't be counted twice
+        async with self._flush_lock:
+            return await self.repo.get_meow_count(guild_id, user_id) + self.pending_meows(guild_id, user_id)
+
+    async def get_infractions(self, guild_id, user_id):
+        """Return the exact infraction total for a user, including pending deltas."""
+        key = (guild_id, user_id)
+        if key not in self.bark_totals:
+            async with self._flush_lock:
+                if key not in self.bark_totals:
+                    self.bark_totals[key] = await self.repo.get_infractions(guild_id, user_id)
+        return self.bark_totals[key] + self.pending_barks(guild_id, user_id)
+
+    async def flush(self):
+        """Write all pending deltas to the database in one transaction."""
+        async with self._flush_lock:
+            if not self.meow_deltas and not self.bark_deltas:
+                return
+            # Deltas stay visible to readers as "in flight" until the write lands
+            self._inflight_meows, self.meow_deltas = self.meow_deltas, {}
+            self._inflight_barks, self.bark_deltas = self.bark_deltas, {}
+            self._inflight_guild_meows, self.guild_meow_deltas = self.guild_meow_deltas, {}
+            meows, barks = self._inflight_meows, self._inflight_barks
+            try:
+                meow_totals, bark_totals = await self.repo.apply_counter_deltas(meows, barks)
+                for guild_id, amount in self._inflight_guild_meows.items():
+                    self.guild_meow_totals[guild_id] = self.guild_meow_totals.get(guild_id, 0) + amount
+                self.bark_totals.update(bark_totals)
+                for (guild_id, user_id), total in meow_totals.items():
+                    if guild_id in self.meow_leaderboards:
+                        self.meow_leaderboards[guild_id].update(user_id, total)
+                for (guild_id, user_id), total in bark_totals.items():
+                    if guild_id in self.bark_leaderboards:
+                        self.bark_leaderboards[guild_id].update(user_id, total)
+            except Exception:
+                # Put the deltas back so nothing is lost; the next flush retries them
+                for (guild_id, user_id), amount in meows.items():
+                    self.add_meows(guild_id, user_id, amount)
+                for (guild_id, user_id), amount in barks.items():
+                    self.add_barks(guild_id, user_id, amount)
+                raise
+            finally:
+                self._inflight_meows = {}
+                self._inflight_barks = {}
+                self._inflight_guild_meows = {}
+
+class ChannelReplies:
+    """Pending meow/bark reply state for one channel."""
+
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.meows = 0
+        self.meow_messages = 0
+        self.barkers = {}
+        self.since = None
+        self.task = None
+        # Monotonic times of recent sends, for the local rate bucket
+        self.sent = []
+
+    @property
+    def pending(self):
+        return bool(self.meow_messages or self.barkers)
+
+    def take(self):
+        """Return and clear the pending batch."""
+        batch = (self.meows, self.meow_messages, list(self.barkers), self.since)
+        self.meows = 0
+        self.meow_messages = 0
+        self.barkers = {}
+        self.since = None
+        return batch
+
+class ReplyCoalescer:
+    """Per-channel outbound queue that merges meow/bark replies.
+
+    The first reply in a quiet channel goes out immediately. Anything that
+    arrives while the channel is cooling down is merged into one message
+    sent when the window ends, e.g. "Meow count: 10412 (+37 in the last
+    2s)". Counts are read at send time, so intermediate totals that are
+    already out of date are never sent.
+    """
+
+    def __init__(self, bot, window=2.0, send_limit=CHANNEL_SEND_LIMIT):
+        self.bot = bot
+        self.window = window
+        self.send_limit = send_limit
+        self._channels = {}
+
+    def add_meows(self, channel, guild_id, amount):
+        state = self._state(channel, guild_id)
+        state.meows += amount
+        state.meow_messages += 1
+        self._schedule(channel, state)
+
+    def add_bark(self, channel, guild_id, user_id):
+        state = self._state(channel, guild_id)
+        state.barkers[user_id] = True
+        self._schedule(channel, state)
+
+    def close(self):
+        for state in self._channels.values():
+            if state.task:
+                state.task.cancel()
+
+    def _state(self, channel, guild_id):
+        state = self._channels.get(channel.id)
+        if state is None:
+            state = self._channels[channel.id] = ChannelReplies(guild_id)
+        if state.since is None:
+            state.since = time.monotonic()
+        return state
+
+    def _schedule(self, channel, state):
+        if state.task is None:
+            state.task = asyncio.create_task(self._drain(channel, state))
+
+    async def _drain(self, channel, state):
+        try:
+            while state.pending:
+                await self._wait_for_bucket(state)
+                try:
+                    content = await self._render(state, *state.take())
+                    # Name offenders without pinging them
+                    with self.bot.metrics.timer('meowbot_discord_request_seconds', call='channel.send'):
+                        await channel.send(content, allowed_mentions=discord.AllowedMentions.none())
+                except Exception as e:
+                    # Don't retry: by the next window a fresher count will be sent anyway
+                    meow_log.error("Error sending meow/bark reply to %s: %s", channel.id, e)
+                state.sent.append(time.monotonic())
+                # Cool down so the next burst is merged rather than sent message by message
+                await asyncio.sleep(self.window)
+        finally:
+            state.task = None
+            if not state.pending:
+                self._channels.pop(channel.id, None)
+
+    async def _wait_for_bucket(self, state):
+        limit, period = self.send_limit
+        now = time.monotonic()
+        state.sent = [sent for sent in state.sent if now - sent < period]
+        if len(state.sent) >= limit:
+            delay = period - (now - state.sent[0])
+            self.bot.metrics.observe('meowbot_rate_limit_wait_seconds', delay, source='reply')
+            await asyncio.sleep(delay)
+
+    async def _render(self, state, meows, meow_messages, barkers, since):
+        lines = []
+        if meow_messages:
+            total = self.bot.counters.guild_meow_total(state.guild_id)
+            if meow_messages == 1:
+                lines.append(f'Meow count: {total}')
+            else:
+                elapsed = max(1, round(time.monotonic() - since))
+                lines.append(f'Meow count: {total} (+{meows} in the last {elapsed}s)')
+        if barkers:
+            totals = [await self.bot.counters.get_infractions(state.guild_id, user_id) for user_id in barkers]
+            if len(barkers) == 1:
+                lines.append(f"HISS.. Yeah, don't do that. We're cat people... Your Barks and Woofs: {totals[0]}")
+            else:
+                offenders = ', '.join(f"<@{user_id}>: {total}" for user_id, total in zip(barkers, totals))
+                lines.append(f"HISS.. Yeah, don't do that. We're cat people... Barks and Woofs: {offenders}")
+        return '\n'.join(lines)
+
+class WelcomeTemplate:
+    """A guild's welcome message with its channel and role mentions already resolved."""
+
+    def __init__(self, guild):
+        channel = guild.system_channel or (guild.text_channels[0] if guild.text_channels else None)
+        self.channel_id = channel.id if channel else None
+
+        general_roles_channel = discord.utils.get(guild.text_channels, name='general-roles')
+        game_ping_roles_channel = discord.utils.get(guild.text_channels, name='game-ping-roles')
+        intro_channel = discord.utils.get(guild.text_channels, name='🎤introdox-yourself')
+        rules_channel = discord.utils.get(guild.text_channels, name='📜rules')
+        patrollers_role = discord.utils.get(guild.roles, name="Patrollers")
+        self.body = (
+            f"Check out our {rules_channel.mention if rules_channel else '#📜rules'} channel. ✅\n"
+            f"You can grab roles from:\n"
+            f"⭐ {general_roles_channel.mention if general_roles_channel else '#general-roles'}\n"
+            f"⭐ {game_ping_roles_channel.mention if game_ping_roles_channel else '#game-ping-roles'}\n\n"
+            f"Feel free to head into {intro_channel.mention if intro_channel else '#🎤introdox-yourself'} as well. 🙂\n"
+            f"If you have any questions or need help, please let one of us {patrollers_role.mention if patrollers_role else '@Patrollers'} know. 🐱\n"
+            f"⭐ ⭐ ⭐ ⭐ ⭐"
+        )
+
+    def render(self, mentions):
+        names = mentions[0] if len(mentions) == 1 else f"{', '.join(mentions[:-1])} and {mentions[-1]}"
+        return f"⭐ ⭐ ⭐ ⭐ ⭐ \nWelcome {names}!\n\n{self.body}"
+
+    def batches(self, mentions):
+        """Split mentions into groups whose rendered message fits in one Discord message."""
+        base = len(self.render(['']))
+        batch, length = [], base
+        for mention in mentions:
+            # Each name adds itself plus at most ' and ' as a separator
+            if batch and length + len(mention) + 5 > MESSAGE_LIMIT:
+                yield batch
+                batch, length = [], base
+            batch.append(mention)
+            length += len(mention) + 5
+        if batch:
+            yield batch
+
+class WelcomeMessages:
+    """Per-guild welcome templates and join-burst batching.
+
+    Templates are built on a guild's first join and dropped by invalidate()
+    when its channels or roles change, so a join doesn't scan the guild.
+    Joins are held for `window` seconds and everyone who joined meanwhile is
+    welcomed in one message, so a raid sends a handful of messages instead
+    of one per member.
+    """
+
+    def __init__(self, bot, window=2.0):
+        self.bot = bot
+        self.window = window
+        self._templates = {}
+        # guild id -> member mentions waiting for the next welcome
+        self._pending = defaultdict(list)
+        self._tasks = {}
+
+    def template_for(self, guild):
+        template = self._templates.get(guild.id)
+        if template is None:
+            template = self._templates[guild.id] = WelcomeTemplate(guild)
+        return template
+
+    def invalidate(self, guild):
+        self._templates.pop(guild.id, None)
+
+    def add(self, member):
+        guild = member.guild
+        self._pending[guild.id].append(member.mention)
+        if guild.id not in self._tasks:
+            self._tasks[guild.id] = asyncio.create_task(self._drain(guild))
+
+    def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+
+    async def _drain(self, guild):
+        try:
+            while self._pending.get(guild.id):
+                # Let the rest of a burst arrive before welcoming it
+                await asyncio.sleep(self.window)
+                mentions = self._pending.pop(guild.id, [])
+                template = self.template_for(guild)
+                channel = guild.get_channel(template.channel_id) if template.channel_id else None
+                if channel is None:
+                    continue
+                for batch in template.batches(mentions):
+                    try:
+                        with self.bot.metrics.timer('meowbot_discord_request_seconds', call='channel.send'):
+                            await channel.send(template.render(batch))
+                    except Exception as e:
+                        log.error("Error sending welcome message in guild %s: %s", guild.id, e)
+        finally:
+            self._tasks.pop(guild.id, None)
+
+class RateBucket:
+    """Sliding-window send limit: at most `limit` sends in any `period` seconds."""
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.sent = deque()
+
+    def delay(self):
+        """Seconds until another send is allowed."""
+        now = time.monotonic()
+        while self.sent and now - self.sent[0] >= self.period:
+            self.sent.popleft()
+        if len(self.sent) < self.limit:
+            return 0.0
+        return self.period - (now - self.sent[0])
+
+    def take(self):
+        self.sent.append(time.monotonic())
+
+class Outbox:
+    """Durable outbound message queue delivered by a small worker pool.
+
+    Messages are stored in the outboxmessage table before enqueue() returns
+    and deleted once Discord accepts them, so anything pending at shutdown
+    is sent after a restart. Each destination (channel, or user for DMs)
+    is handled by one worker at a time, in insertion order. A destination
+    whose bucket is full, or whose head message is backing off after an
+    error, waits on a timer instead of holding a worker, so a burst drains
+    at the fastest rate the buckets allow and producers never wait on sends.
+
+    Kinds can register hooks: wanted(message) to drop messages that went
+    stale while queued, on_sent(message, sent) to record the result, and
+    undeliverable(message) to return replacement messages when the target
+    is gone or forbidden.
+    """
+
+    MAX_ATTEMPTS = 8
+    BACKOFF_BASE = 2.0
+    BACKOFF_CAP = 600.0
+
+    def __init__(self, bot, workers=4, channel_limit=CHANNEL_SEND_LIMIT, global_limit=GLOBAL_SEND_LIMIT):
+        self.bot = bot
+        self.workers = workers
+        self.channel_limit = channel_limit
+        self.global_bucket = RateBucket(*global_limit)
+        # destination -> deque of pending messages, oldest first
+        self._queues = {}
+        self._buckets = {}
+        # Destinations waiting for a worker, on a timer or being sent; never queued twice
+        self._scheduled = set()
+        self._ready = asyncio.Queue()
+        self._hooks = {}
+        self._tasks = []
+        self.enqueued = 0
+
+    def __len__(self):
+        return sum(len(pending) for pending in self._queues.values())
+
+    @staticmethod
+    def message(kind, channel_id=None, user_id=None, content=None, embed=None, allowed_mentions=None, **meta):
+        """Build a message for enqueue(); meta is kept for the kind's hooks."""
+        payload = {'content': content, 'meta': meta}
+        if embed is not None:
+            payload['embed'] = embed.to_dict()
+        if allowed_mentions is not None:
+            payload['allowed_mentions'] = allowed_mentions.to_dict()
+        return {'id': None, 'kind': kind, 'channel_id': channel_id, 'user_id': user_id,
+                'payload': payload, 'attempts': 0, 'next_attempt_at': None}
+
+    def register(self, kind, wanted=None, on_sent=None, undeliverable=None):
+        self._hooks[kind] = (wanted, on_sent, undeliverable)
+
+    async def load(self):
+        """Queue the messages left over from the last run; they go out once start() is called."""
+        for message in await self.bot.repo.load_outbox():
+            self._push(message)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        for destination in list(self._queues):
+            self._schedule(destination)
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def enqueue(self, messages, delete_reminder_ids=(), reminder_times=None, streamer_status=None):
+        """Store messages durably, then queue them for delivery."""
+        await self.bot.repo.add_outbox_messages(messages, delete_reminder_ids, reminder_times, streamer_status)
+        self.enqueued += len(messages)
+        for message in messages:
+            self._schedule(self._push(message))
+
+    @staticmethod
+    def destination(message):
+        return ('channel', message['channel_id']) if message['channel_id'] else ('user', message['user_id'])
+
+    def _push(self, message):
+        destination = self.destination(message)
+        self._queues.setdefault(destination, deque()).append(message)
+        return destination
+
+    def _bucket(self, destination):
+        bucket = self._buckets.get(destination)
+        if bucket is None:
+            bucket = self._buckets[destination] = RateBucket(*self.channel_limit)
+        return bucket
+
+    def _schedule(self, destination):
+        pending = self._queues.get(destination)
+        if not pending:
+            self._queues.pop(destination, None)
+            if not self._bucket(destination).delay():
+                self._buckets.pop(destination, None)
+            return
+        if destination in self._scheduled or not self._tasks:
+            return
+        self._scheduled.add(destination)
+        delay = self._bucket(destination).delay()
+        next_attempt_at = pending[0]['next_attempt_at']
+        if next_attempt_at:
+            delay = max(delay, (next_attempt_at - datetime.datetime.utcnow()).total_seconds())
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, destination)
+        else:
+            self._ready.put_nowait(destination)
+
+    async def throttle(self, destination):
+        """Wait until destination and the global bucket have room, then take a slot in both.
+
+        For requests that don't go through the queue, such as edits, so they
+        count against the same limits as sends.
+        """
+        while True:
+            delay = max(self._bucket(destination).delay(), self.global_bucket.delay())
+            if delay <= 0:
+                break
+            self.bot.metrics.observe('meowbot_rate_limit_wait_seconds', delay, source='edit')
+            await asyncio.sleep(delay)
+        self.global_bucket.take()
+        self._bucket(destination).take()
+
+    async def _worker(self):
+        while True:
+            destination = await self._ready.get()
+            message = self._queues[destination][0]
+            try:
+                await self._deliver(destination, message)
+            except Exception as e:
+                log.exception("Error in outbox worker for %s %s: %s", *destination, e)
+                await self._back_off(destination, message, e)
+            finally:
+                self._scheduled.discard(destination)
+                self._schedule(destination)
+
+    async def _back_off(self, destination, message, error):
+        """Retry a message whose delivery raised unexpectedly (a hook, or a locked database) later, not at once."""
+        pending = self._queues.get(destination)
+        if not pending or pending[0] is not message:
+            return  # It was already sent or dropped
+        next_attempt_at = message['next_attempt_at']
+        if next_attempt_at and next_attempt_at > datetime.datetime.utcnow():
+            return  # _retry already backed it off before failing
+        try:
+            await self._retry(destination, message, error)
+        except Exception as e:
+            log.error("Error rescheduling %s message for %s %s: %s", message['kind'], *destination, e)
+
+    async def _deliver(self, destination, message):
+        wanted, on_sent, undeliverable = self._hooks.get(message['kind'], (None, None, None))
+        if wanted and not await wanted(message):
+            await self._done(destination, message)
+            return
+
+        delay = self.global_bucket.delay()
+        if delay:
+            self.bot.metrics.observe('meowbot_rate_limit_wait_seconds', delay, source='outbox')
+            await asyncio.sleep(delay)
+        self.global_bucket.take()
+        self._bucket(destination).take()
+        try:
+            target = await self._target(message)
+            with self.bot.metrics.timer('meowbot_discord_request_seconds', call='outbox.send'):
+                sent = await target.send(**self._render(message['payload']))
+        except (discord.Forbidden, discord.NotFound) as e:
+            replacements = await undeliverable(message) if undeliverable else None
+            if replacements:
+                log.warning("Rerouting %s message for %s %s: %s", message['kind'], *destination, e)
+                # Queued before the original is deleted, so a crash in between can't lose both
+                await self.enqueue(replacements)
+            else:
+                log.warning("Dropping %s message for %s %s: %s", message['kind'], *destination, e)
+            await self._done(destination, message)
+        except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = getattr(e, 'status', None)
+            if status is not None and status < 500 and status != 429:
+                log.error("Dropping %s message for %s %s: %s", message['kind'], *destination, e)
+                await self._done(destination, message)
+            else:
+                await self._retry(destination, message, e)
+        else:
+            await self._done(destination, message)
+            if on_sent:
+                await on_sent(message, sent)
+
+    async def _target(self, message):
+        if message['channel_id']:
+            # A partial channel sends without needing the channel in the cache
+            return self.bot.get_channel(message['channel_id']) or self.bot.get_partial_messageable(message['channel_id'])
+        return self.bot.get_user(message['user_id']) or await self.bot.fetch_user(message['user_id'])
+
+    @staticmethod
+    def _render(payload):
+        kwargs = {'content': payload.get('content')}
+        if 'embed' in payload:
+            kwargs['embed'] = discord.Embed.from_dict(payload['embed'])
+        if 'allowed_mentions' in payload:
+            mentions = payload['allowed_mentions']
+            parse = mentions.get('parse', [])
+            kwargs['allowed_mentions'] = discord.AllowedMentions(
+                everyone='everyone' in parse,
+                users=[discord.Object(int(id)) for id in mentions['users']] if 'users' in mentions else 'users' in parse,
+                roles=[discord.Object(int(id)) for id in mentions['roles']] if 'roles' in mentions else 'roles' in parse,
+                replied_user=mentions.get('replied_user', False)
+            )
+        return kwargs
+
+    async def _done(self, destination, message):
+        self._queues[destination].popleft()
+        await self.bot.repo.delete_outbox_message(message['id'])
+
+    async def _retry(self, destination, message, error):
+        message['attempts'] += 1
+        if message['attempts'] >= self.MAX_ATTEMPTS:
+            log.error("Giving up on %s message for %s %s after %d attempts: %s",
+                      message['kind'], *destination, message['attempts'], error)
+            await self._done(destination, message)
+            return
+        backoff = min(self.BACKOFF_CAP, self.BACKOFF_BASE * 2 ** (message['attempts'] - 1))
+        retry_after = getattr(getattr(error, 'response', None), 'headers', {}).get('Retry-After')
+        if retry_after:
+            backoff = max(backoff, float(retry_after))
+        # Jitter so destinations that failed together don't retry together
+        backoff *= random.uniform(1.0, 1.25)
+        message['next_attempt_at'] = datetime.datetime.utcnow() + datetime.timedelta(seconds=backoff)
+        log.warning("Error sending %s message for %s %s (attempt %d), retrying in %.0fs: %s",
+                    message['kind'], *destination, message['attempts'], backoff, error)
+        await self.bot.repo.reschedule_outbox_message(message['id'], message['attempts'], message['next_attempt_at'])
+
+class StreamerSubscriptions:
+    """Registry of which channels want go-live posts for which streamer.
+
+    by_streamer maps login -> {(guild_id, channel_id): role_id}, so a
+    transition costs one dict lookup however many guilds follow the streamer;
+    by_guild maps guild_id -> set of logins for per-guild listings.
+    """
+
+    def __init__(self, rows=()):
+        self.by_streamer = defaultdict(dict)
+        self.by_guild = defaultdict(set)
+        for login, guild_id, channel_id, role_id in rows:
+            self.add(login, guild_id, channel_id, role_id)
+
+    def add(self, login, guild_id, channel_id, role_id=None):
+        """Subscribe channel_id to login; returns False if it was already subscribed."""
+        targets = self.by_streamer[login]
+        created = (guild_id, channel_id) not in targets
+        targets[(guild_id, channel_id)] = role_id
+        self.by_guild[guild_id].add(login)
+        return created
+
+    def remove(self, login, guild_id, channel_id=None):
+        """Drop a guild's subscriptions to login (one channel, or all of them); returns how many."""
+        targets = self.by_streamer.get(login, {})
+        removed = [key for key in targets if key[0] == guild_id and channel_id in (None, key[1])]
+        for key in removed:
+            del targets[key]
+        if not targets:
+            self.by_streamer.pop(login, None)
+        if not any(key[0] == guild_id for key in targets):
+            self.by_guild[guild_id].discard(login)
+        return len(removed)
+
+    def is_subscribed(self, login, guild_id):
+        return login in self.by_guild.get(guild_id, ())
+
+    def subscribers(self, login):
+        """Return [(guild_id, channel_id, role_id), ...] for login."""
+        return [(guild_id, channel_id, role_id) for (guild_id, channel_id), role_id in self.by_streamer.get(login, {}).items()]
+
+    def for_guild(self, guild_id):
+        return sorted(self.by_guild.get(guild_id, ()))
+
+    def logins(self):
+        return list(self.by_streamer)
+
+class PollSchedule:
+    """Chooses how often each streamer is polled from a weekly go-live histogram.
+
+    Every go-live adds one to its UTC hour-of-week bin. Near slots that hold
+    a noticeable share of a streamer's go-lives they are polled every minute;
+    outside them, and when they haven't streamed in weeks, much less often.
+    Offline streamers covered by EventSub are only polled to reconcile.
+    """
+
+    HOURS_PER_WEEK = 7 * 24
+    MIN_HISTORY = 3        # Go-lives needed before the histogram is trusted
+    USUAL_SHARE = 0.05     # Share of go-lives in the surrounding hours that counts as "usual"
+
+    def __init__(self, schedules=None, reconcile_interval=TWITCH_POLL_INTERVALS['dormant']):
+        self.reconcile_interval = reconcile_interval
+        self.histograms = {}
+        self.last_live = {}
+        for login, (histogram, last_live_at) in (schedules or {}).items():
+            self.histograms[login] = histogram
+            self.last_live[login] = last_live_at
+        # login -> (interval seconds, reason) and monotonic time of the next check
+        self.intervals = {}
+        self.next_check = {}
+        self.checks = 0
+        self.requests = 0
+
+    @classmethod
+    def hour_of_week(cls, when):
+        return when.weekday() * 24 + when.hour
+
+    def record_go_live(self, login, started_at):
+        """Count a go-live at started_at (naive UTC); returns the updated histogram."""
+        histogram = self.histograms.setdefault(login, [0] * self.HOURS_PER_WEEK)
+        histogram[self.hour_of_week(started_at)] += 1
+        self.last_live[login] = started_at
+        return histogram
+
+    def choose_interval(self, login, is_live, now, pushed=False):
+        """Return (seconds, reason) for login at naive-UTC time now; pushed means EventSub covers it."""
+        if is_live:
+            reason = 'live'
+        elif pushed:
+            return self.reconcile_interval, 'eventsub'
+        else:
+            histogram = self.histograms.get(login)
+            total = sum(histogram) if histogram else 0
+            last_live = self.last_live.get(login)
+            if last_live is not None and now - last_live > datetime.timedelta(days=TWITCH_DORMANT_DAYS):
+                reason = 'dormant'
+            elif total < self.MIN_HISTORY:
+                reason = 'learning'
+            else:
+                hour = self.hour_of_week(now)
+                # The hour before (late starts), this hour and the next (early starts)
+                nearby = sum(histogram[(hour + offset) % self.HOURS_PER_WEEK] for offset in (-1, 0, 1))
+                reason = 'usual time' if nearby / total >= self.USUAL_SHARE else 'off hours'
+        return TWITCH_POLL_INTERVALS[reason], reason
+
+    def due(self, logins, now):
+        """Split logins into (due now, could ride along early) by their next check time."""
+        due, early = [], []
+        for login in logins:
+            next_check = self.next_check.get(login)
+            if next_check is None or next_check <= now:
+                due.append(login)
+            else:
+                interval = self.intervals[login][0]
+                # Within the second half of its interval: worth checking if a request goes out anyway
+                if next_check - now <= interval / 2:
+                    early.append((next_check, login))
+        return due, [login for _, login in sorted(early)]
+
+    def checked(self, login, is_live, now, utcnow, pushed=False):
+        self.checks += 1
+        self.intervals[login] = self.choose_interval(login, is_live, utcnow, pushed)
+        self.next_check[login] = now + self.intervals[login][0]
+
+    def forget(self, login):
+        self.intervals.pop(login, None)
+        self.next_check.pop(login, None)
+
+class TwitchEventSub:
+    """Push notifications for stream.online / stream.offline via Twitch EventSub.
+
+    Supports the WebSocket transport (no public endpoint needed, but a user
+    access token is required) and the webhook transport (app token, with a
+    small aiohttp receiver). All URLs are configurable, so both can be run
+    against a local fake such as `twitch event websocket start-server`.
+    Events feed TwitchBot.handle_stream_update, the same path the poller uses.
+    """
+
+    EVENT_TYPES = ('stream.online', 'stream.offline')
+    # Statuses of subscriptions that are delivering, or about to
+    ACTIVE_STATUSES = ('enabled', 'webhook_callback_verification_pending')
+    # Twitch rejects webhook messages older than this, and so do we
+    MAX_MESSAGE_AGE = datetime.timedelta(minutes=10)
+    # A failed subscription is retried after this, doubling up to the reconcile interval
+    RETRY_BASE = 60
+
+    def __init__(self, bot, settings):
+        self.bot = bot
+        self.settings = settings
+        self.mode = settings.eventsub_mode
+        # user_id -> {event type: subscription id}; covered once every EVENT_TYPE is there
+        self.subscriptions = {}
+        # user_id -> (failures, monotonic time of the next attempt)
+        self.retry_at = {}
+        # Set while Twitch is refusing new subscriptions (rate or subscription limit)
+        self.blocked_until = 0.0
+        # Whether the existing subscriptions have been listed for this session
+        self.listed = False
+        self.session_id = None
+        self._task = None
+        self._runner = None
+        self._seen_messages = {}
+        self._sync_lock = asyncio.Lock()
+        # Syncs and dispatches started from the transports; the loop only keeps weak references
+        self._background = set()
+
+    @property
+    def running(self):
+        return self._task is not None or self._runner is not None
+
+    async def start(self):
+        if self.mode == 'websocket':
+            if not self.settings.eventsub_user_token:
+                twitch_log.warning("EventSub websocket mode needs TWITCH_EVENTSUB_USER_TOKEN; falling back to polling")
+                return False
+            self._task = asyncio.create_task(self._run_websocket())
+        elif self.mode == 'webhook':
+            if not self.settings.eventsub_callback_url or not self.settings.eventsub_secret:
+                twitch_log.warning("EventSub webhook mode needs TWITCH_EVENTSUB_CALLBACK_URL and TWITCH_EVENTSUB_SECRET; falling back to polling")
+                return False
+            await self._start_webhook_receiver()
+        else:
+            twitch_log.warning("Unknown TWITCH_EVENTSUB_MODE '%s'; falling back to polling", self.mode)
+            return False
+        twitch_log.info("EventSub %s mode started", self.mode)
+        return True
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for task in self._background:
+            task.cancel()
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # Subscriptions
+
+    def covers(self, user_id):
+        """Whether every event type is subscribed for user_id, so the poller can back off."""
+        return len(self.subscriptions.get(user_id, ())) == len(self.EVENT_TYPES)
+
+    async def sync(self, user_ids):
+        """Subscribe to every id in user_ids and drop subscriptions for ids no longer tracked.
+
+        Ids whose subscriptions fail stay uncovered, so the poller keeps
+        checking them on their normal cadence, and are retried with backoff.
+        """
+        if self.mode == 'websocket' and not self.session_id:
+            return  # Subscriptions are created once the welcome message arrives
+        async with self._sync_lock:
+            if not self.listed:
+                self.listed = await self._list_subscriptions()
+            wanted = set(user_ids)
+            # Unsubscribe first: it frees room under the subscription limit
+            for user_id in set(self.subscriptions) - wanted:
+                await self._unsubscribe(user_id)
+            self.retry_at = {user_id: retry for user_id, retry in self.retry_at.items() if user_id in wanted}
+            for user_id in sorted(wanted):
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    break  # The rest would be refused the same way
+                if self.covers(user_id) or self.retry_at.get(user_id, (0, 0.0))[1] > now:
+                    continue
+                await self._subscribe(user_id)
+
+    def _transport(self):
+        if self.mode == 'websocket':
+            return {'method': 'websocket', 'session_id': self.session_id}
+        return {'method': 'webhook', 'callback': self.settings.eventsub_callback_url, 'secret': self.settings.eventsub_secret}
+
+    async def _headers(self):
+        token = self.settings.eventsub_user_token if self.mode == 'websocket' else await self.bot.get_twitch_token()
+        return {'Client-ID': self.settings.twitch_client_id, 'Authorization': f'Bearer {token}'}
+
+    def _is_ours(self, transport):
+        if self.mode == 'websocket':
+            return transport.get('session_id') == self.session_id
+        return transport.get('callback') == self.settings.eventsub_callback_url
+
+    async def _list_subscriptions(self):
+        """Record the subscriptions that already exist for our transport (webhook ones outlive restarts)."""
+        params = {}
+        try:
+            while True:
+                async with self.bot.twitch_session.get(
+                    self.settings.subscriptions_url, params=params, headers=await self._headers()
+                ) as response:
+                    if response.status != 200:
+                        twitch_log.error("Listing EventSub subscriptions failed: %s %s", response.status, await response.text())
+                        return False
+                    data = await response.json()
+                for subscription in data.get('data', []):
+                    if (subscription.get('type') in self.EVENT_TYPES
+                            and subscription.get('status') in self.ACTIVE_STATUSES
+                            and self._is_ours(subscription.get('transport', {}))):
+                        user_id = subscription.get('condition', {}).get('broadcaster_user_id')
+                        self.subscriptions.setdefault(user_id, {})[subscription['type']] = subscription['id']
+                cursor = data.get('pagination', {}).get('cursor')
+                if not cursor:
+                    return True
+                params = {'after': cursor}
+        except aiohttp.ClientError as e:
+            twitch_log.error("HTTP error while listing EventSub subscriptions: %s", e)
+            return False
+
+    async def _subscribe(self, user_id):
+        """Create the missing subscriptions for user_id; on failure schedule a retry and stop."""
+        subscriptions = self.subscriptions.setdefault(user_id, {})
+        for event_type in self.EVENT_TYPES:
+            if event_type in subscriptions:
+                continue
+            body = {
+                'type': event_type,
+                'version': '1',
+                'condition': {'broadcaster_user_id': user_id},
+                'transport': self._transport()
+            }
+            status = None
+            try:
+                async with self.bot.twitch_session.post(
+                    self.settings.subscriptions_url, json=body, headers=await self._headers()
+                ) as response:
+                    status = response.status
+                    if status == 202:
+                        data = await response.json()
+                        subscriptions[event_type] = data['data'][0]['id']
+                        continue
+                    if status == 409:
+                        # It exists but we don't know its id: list subscriptions again on the next sync
+                        twitch_log.warning("EventSub %s subscription for %s already exists", event_type, user_id)
+                        self.listed = False
+                    else:
+                        twitch_log.error("EventSub %s subscription for %s failed: %s %s", event_type, user_id, status, await response.text())
+            except aiohttp.ClientError as e:
+                twitch_log.error("HTTP error while subscribing to EventSub: %s", e)
+            self._retry_later(user_id, status)
+            break
+        else:
+            self.retry_at.pop(user_id, None)
+        if not subscriptions:
+            del self.subscriptions[user_id]
+
+    def _retry_later(self, user_id, status):
+        failures = self.retry_at.get(user_id, (0, 0.0))[0] + 1
+        delay = min(self.RETRY_BASE * 2 ** (failures - 1), self.settings.twitch_reconcile_minutes * 60)
+        self.retry_at[user_id] = (failures, time.monotonic() + delay)
+        if status == 429:
+            # Rate limited, or at the transport's subscription limit (300 for a websocket)
+            self.blocked_until = time.monotonic() + delay
+
+    def _revoked(self, subscription):
+        user_id = subscription.get('condition', {}).get('broadcaster_user_id')
+        twitch_log.warning("EventSub subscription revoked for %s: %s", user_id, subscription.get('status'))
+        subscriptions = self.subscriptions.get(user_id, {})
+        subscriptions.pop(subscription.get('type'), None)
+        if not subscriptions:
+            self.subscriptions.pop(user_id, None)
+
+    async def _unsubscribe(self, user_id):
+        for subscription_id in self.subscriptions.pop(user_id, {}).values():
+            try:
+                async with self.bot.twitch_session.delete(
+                    self.settings.subscriptions_url, params={'id': subscription_id}, headers=await self._headers()
+                ) as response:
+                    if response.status not in (204, 404):
+                        twitch_log.error("EventSub unsubscribe %s failed: %s", subscription_id, response.status)
+            except aiohttp.ClientError as e:
+                twitch_log.error("HTTP error while removing EventSub subscription: %s", e)
+
+    # Dispatch
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _dispatch(self, message_id, subscription_type, event):
+        # Both transports may redeliver a message; handle each id once
+        if message_id in self._seen_messages:
+            return
+        now = time.monotonic()
+        self._seen_messages[message_id] = now
+        if len(self._seen_messages) > 1000:
+            cutoff = now - self.MAX_MESSAGE_AGE.total_seconds()
+            self._seen_messages = {k: v for k, v in self._seen_messages.items() if v > cutoff}
+
+        login = event.get('broadcaster_user_login', '').lower()
+        user_id = event.get('broadcaster_user_id')
+        try:
+            if subscription_type == 'stream.online':
+                await self.bot.handle_stream_online_event(login, user_id, event)
+            elif subscription_type == 'stream.offline':
+                await self.bot.handle_stream_update(login, None)
+        except Exception as e:
+            twitch_log.exception("Error handling EventSub %s for %s: %s", subscription_type, login, e)
+
+    # WebSocket transport
+
+    async def _run_websocket(self):
+        url = self.settings.eventsub_ws_url
+        backoff = 1
+        while True:
+            try:
+                url = await self._websocket_session(url)
+                backoff = 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                twitch_log.warning("EventSub websocket error: %s; reconnecting in %ss", e, backoff)
+                self.session_id = None
+                # A new session starts without subscriptions
+                self.subscriptions.clear()
+                self.retry_at.clear()
+                self.blocked_until = 0.0
+                self.listed = False
+                url = self.settings.eventsub_ws_url
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 300)
+
+    async def _websocket_session(self, url):
+        """Run one websocket connection; returns the URL to reconnect to."""
+        keepalive = 30
+        async with self.bot.twitch_session.ws_connect(url, heartbeat=None) as ws:
+            while True:
+                # Twitch sends a keepalive within keepalive_timeout_seconds; silence means the link is dead
+                msg = await ws.receive(timeout=keepalive + 10)
+                if msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    raise ConnectionError(f"websocket closed ({ws.close_code})")
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+
+                data = json.loads(msg.data)
+                metadata = data.get('metadata', {})
+                payload = data.get('payload', {})
+                message_type = metadata.get('message_type')
+
+                if message_type == 'session_welcome':
+                    session = payload['session']
+                    keepalive = session.get('keepalive_timeout_seconds') or keepalive
+                    reconnecting = self.session_id is not None
+                    self.session_id = session['id']
+                    # After a session_reconnect the existing subscriptions carry over
+                    if not reconnecting:
+                        self._spawn(self.sync(self.bot.tracked_user_ids()))
+                elif message_type == 'notification':
+                    await self._dispatch(metadata.get('message_id'), metadata.get('subscription_type'), payload.get('event', {}))
+                elif message_type == 'session_reconnect':
+                    return payload['session']['reconnect_url']
+                elif message_type == 'revocation':
+                    self._revoked(payload.get('subscription', {}))
+
+    # Webhook transport
+
+    async def _start_webhook_receiver(self):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_post('/eventsub', self._handle_webhook)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.settings.eventsub_host, self.settings.eventsub_port).start()
+
+    def _verify_signature(self, headers, body):
+        message = headers.get('Twitch-Eventsub-Message-Id', '') + headers.get('Twitch-Eventsub-Message-Timestamp', '')
+        expected = 'sha256=' + hmac.new(
+            self.settings.eventsub_secret.encode(), message.encode() + body, hashlib.sha256
+        ).hexdigest()
+        return hmac.compare_digest(expected, headers.get('Twitch-Eventsub-Message-Signature', ''))
+
+    async def _handle_webhook(self, request):
+        from aiohttp import web
+
+        body = await request.read()
+        if not self._verify_signature(request.headers, body):
+            return web.Response(status=403)
+        try:
+            sent_at = datetime.datetime.fromisoformat(
+                request.headers['Twitch-Eventsub-Message-Timestamp'][:26].rstrip('Z')
+            ).replace(tzinfo=datetime.timezone.utc)
+            if datetime.datetime.now(datetime.timezone.utc) - sent_at > self.MAX_MESSAGE_AGE:
+                return web.Response(status=403)
+        except (KeyError, ValueError):
+            return web.Response(status=400)
+
+        data = json.loads(body)
+        message_type = request.headers.get('Twitch-Eventsub-Message-Type')
+        if message_type == 'webhook_callback_verification':
+            return web.Response(text=data['challenge'], content_type='text/plain')
+        if message_type == 'notification':
+            subscription_type = data.get('subscription', {}).get('type')
+            self._spawn(self._dispatch(
+                request.headers.get('Twitch-Eventsub-Message-Id'), subscription_type, data.get('event', {})
+            ))
+        elif message_type == 'revocation':
+            self._revoked(data.get('subscription', {}))
+        # Acknowledge quickly; Twitch retries anything that isn't a 2xx
+        return web.Response(status=204)
 
 # Initialize bot with necessary intents
 intents = discord.Intents.default()
@@ -74,1135 +2244,772 @@ intents.message_content = True
 intents.members = True
 intents.guilds = True
 
+class InstrumentedCommandTree(app_commands.CommandTree):
+    """Command tree that times every app command into the bot's metrics."""
+
+    async def interaction_check(self, interaction):
+        interaction.extras['started_at'] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction, error):
+        self.client.observe_command(interaction, 'error')
+        await super().on_error(interaction, error)
+
 class TwitchBot(commands.Bot):
-    def __init__(self):
+    def __init__(self, settings):
         super().__init__(
             command_prefix="!",
             intents=intents,
+            tree_cls=InstrumentedCommandTree,
             activity=discord.Activity(
                 type=discord.ActivityType.watching,
                 name="Twitch streams 👀"
             )
         )
+        self.settings = settings
         self.twitch_token = None
-        self.streamer_status = {}
-        self.tracked_streamers = [s.strip() for s in STREAMER_NAMES if s.strip()]
+        self.twitch_token_expires_at = 0.0
+        self._twitch_token_lock = asyncio.Lock()
+        # Shared aiohttp session for all Twitch calls, created in setup_hook
+        self.twitch_session = None
+        # login -> {'stream_id', 'started_at'} while live, backed by the streamerstatus table
+        self.streamer_status = None
+        # login -> monotonic time its live announcement was last edited
+        self.live_edited_at = {}
+        # login -> id of the stream that last ended, so a lagging Helix listing doesn't re-announce it
+        self.ended_streams = {}
+        # login -> Twitch user id, backed by the twitchuser table
+        self.twitch_user_ids = None
+        self.eventsub = TwitchEventSub(self, settings) if settings.eventsub_mode else None
+        # streamer login -> subscribed (guild, channel, mention role), loaded in setup_hook
+        self.streamers = StreamerSubscriptions()
+        self.poll_schedule = PollSchedule()
+        # on_ready fires again after every gateway reconnect; startup work runs once
+        self.startup_done = False
+        self.metrics = Metrics()
+        self._loop_lag_task = None
+        self.repo = Repository(db, metrics=self.metrics)
+        self.counters = CounterBuffer(self.repo, settings.counter_flush_threshold)
+        # The early flush started by on_message (only one at a time), and when it may run again after a failure
+        self._flush_task = None
+        self._flush_retry_at = 0.0
+        self.display_names = DisplayNameCache(self)
+        self.keywords = KeywordRules(word_boundary=settings.keyword_word_boundary, casefold=settings.keyword_casefold)
+        self.replies = ReplyCoalescer(self, settings.reply_coalesce_window)
+        self.welcomes = WelcomeMessages(self, settings.welcome_batch_window)
+        self.outbox = Outbox(self, settings.outbox_workers)
+        self.outbox.register('go_live', wanted=self.go_live_wanted, on_sent=self.on_go_live_sent)
 
     async def setup_hook(self):
-        print("Setting up bot...")
+        log.info("Setting up bot...")
+        settings = self.settings
+        await self.repo.write(prepare_database, settings.legacy_guild_id)
+        await self.outbox.load()
+        await self.counters.load_guild_totals()
+        self.keywords = KeywordRules(
+            await self.repo.load_guild_keywords(),
+            word_boundary=settings.keyword_word_boundary, casefold=settings.keyword_casefold
+        )
+        self.streamers = StreamerSubscriptions(await self.repo.load_streamer_subscriptions())
+        self.poll_schedule = PollSchedule(await self.repo.load_streamer_schedules(), int(settings.twitch_reconcile_minutes * 60))
+        self.check_twitch_streams.change_interval(seconds=settings.twitch_poll_tick)
+        # STREAMER_NAMES are announced in TWITCH_CHANNEL_ID, as before per-guild subscriptions existed
+        if settings.twitch_channel_id:
+            for streamer in settings.streamer_names:
+                self.streamers.add(streamer, settings.legacy_guild_id, settings.twitch_channel_id)
+        self.twitch_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=30),
+            trace_configs=[self.metrics.trace_config()]
+        )
+        self._loop_lag_task = asyncio.create_task(self.metrics.sample_loop_lag())
+        if settings.metrics_port:
+            try:
+                await self.metrics.start_server(settings.metrics_host, settings.metrics_port)
+            except OSError as e:
+                log.error("Error starting metrics endpoint: %s", e)
+        self.flush_counters.change_interval(seconds=settings.counter_flush_interval)
+        self.flush_counters.start()
         try:
-            # Add cogs first so commands are registered to the tree
-            await self.add_cog(TwitchCog(self))
-            print("Added Twitch cog")
-            await self.add_cog(MeowCog(self))
-            print("Added Meow cog")
-            await self.add_cog(RemindersCog(self))
-            print("Added Reminders cog")
-            await self.add_cog(ConfessCog(self))
-            print("Added Confess cog")
+            # Load cogs first so commands are registered to the tree
+            for extension in EXTENSIONS:
+                await self.load_extension(extension)
+                log.info("Loaded %s", extension)
+            self.add_command(reload_extensions)
             
             # Check what commands are in the tree
             tree_commands = self.tree.get_commands()
-            print(f"Commands in tree: {[cmd.name for cmd in tree_commands]}")
+            log.info("Commands in tree: %s", [cmd.name for cmd in tree_commands])
             
         except Exception as e:
-            print(f"Error in setup_hook: {e}")
+            log.exception("Error in setup_hook: %s", e)
 
     async def close(self):
         """Clean shutdown of the bot."""
-        print("Bot is shutting down...")
+        log.info("Bot is shutting down...")
         
         # Cancel all running tasks
-        if hasattr(self, 'check_twitch_streams') and not self.check_twitch_streams.is_cancelled():
+        if hasattr(self, 'check_twitch_streams') and self.check_twitch_streams.is_running():
             self.check_twitch_streams.cancel()
-            print("Cancelled Twitch stream checking task")
+            twitch_log.info("Cancelled Twitch stream checking task")
         
         # Cancel reminder tasks in all cogs
         for cog in self.cogs.values():
-            if hasattr(cog, 'check_reminders') and not cog.check_reminders.is_cancelled():
+            if hasattr(cog, 'check_reminders') and cog.check_reminders.is_running():
                 cog.check_reminders.cancel()
-                print("Cancelled reminder checking task")
+                log.info("Cancelled reminder checking task")
+
+        if self.flush_counters.is_running():
+            self.flush_counters.cancel()
+        self.replies.close()
+        self.welcomes.close()
+        self.outbox.close()
         
         # Call parent close method
         await super().close()
-        print("Bot shutdown complete")
+
+        # No more messages can arrive now, so write out any buffered meow/bark counts
+        try:
+            await self.counters.flush()
+            meow_log.info("Flushed pending meow/bark counts")
+        except Exception as e:
+            meow_log.error("Error flushing meow/bark counts: %s", e)
+        if self.eventsub:
+            await self.eventsub.close()
+        if self.twitch_session:
+            await self.twitch_session.close()
+        if self._loop_lag_task:
+            self._loop_lag_task.cancel()
+        await self.metrics.close()
+        await self.repo.close()
+        log.info("Bot shutdown complete")
 
     async def on_ready(self):
         """Called when the bot is ready and connected to Discord."""
-        global meow_counter
-        
         try:
-            # Load the initial global meow count from the database
-            meow_counter = sum(user.meow_count for user in UserMeowCounts.select())
-            
-            print(f'Logged in as {self.user}')
-            print(f'Bot Client ID: {self.user.id}')
-            
-            # Use global command sync for multi-server support
-            print("Using global command sync for multi-server support...")
-            try:
-                global_synced = await self.tree.sync()
-                print(f"✅ Global sync successful: {len(global_synced)} commands")
-                if len(global_synced) > 0:
-                    print("🎉 Commands synced globally! Bot ready for any server!")
-                else:
-                    print("❌ Global sync failed")
-            except Exception as global_error:
-                print(f"❌ Global sync failed: {global_error}")
-            
-            # Get initial Twitch token
+            log.info("Logged in as %s", self.user)
+            if self.startup_done:
+                log.info("Reconnected; skipping startup work")
+            else:
+                self.startup_done = True
+                log.info("Bot Client ID: %s", self.user.id)
+                # Channels are cached now; deliver what was queued before the restart
+                self.outbox.start()
+                await self.sync_command_tree()
+
+            # Twitch startup is retried on the next on_ready if the token request failed
+            if self.check_twitch_streams.is_running():
+                return
             if await self.get_twitch_token():
-                print("Successfully obtained initial Twitch token")
+                twitch_log.info("Successfully obtained initial Twitch token")
+                # Push notifications when configured; the poller then only reconciles subscribed streamers
+                if self.eventsub and not self.eventsub.running:
+                    await self.eventsub.start()
                 # Start Twitch checking
                 self.check_twitch_streams.start()
             else:
-                print("Failed to obtain initial Twitch token")
+                twitch_log.error("Failed to obtain initial Twitch token")
         except Exception as e:
-            print(f"Error in on_ready: {e}")
+            log.exception("Error in on_ready: %s", e)
             return
 
-    async def on_member_join(self, member):
-        """Welcome message for new members."""
-        channel = member.guild.system_channel
-        if channel is None:
-            channel = member.guild.text_channels[0]
-
-        general_roles_channel = discord.utils.get(member.guild.text_channels, name='general-roles')
-        game_ping_roles_channel = discord.utils.get(member.guild.text_channels, name='game-ping-roles')
-        valorant_roles_channel = discord.utils.get(member.guild.text_channels, name='valorant-roles')
-        intro_channel = discord.utils.get(member.guild.text_channels, name='🎤introdox-yourself')
-        rules_channel = discord.utils.get(member.guild.text_channels, name='📜rules')
-        patrollers_role = discord.utils.get(member.guild.roles, name="Patrollers")
-
-        # Add a 2-second delay before sending the message
-        await asyncio.sleep(2)
-
-        message = (
-            f"⭐ ⭐ ⭐ ⭐ ⭐ \n"
-            f"Welcome {member.mention}!\n\n"
-            f"Check out our {rules_channel.mention if rules_channel else '#📜rules'} channel. ✅\n"
-            f"You can grab roles from:\n"
-            f"⭐ {general_roles_channel.mention if general_roles_channel else '#general-roles'}\n"
-            f"⭐ {game_ping_roles_channel.mention if game_ping_roles_channel else '#game-ping-roles'}\n\n"
-            f"Feel free to head into {intro_channel.mention if intro_channel else '#🎤introdox-yourself'} as well. 🙂\n"
-            f"If you have any questions or need help, please let one of us {patrollers_role.mention if patrollers_role else '@Patrollers'} know. 🐱\n"
-            f"⭐ ⭐ ⭐ ⭐ ⭐"
+    def command_tree_fingerprint(self):
+        """Hash of the command payloads a global sync would upload."""
+        payload = sorted(
+            (command.to_dict(self.tree) for command in self.tree.get_commands()),
+            key=lambda command: (command.get('type', 1), command['name'])
         )
-        await channel.send(message)
-
-    async def on_message(self, message):
-        """Handle message events."""
-        if message.author == self.user:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    async def sync_command_tree(self):
+        """Sync global commands, skipping the rate-limited call when they haven't changed since the last sync."""
+        key = f'command_tree:{self.application_id}'
+        fingerprint = self.command_tree_fingerprint()
+        if not self.settings.force_command_sync and await self.repo.get_state(key) == fingerprint:
+            log.info("✅ Command tree unchanged since the last sync; skipping global sync")
             return
 
-        content = message.content.lower()
-        global meow_counter
-
-        # Handle meow counting
-        if 'meow' in content:
-            meow_count = content.count('meow')
-            meow_counter += meow_count
-
-            try:
-                user_meow_count, created = UserMeowCounts.get_or_create(user_id=message.author.id)
-                user_meow_count.meow_count += meow_count
-                user_meow_count.save()
-
-                response = f'Meow count: {meow_counter}'
-                await message.channel.send(response)
-            except Exception as e:
-                print(f"Error handling meow count: {e}")
+        # Use global command sync for multi-server support
+        log.info("Using global command sync for multi-server support...")
+        try:
+            global_synced = await self.tree.sync()
+            log.info("✅ Global sync successful: %d commands", len(global_synced))
+            if len(global_synced) > 0:
+                log.info("🎉 Commands synced globally! Bot ready for any server!")
+            else:
+                log.error("❌ Global sync failed")
+            await self.repo.set_state(key, fingerprint)
+        except Exception as global_error:
+            log.error("❌ Global sync failed: %s", global_error)
 
-        # Handle woof/bark infractions
-        if 'woof' in content or 'bark' in content:
-            total_woof_bark_count = content.count('woof') + content.count('bark')
+    async def on_member_join(self, member):
+        """Welcome new members, batching everyone who joins within a short window."""
+        self.welcomes.add(member)
 
-            try:
-                user_infraction, created = UserInfractions.get_or_create(user_id=message.author.id)
-                user_infraction.infractions += total_woof_bark_count
-                user_infraction.save()
+    # The welcome template caches channel and role mentions; rebuild it when they change
 
-                response = f"HISS.. Yeah, don't do that. We're cat people... Your Barks and Woofs: {user_infraction.infractions}"
-                await message.channel.send(response)
-            except Exception as e:
-                print(f"Error handling bark count: {e}")
+    async def on_guild_channel_create(self, channel):
+        self.welcomes.invalidate(channel.guild)
 
-        await self.process_commands(message)
+    async def on_guild_channel_delete(self, channel):
+        self.welcomes.invalidate(channel.guild)
 
-    async def get_twitch_token(self):
-        """Get Twitch access token."""
-        if not TWITCH_CLIENT_ID or not TWITCH_SECRET:
-            print("Error: Twitch credentials not found in .env file!")
-            return None
+    async def on_guild_channel_update(self, before, after):
+        self.welcomes.invalidate(after.guild)
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                params = {
-                    'client_id': TWITCH_CLIENT_ID.strip(),
-                    'client_secret': TWITCH_SECRET.strip(),
-                    'grant_type': 'client_credentials'
-                }
-                async with session.post(
-                    'https://id.twitch.tv/oauth2/token',
-                    params=params
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        print(f"Failed to get Twitch token. Status: {response.status}, Response: {error_text}")
-                        return None
+    async def on_guild_role_create(self, role):
+        self.welcomes.invalidate(role.guild)
 
-                    data = await response.json()
-                    self.twitch_token = data.get('access_token')
-                    if not self.twitch_token:
-                        print(f"No access token in response: {data}")
-                        return None
+    async def on_guild_role_delete(self, role):
+        self.welcomes.invalidate(role.guild)
 
-                    print("Successfully obtained Twitch token")
-                    return self.twitch_token
-        except aiohttp.ClientError as e:
-            print(f"HTTP error while fetching Twitch token: {e}")
-        except Exception as e:
-            print(f"Unexpected error while fetching Twitch token: {e}")
-        return None
+    async def on_guild_role_update(self, before, after):
+        self.welcomes.invalidate(after.guild)
 
-    @tasks.loop(minutes=5)
-    async def check_twitch_streams(self):
-        """Check if followed streamers are live."""
-        if not self.twitch_token:
-            await self.get_twitch_token()
+    async def on_guild_update(self, before, after):
+        # Welcomes go to the system channel, which is a guild setting
+        if before.system_channel != after.system_channel:
+            self.welcomes.invalidate(after)
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                for streamer in self.tracked_streamers:
-                    if not streamer.strip():
-                        continue
+    async def on_guild_remove(self, guild):
+        self.welcomes.invalidate(guild)
 
-                    headers = {
-                        'Client-ID': TWITCH_CLIENT_ID,
-                        'Authorization': f'Bearer {self.twitch_token}'
-                    }
-
-                    # Get user ID
-                    async with session.get(
-                        'https://api.twitch.tv/helix/users',
-                        params={'login': streamer.strip()},
-                        headers=headers
-                    ) as response:
-                        if response.status == 401:  # Token expired
-                            await self.get_twitch_token()
-                            headers['Authorization'] = f'Bearer {self.twitch_token}'
-                            continue
-
-                        user_data = await response.json()
-                        if not user_data.get('data'):
-                            print(f"Streamer {streamer} not found.")
-                            continue
-                        user_id = user_data['data'][0]['id']
-
-                    # Check if stream is live
-                    async with session.get(
-                        'https://api.twitch.tv/helix/streams',
-                        params={'user_id': user_id},
-                        headers=headers
-                    ) as response:
-                        if response.status == 401:  # Token expired
-                            await self.get_twitch_token()
-                            headers['Authorization'] = f'Bearer {self.twitch_token}'
-                            continue
-
-                        stream_data = await response.json()
-                        is_live = bool(stream_data.get('data'))
-
-                        # Notify only if the streamer just went live
-                        if is_live and not self.streamer_status.get(streamer, False):
-                            stream_info = stream_data['data'][0]
-                            channel = self.get_channel(int(TWITCH_CHANNEL_ID))
-                            if channel:
-                                embed = discord.Embed(
-                                    title=f"🔴 {streamer} is now live!",
-                                    url=f"https://twitch.tv/{streamer}",
-                                    description=stream_info.get('title', 'No title'),
-                                    color=discord.Color.purple(),
-                                    timestamp=datetime.datetime.utcnow()
-                                )
-                                embed.add_field(name="🎮 Game", value=stream_info.get('game_name', 'Unknown'))
-                                embed.add_field(name="👥 Viewers", value=str(stream_info.get('viewer_count', 0)))
-                                embed.set_thumbnail(url=stream_info.get('thumbnail_url', '').format(width=440, height=248))
-                                await channel.send(
-                                    content=f"🔔 **{streamer}** just went live! Check them out at https://twitch.tv/{streamer}",
-                                    embed=embed
-                                )
-
-                        # Update the live status
-                        self.streamer_status[streamer] = is_live
+    def observe_command(self, interaction, status):
+        started_at = interaction.extras.get('started_at')
+        if started_at is None:
+            return
+        command = interaction.command.qualified_name if interaction.command else 'unknown'
+        self.metrics.observe('meowbot_command_seconds', time.perf_counter() - started_at, command=command, status=status)
 
-        except aiohttp.ClientError as e:
-            print(f"HTTP error while checking Twitch streams: {e}")
-        except Exception as e:
-            print(f"Unexpected error while checking Twitch streams: {e}")
+    async def on_app_command_completion(self, interaction, command):
+        self.observe_command(interaction, 'ok')
 
-class MeowCog(commands.Cog):
-    def __init__(self, bot: TwitchBot):
-        super().__init__()
-        self.bot = bot
+    async def on_message(self, message):
+        """Handle message events."""
+        with self.metrics.timer('meowbot_event_seconds', event='on_message'):
+            await self.handle_message(message)
 
-    async def cog_load(self):
-        guild = discord.Object(id=int(os.getenv('DISCORD_GUILD_ID')))
-        # Remove explicit registration, let discord.py auto-discover
-        pass
+    async def handle_message(self, message):
+        """Count meows and barks, queue the replies and run prefix commands."""
+        if message.author == self.user:
+            return
 
-    @app_commands.command(name="top_meows")
-    async def top_meows(self, interaction: discord.Interaction):
-        """Check the top meow users"""
-        try:
-            await interaction.response.defer()
-            
-            all_meow_counts = UserMeowCounts.select().order_by(UserMeowCounts.meow_count.desc())
+        guild_id = message.guild.id if message.guild else DM_GUILD_ID
+        # One pass over the message for every meow/bark keyword
+        counts = self.keywords.matcher_for(guild_id).count(message.content)
 
-            if not all_meow_counts:
-                await interaction.followup.send("No users have said 'meow' yet.")
-                return
+        # Handle meow counting
+        meow_count = counts.get('meow', 0)
+        if meow_count:
+            try:
+                self.counters.add_meows(guild_id, message.author.id, meow_count)
+                self.replies.add_meows(message.channel, guild_id, meow_count)
+            except Exception as e:
+                meow_log.error("Error handling meow count: %s", e)
 
-            embed = discord.Embed(
-                title="🏆 Top Meow Users",
-                description="Here are the top 10 meow users:",
-                color=discord.Color.blue()
-            )
+        # Handle woof/bark infractions
+        total_woof_bark_count = counts.get('bark', 0)
+        if total_woof_bark_count:
+            try:
+                self.counters.add_barks(guild_id, message.author.id, total_woof_bark_count)
+                self.replies.add_bark(message.channel, guild_id, message.author.id)
+            except Exception as e:
+                meow_log.error("Error handling bark count: %s", e)
 
-            for i, user_meow_count in enumerate(all_meow_counts[:10], 1):
-                try:
-                    # Try to get guild member first (for better mention rendering)
-                    guild_member = interaction.guild.get_member(user_meow_count.user_id)
-                    if guild_member:
-                        embed.add_field(
-                            name=f"{i}. {guild_member.display_name}",
-                            value=f"Meows: {user_meow_count.meow_count}",
-                            inline=False
-                        )
-                    else:
-                        # Fallback to fetching user
-                        user = await self.bot.fetch_user(user_meow_count.user_id)
-                        embed.add_field(
-                            name=f"{i}. {user.display_name}",
-                            value=f"Meows: {user_meow_count.meow_count}",
-                            inline=False
-                        )
-                except:
-                    # Final fallback - show user ID
-                    embed.add_field(
-                        name=f"{i}. User ID: {user_meow_count.user_id}",
-                        value=f"Meows: {user_meow_count.meow_count}",
-                        inline=False
-                    )
+        # Flush early if the buffer has grown past its threshold
+        if self.counters.should_flush and self._flush_task is None and time.monotonic() >= self._flush_retry_at:
+            self._flush_task = asyncio.create_task(self.flush_counters_early())
 
-            await interaction.followup.send(embed=embed)
-        except Exception as e:
-            print(f"Error in top_meows command: {e}")
-            await interaction.followup.send("❌ An error occurred while fetching top meows.", ephemeral=True)
+        await self.process_commands(message)
 
-    @app_commands.command(name="top_barks")
-    async def top_barks(self, interaction: discord.Interaction):
-        """Check the top bark users"""
+    async def flush_counters_now(self):
+        """Flush the counter buffer, logging instead of raising on failure; returns whether it succeeded."""
         try:
-            await interaction.response.defer()
-            
-            all_infractions = UserInfractions.select().order_by(UserInfractions.infractions.desc())
-
-            if not all_infractions:
-                await interaction.followup.send("No barks recorded yet.")
-                return
-
-            embed = discord.Embed(
-                title="😾 Top Bark/Woof Users",
-                description="Here are the top 10 users who need to remember we're cat people:",
-                color=discord.Color.red()
-            )
-
-            for i, user_infraction in enumerate(all_infractions[:10], 1):
-                try:
-                    # Try to get guild member first (for better mention rendering)
-                    guild_member = interaction.guild.get_member(user_infraction.user_id)
-                    if guild_member:
-                        embed.add_field(
-                            name=f"{i}. {guild_member.display_name}",
-                            value=f"Barks/Woofs: {user_infraction.infractions}",
-                            inline=False
-                        )
-                    else:
-                        # Fallback to fetching user
-                        user = await self.bot.fetch_user(user_infraction.user_id)
-                        embed.add_field(
-                            name=f"{i}. {user.display_name}",
-                            value=f"Barks/Woofs: {user_infraction.infractions}",
-                            inline=False
-                        )
-                except:
-                    # Final fallback - show user ID
-                    embed.add_field(
-                        name=f"{i}. User ID: {user_infraction.user_id}",
-                        value=f"Barks/Woofs: {user_infraction.infractions}",
-                        inline=False
-                    )
-
-            await interaction.followup.send(embed=embed)
+            await self.counters.flush()
+            return True
         except Exception as e:
-            print(f"Error in top_barks command: {e}")
-            await interaction.followup.send("❌ An error occurred while fetching top barks.", ephemeral=True)
+            meow_log.error("Error flushing meow/bark counts: %s", e)
+            return False
 
-    @app_commands.command(name="meow_count")
-    async def meow_count(self, interaction: discord.Interaction):
-        """Check your meow count"""
+    async def flush_counters_early(self):
         try:
-            await interaction.response.defer()
-            
-            user_meow_count = UserMeowCounts.get_or_none(user_id=interaction.user.id)
-
-            if user_meow_count:
-                embed = discord.Embed(
-                    title="😺 Your Meow Stats",
-                    description=f"You have meowed {user_meow_count.meow_count} times!",
-                    color=discord.Color.green()
-                )
-            else:
-                embed = discord.Embed(
-                    title="😿 Your Meow Stats",
-                    description="You haven't meowed yet! Try saying meow in chat!",
-                    color=discord.Color.orange()
-                )
+            if not await self.flush_counters_now():
+                # While the database is failing, leave retries to the periodic flush instead of one per message
+                self._flush_retry_at = time.monotonic() + self.settings.counter_flush_interval
+        finally:
+            self._flush_task = None
+
+    @tasks.loop(seconds=5)
+    async def flush_counters(self):
+        """Periodically write buffered meow/bark counts to the database."""
+        await self.flush_counters_now()
+
+    def twitch_token_is_fresh(self):
+        return self.twitch_token is not None and time.monotonic() < self.twitch_token_expires_at
+
+    async def get_twitch_token(self, stale_token=None):
+        """Return a valid Twitch app access token, fetching a new one when needed.
+
+        The token is refreshed ahead of its expires_in deadline. Concurrent
+        callers wait on the same refresh instead of each requesting a token.
+        Pass the token a request was rejected with as stale_token to force a
+        refresh after a 401.
+        """
+        if self.twitch_token_is_fresh() and self.twitch_token != stale_token:
+            return self.twitch_token
+
+        async with self._twitch_token_lock:
+            # Another caller may have refreshed the token while we waited
+            if self.twitch_token_is_fresh() and self.twitch_token != stale_token:
+                return self.twitch_token
+            return await self._request_twitch_token()
+
+    async def _request_twitch_token(self):
+        settings = self.settings
+        if not settings.twitch_client_id or not settings.twitch_secret:
+            twitch_log.error("Twitch credentials not found in .env file!")
+            return None
 
-            await interaction.followup.send(embed=embed)
+        try:
+            params = {
+                'client_id': settings.twitch_client_id.strip(),
+                'client_secret': settings.twitch_secret.strip(),
+                'grant_type': 'client_credentials'
+            }
+            async with self.twitch_session.post(settings.twitch_token_url, params=params) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    twitch_log.error("Failed to get Twitch token. Status: %s, Response: %s", response.status, error_text)
+                    return None
+
+                data = await response.json()
+                token = data.get('access_token')
+                if not token:
+                    twitch_log.error("No access token in response: %s", data)
+                    return None
+
+                self.twitch_token = token
+                expires_in = data.get('expires_in', 0)
+                self.twitch_token_expires_at = time.monotonic() + max(expires_in - TWITCH_TOKEN_REFRESH_MARGIN, 0)
+                twitch_log.info("Successfully obtained Twitch token")
+                return self.twitch_token
+        except aiohttp.ClientError as e:
+            twitch_log.error("HTTP error while fetching Twitch token: %s", e)
         except Exception as e:
-            print(f"Error in meow_count command: {e}")
-            await interaction.followup.send("❌ An error occurred while fetching your meow count.", ephemeral=True)
-
-class TwitchCog(commands.Cog):
-    def __init__(self, bot: TwitchBot):
-        super().__init__()
-        self.bot = bot
-
-    async def cog_load(self):
-        guild = discord.Object(id=int(os.getenv('DISCORD_GUILD_ID')))
-        # Remove explicit registration, let discord.py auto-discover
-        pass
-
-    @app_commands.command(name="check")
-    async def check(self, interaction: discord.Interaction):
-        """Check if the bot is working."""
-        await interaction.response.send_message("Bot is working!", ephemeral=True)
+            twitch_log.exception("Unexpected error while fetching Twitch token: %s", e)
+        return None
 
-    @app_commands.command(name="help")
-    async def help(self, interaction: discord.Interaction):
-        """Shows all available bot commands and their descriptions."""
+    async def helix_get(self, endpoint, params):
+        """GET a Helix endpoint, refreshing the token once on 401. Returns the 'data' list."""
+        token = await self.get_twitch_token()
+        for attempt in range(2):
+            headers = {
+                'Client-ID': self.settings.twitch_client_id,
+                'Authorization': f'Bearer {token}'
+            }
+            async with self.twitch_session.get(f'{self.settings.helix_url}/{endpoint}', params=params, headers=headers) as response:
+                if response.status == 401 and attempt == 0:  # Token revoked or expired early
+                    token = await self.get_twitch_token(stale_token=token)
+                    continue
+                response.raise_for_status()
+                data = await response.json()
+                return data.get('data', [])
+
+    def tracked_user_ids(self):
+        """Return the Twitch user ids of tracked streamers that have been resolved."""
+        if not self.twitch_user_ids:
+            return []
+        return [self.twitch_user_ids[login] for login in self.streamers.logins() if login in self.twitch_user_ids]
+
+    async def resolve_twitch_user_ids(self, logins):
+        """Map logins to Twitch user ids, looking up only logins not already cached."""
+        if self.twitch_user_ids is None:
+            self.twitch_user_ids = await self.repo.load_twitch_user_ids()
+
+        missing = [login for login in logins if login not in self.twitch_user_ids]
+        found = {}
+        for batch in chunked(missing, HELIX_BATCH_SIZE):
+            users = await self.helix_get('users', [('login', login) for login in batch])
+            found.update((user['login'].lower(), user['id']) for user in users)
+        if found:
+            self.twitch_user_ids.update(found)
+            await self.repo.save_twitch_user_ids(found)
+        for login in missing:
+            if login not in found:
+                twitch_log.warning("Streamer %s not found.", login)
+
+        return {login: self.twitch_user_ids[login] for login in logins if login in self.twitch_user_ids}
+
+    async def fetch_live_streams(self, user_ids):
+        """Return {user_id: stream_info} for the given ids that are currently live."""
+        live = {}
+        for batch in chunked(user_ids, HELIX_BATCH_SIZE):
+            params = [('user_id', user_id) for user_id in batch]
+            params.append(('first', str(HELIX_BATCH_SIZE)))
+            for stream in await self.helix_get('streams', params):
+                live[stream['user_id']] = stream
+        return live
+
+    @staticmethod
+    def parse_started_at(started_at):
+        if not started_at:
+            return None
+        return datetime.datetime.fromisoformat(started_at.replace('Z', '+00:00'))
+
+    @staticmethod
+    def embed_hash(embed):
+        return hashlib.sha1(json.dumps(embed.to_dict(), sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def format_viewers(viewers):
+        """Viewer count rounded down to two significant figures (tens at least), so small drifts don't change the embed."""
+        if viewers < 10:
+            return str(viewers)
+        step = max(10, 10 ** (len(str(viewers)) - 2))
+        return f"{viewers // step * step:,}+"
+
+    def build_stream_embed(self, login, stream_info, record):
+        streamer = stream_info.get('user_name') or login
         embed = discord.Embed(
-            title="🐱 Meow Bot Commands",
-            description="Here are all the commands you can use:",
-            color=discord.Color.blue()
-        )
-        
-        # General Commands
-        embed.add_field(
-            name="🔧 General Commands",
-            value=(
-                "`/check` - Check if the bot is working\n"
-                "`/help` - Show this help message\n"
-                "`/avatar [user]` - Show a user's avatar in full size\n"
-                "`/clear <amount>` - Delete messages (1-100, requires Manage Messages permission)"
-            ),
-            inline=False
-        )
-        
-        # Meow Commands
-        embed.add_field(
-            name="😺 Meow Commands",
-            value=(
-                "`/top_meows` - See the top 10 meow users\n"
-                "`/top_barks` - See the top 10 bark/woof users\n"
-                "`/meow_count` - Check your personal meow count"
-            ),
-            inline=False
-        )
-        
-        # Twitch Commands
-        embed.add_field(
-            name="🎮 Twitch Commands",
-            value=(
-                "`/add_streamer <name>` - Add a streamer to track\n"
-                "`/remove_streamer <name>` - Remove a streamer from tracking"
-            ),
-            inline=False
-        )
-        
-        # Utility Commands
-        embed.add_field(
-            name="⏰ Utility Commands",
-            value=(
-                "`/reminder <text> <time>` - Set a reminder\n"
-                "`/view_reminders` - View all your active reminders\n"
-                "`/confess <message>` - Send an anonymous confession\n"
-                "`/poll <question> <choices>` - Create a poll with reaction voting\n"
-                "`/randomquote` - Get a random quote from the quotes channel"
-            ),
-            inline=False
+            title=f"🔴 {streamer} is now live!",
+            url=f"https://twitch.tv/{login}",
+            description=stream_info.get('title', 'No title'),
+            color=discord.Color.purple(),
+            # Stream start rather than "now", so unchanged streams render identically
+            timestamp=self.parse_started_at(record.get('started_at')) or datetime.datetime.now(datetime.timezone.utc)
         )
-        
-        # Additional Info
-        embed.add_field(
-            name="ℹ️ Additional Info",
-            value=(
-                "• Say 'meow' in chat to increase the global meow counter!\n"
-                "• Saying 'woof' or 'bark' will give you infractions (we're cat people!)\n"
-                "• Confessions can only be used in the confessions channel\n"
-                "• Bot automatically tracks Twitch streamers and announces when they go live"
-            ),
-            inline=False
-        )
-        
-        embed.set_footer(text="Meow Bot - Keeping the server purr-fectly managed! 🐾")
-        
-        await interaction.response.send_message(embed=embed)
+        embed.add_field(name="🎮 Game", value=stream_info.get('game_name', 'Unknown'))
+        embed.add_field(name="👥 Viewers", value=self.format_viewers(stream_info.get('viewer_count') or 0))
+        embed.set_thumbnail(url=stream_info.get('thumbnail_url', '').format(width=440, height=248))
+        return embed
 
-    @app_commands.command(name="avatar")
-    async def avatar(self, interaction: discord.Interaction, user: discord.User = None):
-        """Show a user's avatar in full size."""
-        # Default to the command user if no user is specified
-        target_user = user or interaction.user
-        
-        # Get the avatar URL (supports animated GIFs)
-        avatar_url = target_user.display_avatar.url
-        
-        # Create embed with the avatar
+    def build_offline_embed(self, login, record):
+        streamer = record.get('user_name') or login
         embed = discord.Embed(
-            title=f"🖼️ {target_user.display_name}'s Avatar",
-            color=discord.Color.blue()
+            title=f"⚫ {streamer} was live",
+            url=f"https://twitch.tv/{login}",
+            description=record.get('title', 'Stream ended'),
+            color=discord.Color.dark_grey(),
+            timestamp=datetime.datetime.now(datetime.timezone.utc)
         )
-        embed.set_image(url=avatar_url)
-        embed.set_footer(text=f"User ID: {target_user.id}")
-        
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="clear")
-    @app_commands.describe(amount="Number of messages to delete (1-100)")
-    async def clear(self, interaction: discord.Interaction, amount: int):
-        """Clear/purge messages from the current channel."""
-        # Check if user has manage messages permission
-        if not interaction.user.guild_permissions.manage_messages:
-            await interaction.response.send_message("❌ You need the 'Manage Messages' permission to use this command.", ephemeral=True)
-            return
-        
-        # Check if bot has manage messages permission
-        if not interaction.guild.me.guild_permissions.manage_messages:
-            await interaction.response.send_message("❌ I need the 'Manage Messages' permission to delete messages.", ephemeral=True)
-            return
-        
-        # Validate amount
-        if amount < 1 or amount > 100:
-            await interaction.response.send_message("❌ Please specify a number between 1 and 100.", ephemeral=True)
-            return
-        
-        # Defer the response since purging might take a moment
-        await interaction.response.defer(ephemeral=True)
-        
-        try:
-            # Delete messages
-            deleted = await interaction.channel.purge(limit=amount)
-            
-            # Send confirmation (ephemeral so it doesn't clutter chat)
-            await interaction.followup.send(
-                f"✅ Successfully deleted {len(deleted)} message{'s' if len(deleted) != 1 else ''}.",
-                ephemeral=True
+        started_at = self.parse_started_at(record.get('started_at'))
+        if started_at:
+            minutes = int((datetime.datetime.now(datetime.timezone.utc) - started_at).total_seconds() // 60)
+            embed.add_field(name="⏱️ Duration", value=f"{minutes // 60}h {minutes % 60}m")
+        embed.add_field(name="📈 Peak viewers", value=str(record.get('peak_viewers', 0)))
+        if record.get('game_name'):
+            embed.add_field(name="🎮 Game", value=record['game_name'])
+        return embed
+
+    async def notify_live(self, login, stream_info, subscribers, record):
+        """Queue the go-live message for every (guild_id, channel_id, role_id) subscriber.
+
+        As each is delivered, on_go_live_sent adds it to record['messages'] as
+        {channel_id: (message_id, embed_hash)}.
+        """
+        streamer = stream_info.get('user_name') or login
+        embed = self.build_stream_embed(login, stream_info, record)
+        digest = self.embed_hash(embed)
+        messages = [
+            Outbox.message(
+                'go_live', channel_id=channel_id,
+                content=f"{f'<@&{role_id}> ' if role_id else ''}🔔 **{streamer}** just went live! Check them out at https://twitch.tv/{login}",
+                embed=embed,
+                allowed_mentions=discord.AllowedMentions(roles=[discord.Object(role_id)] if role_id else False),
+                login=login, stream_id=record['stream_id'], embed_hash=digest
             )
-        except discord.Forbidden:
-            await interaction.followup.send("❌ I don't have permission to delete messages in this channel.", ephemeral=True)
-        except discord.HTTPException as e:
-            await interaction.followup.send(f"❌ An error occurred: {e}", ephemeral=True)
-        except Exception as e:
-            print(f"Error in clear command: {e}")
-            await interaction.followup.send("❌ An unexpected error occurred while deleting messages.", ephemeral=True)
-
-    @app_commands.command(name="add_streamer")
-    async def add_streamer(self, interaction: discord.Interaction, streamer_name: str):
-        """Add a streamer to the tracked list."""
-        streamer_name = streamer_name.strip().lower()
-        if not streamer_name:
-            await interaction.response.send_message("Streamer name cannot be empty.", ephemeral=True)
-            return
-
-        if streamer_name in self.bot.tracked_streamers:
-            await interaction.response.send_message("This streamer is already being tracked.", ephemeral=True)
-            return
-
-        # Add the streamer to the tracked list
-        self.bot.tracked_streamers.append(streamer_name)
-
-        # Respond to the user
-        await interaction.response.send_message(f"✅ Now tracking streamer: **{streamer_name}**", ephemeral=True)
-
-        # Optionally, you can immediately check and notify if the newly added streamer is live
-        await self.check_and_notify_streamer(interaction, streamer_name)
+            for guild_id, channel_id, role_id in subscribers
+        ]
+        await self.outbox.enqueue(
+            messages, streamer_status=(login, record['stream_id'], record['started_at'], record['peak_viewers'])
+        )
 
-    @app_commands.command(name="remove_streamer")
-    async def remove_streamer(self, interaction: discord.Interaction, streamer_name: str):
-        """Remove a streamer from the tracked list."""
-        streamer_name = streamer_name.strip().lower()
-        if not streamer_name:
-            await interaction.response.send_message("Streamer name cannot be empty.", ephemeral=True)
+    async def go_live_wanted(self, message):
+        """Skip go-live posts for a stream that ended while they were queued."""
+        meta = message['payload']['meta']
+        record = (await self.load_streamer_status()).get(meta['login'])
+        return record is not None and record['stream_id'] == meta['stream_id']
+
+    async def on_go_live_sent(self, message, sent):
+        """Track a delivered go-live post so it is edited while the stream runs."""
+        meta = message['payload']['meta']
+        record = (await self.load_streamer_status()).get(meta['login'])
+        if record is None or record['stream_id'] != meta['stream_id']:
             return
-
-        if streamer_name not in self.bot.tracked_streamers:
-            await interaction.response.send_message("This streamer is not being tracked.", ephemeral=True)
+        notification = {message['channel_id']: (sent.id, meta['embed_hash'])}
+        record['messages'].update(notification)
+        await self.repo.save_stream_notifications(meta['login'], notification)
+
+    async def edit_notifications(self, login, record, embed):
+        """Edit login's notification messages to embed, skipping messages that already show it.
+
+        Edits take the outbox's per-channel and global buckets, a few at a time.
+        """
+        digest = self.embed_hash(embed)
+        stale = {channel_id: message_id for channel_id, (message_id, sent_hash) in record['messages'].items()
+                 if sent_hash != digest}
+        limit = asyncio.Semaphore(self.outbox.workers)
+
+        async def edit(channel_id, message_id):
+            channel = self.get_channel(channel_id)
+            if channel is None:
+                return
+            async with limit:
+                await self.outbox.throttle(('channel', channel_id))
+                try:
+                    with self.metrics.timer('meowbot_discord_request_seconds', call='message.edit'):
+                        await channel.get_partial_message(message_id).edit(embed=embed)
+                    edited[channel_id] = (message_id, digest)
+                except discord.NotFound:
+                    # Deleted by a moderator; stop tracking it
+                    record['messages'].pop(channel_id, None)
+                except discord.HTTPException as e:
+                    twitch_log.error("Error editing go-live for %s in channel %s: %s", login, channel_id, e)
+
+        edited = {}
+        await asyncio.gather(*(edit(channel_id, message_id) for channel_id, message_id in stale.items()))
+        record['messages'].update(edited)
+        return edited
+
+    async def load_streamer_status(self):
+        """Load last-known live status on first use, so a restart doesn't re-announce live streams."""
+        if self.streamer_status is None:
+            status = await self.repo.load_streamer_status()
+            if self.streamer_status is None:
+                self.streamer_status = status
+        return self.streamer_status
+
+    def is_new_stream(self, login, stream_info):
+        """True if stream_info is a broadcast we haven't announced yet."""
+        current = self.streamer_status.get(login)
+        if current is None:
+            return True
+        # A different stream id means they went offline and live again while we weren't looking
+        return bool(stream_info.get('id')) and bool(current['stream_id']) and stream_info['id'] != current['stream_id']
+
+    @staticmethod
+    def remember_stream_details(record, stream_info):
+        """Copy what the offline summary needs from the latest stream info; returns True if the stored status changed."""
+        for key in ('user_name', 'title', 'game_name'):
+            if stream_info.get(key):
+                record[key] = stream_info[key]
+        changed = False
+        if stream_info.get('id') and record['stream_id'] != stream_info['id']:
+            record['stream_id'] = stream_info['id']
+            changed = True
+        if stream_info.get('started_at') and record['started_at'] != stream_info['started_at']:
+            record['started_at'] = stream_info['started_at']
+            changed = True
+        viewers = stream_info.get('viewer_count') or 0
+        if viewers > record['peak_viewers']:
+            record['peak_viewers'] = viewers
+            changed = True
+        return changed
+
+    async def handle_stream_update(self, login, stream_info):
+        """Apply a live/offline observation for one streamer.
+
+        Announces go-lives, keeps the announcement's viewers/title/game current
+        while live, and swaps in a summary once the stream ends.
+        """
+        subscribers = self.streamers.subscribers(login)
+        if not subscribers:
             return
+        status = await self.load_streamer_status()
+        record = status.get(login)
 
-        # Remove the streamer from the tracked list
-        self.bot.tracked_streamers.remove(streamer_name)
-
-        await interaction.response.send_message(f"🚫 Stopped tracking streamer: **{streamer_name}**", ephemeral=True)
-
-    async def check_and_notify_streamer(self, interaction, streamer_name):
-        """Check if a specific streamer is live and notify the channel."""
-        headers = {
-            'Client-ID': TWITCH_CLIENT_ID,
-            'Authorization': f'Bearer {self.bot.twitch_token}'
-        }
-
-        # Get user ID
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                'https://api.twitch.tv/helix/users',
-                params={'login': streamer_name},
-                headers=headers
-            ) as response:
-                if response.status != 200:
-                    await interaction.response.send_message("Error checking streamer status.", ephemeral=True)
-                    return
-
-                user_data = await response.json()
-                if not user_data.get('data'):
-                    await interaction.response.send_message("Streamer not found.", ephemeral=True)
-                    return
-                user_id = user_data['data'][0]['id']
-
-            # Check if stream is live
-            async with session.get(
-                'https://api.twitch.tv/helix/streams',
-                params={'user_id': user_id},
-                headers=headers
-            ) as response:
-                if response.status != 200:
-                    await interaction.response.send_message("Error checking stream status.", ephemeral=True)
-                    return
-
-                stream_data = await response.json()
-                is_live = bool(stream_data.get('data'))
-
-                if is_live:
-                    stream_info = stream_data['data'][0]
-                    channel = self.bot.get_channel(int(TWITCH_CHANNEL_ID))
-                    if channel:
-                        embed = discord.Embed(
-                            title=f"🔴 {streamer_name} is now live!",
-                            url=f"https://twitch.tv/{streamer_name}",
-                            description=stream_info.get('title', 'No title'),
-                            color=discord.Color.purple(),
-                            timestamp=datetime.datetime.utcnow()
-                        )
-                        embed.add_field(name="🎮 Game", value=stream_info.get('game_name', 'Unknown'))
-                        embed.add_field(name="👥 Viewers", value=str(stream_info.get('viewer_count', 0)))
-                        embed.set_thumbnail(url=stream_info.get('thumbnail_url', '').format(width=440, height=248))
-                        await channel.send(
-                            content=f"🔔 **{streamer_name}** just went live! Check them out at https://twitch.tv/{streamer_name}",
-                            embed=embed
-                        )
-                    await interaction.response.send_message(f"✅ Notified that **{streamer_name}** is live.", ephemeral=True)
-                else:
-                    await interaction.response.send_message(f"**{streamer_name}** is not live right now.", ephemeral=True)
-
-    @app_commands.command(name="poll")
-    @app_commands.describe(
-        question="The poll question",
-        choices="Poll choices separated by commas (max 10 choices)"
-    )
-    async def poll(self, interaction: discord.Interaction, question: str, choices: str):
-        """Create a poll with reaction voting."""
-        # Parse choices by splitting on commas and cleaning up
-        choice_list = [choice.strip() for choice in choices.split(',') if choice.strip()]
-        
-        # Validate number of choices
-        if len(choice_list) < 2:
-            await interaction.response.send_message(
-                "❌ You need at least 2 choices for a poll. Separate choices with commas.",
-                ephemeral=True
-            )
-            return
-        
-        if len(choice_list) > 10:
-            await interaction.response.send_message(
-                "❌ Maximum 10 choices allowed per poll.",
-                ephemeral=True
-            )
-            return
-        
-        # Number emojis for reactions (using Discord's number emojis)
-        number_emojis = ["1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
-        
-        # Create the poll embed
-        embed = discord.Embed(
-            title="📊 Poll",
-            description=f"**{question}**",
-            color=discord.Color.blue(),
-            timestamp=datetime.datetime.utcnow()
-        )
-        
-        # Add choices to embed
-        choices_text = ""
-        for i, choice in enumerate(choice_list):
-            choices_text += f"{number_emojis[i]} {choice}\n"
-        
-        embed.add_field(
-            name="Choices:",
-            value=choices_text,
-            inline=False
-        )
-        
-        embed.set_footer(text=f"Poll created by {interaction.user.display_name}")
-        
-        # Send the poll
-        await interaction.response.send_message(embed=embed)
-        
-        # Get the message to add reactions
-        poll_message = await interaction.original_response()
-        
-        # Add reactions for each choice
-        for i in range(len(choice_list)):
-            try:
-                await poll_message.add_reaction(number_emojis[i])
-            except discord.HTTPException as e:
-                print(f"Error adding reaction {number_emojis[i]}: {e}")
-                # Continue adding other reactions even if one fails
-
-    @app_commands.command(name="randomquote")
-    async def randomquote(self, interaction: discord.Interaction):
-        """Get a random quote from the quotes channel."""
-        await interaction.response.defer()
-        
-        # Get the quotes channel ID from environment variables
-        if not QUOTES_CHANNEL_ID:
-            await interaction.followup.send(
-                "❌ Quotes channel not configured. Please contact an administrator.",
-                ephemeral=True
-            )
-            return
-            
-        quotes_channel = self.bot.get_channel(int(QUOTES_CHANNEL_ID))
-        
-        if not quotes_channel:
-            await interaction.followup.send(
-                "❌ Could not access the quotes channel. Make sure the bot has permission to read that channel.",
-                ephemeral=True
-            )
-            return
-        
-        try:
-            # Collect messages from the channel (limit to recent messages for performance)
-            messages = []
-            async for message in quotes_channel.history(limit=1000):
-                # Only include messages from bots (the quote bot)
-                if message.author.bot and (message.content or message.embeds):
-                    messages.append(message)
-            
-            if not messages:
-                await interaction.followup.send(
-                    "❌ No quotes found in the quotes channel.",
-                    ephemeral=True
-                )
+        if stream_info is None:
+            if record is None:
                 return
-            
-            # Pick a random message
-            import random
-            random_message = random.choice(messages)
-            
-            # Since quotes are images, extract and display the image directly
-            quote_embed = discord.Embed(
-                title="🎲 Random Quote",
-                color=discord.Color.blue()
-            )
-            
-            # Check if the message has embeds with images
-            if random_message.embeds:
-                original_embed = random_message.embeds[0]
-                
-                # Set the image from the original embed
-                if original_embed.image:
-                    quote_embed.set_image(url=original_embed.image.url)
-                elif original_embed.thumbnail:
-                    quote_embed.set_image(url=original_embed.thumbnail.url)
-                
-                # Add any text content if available
-                if original_embed.description:
-                    quote_embed.description = original_embed.description
-                elif original_embed.title:
-                    quote_embed.description = original_embed.title
-                
-                # Copy color if available
-                if original_embed.color:
-                    quote_embed.color = original_embed.color
-            
-            # If there's message content, add it
-            elif random_message.content:
-                quote_embed.description = random_message.content
-            else:
-                quote_embed.description = "*(Image quote)*"
-            
-            # Add footer with attribution
-            quote_embed.set_footer(
-                text=f"From #{quotes_channel.name} • Originally by {random_message.author.display_name}",
-                icon_url=random_message.author.display_avatar.url
-            )
-            
-            # Add timestamp
-            quote_embed.timestamp = random_message.created_at
-            
-            await interaction.followup.send(embed=quote_embed)
-            
-        except discord.Forbidden:
-            await interaction.followup.send(
-                "❌ I don't have permission to read messages from the quotes channel.",
-                ephemeral=True
-            )
-        except Exception as e:
-            print(f"Error in randomquote command: {e}")
-            await interaction.followup.send(
-                "❌ An error occurred while fetching a random quote.",
-                ephemeral=True
-            )
-
-class RemindersCog(commands.Cog):
-    def __init__(self, bot: TwitchBot):
-        super().__init__()
-        self.bot = bot
-        self.cal = parsedatetime.Calendar()
-        self.reminders = []
-        self.check_reminders.start()
-
-    async def cog_load(self):
-        guild = discord.Object(id=int(os.getenv('DISCORD_GUILD_ID')))
-        # Remove explicit registration, let discord.py auto-discover
-        pass
-
-    @app_commands.command(
-        name="reminder",
-        description="Set a reminder. Example: /reminder text:Take a break time:in 10 minutes"
-    )
-    @app_commands.describe(
-        text="What do you want to be reminded about?",
-        time="When should I remind you? (e.g. 'in 10 minutes', '2 hours', 'next Saturday')"
-    )
-    async def reminder(self, interaction: discord.Interaction, text: str, time: str):
-        """Set a reminder for yourself."""
-        await interaction.response.defer()
-        now = datetime.datetime.now()
-        # Try to parse the time string
-        time_struct, parse_status = self.cal.parse(time, now)
-        remind_time = datetime.datetime(*time_struct[:6])
-        if parse_status == 0 or remind_time <= now:
-            await interaction.followup.send(
-                "❌ Sorry, I couldn't understand the time frame. Try something like 'in 10 minutes', '2 hours', or 'next Saturday'.",
-                ephemeral=True
-            )
+            del status[login]
+            self.live_edited_at.pop(login, None)
+            if record['stream_id']:
+                self.ended_streams[login] = record['stream_id']
+            await self.repo.save_streamer_status(login, None, None)
+            await self.edit_notifications(login, record, self.build_offline_embed(login, record))
+            await self.repo.delete_stream_notifications(login)
             return
 
-        # Store the reminder
-        self.reminders.append({
-            "user_id": interaction.user.id,
-            "channel_id": interaction.channel_id,
-            "remind_time": remind_time,
-            "text": text
-        })
-
-        # Confirm to the user (post in chat, not private)
-        embed = discord.Embed(
-            title="⏰ Reminder Set!",
-            description=f"I'll remind {interaction.user.mention} to **{text}** at <t:{int(remind_time.timestamp())}:F>.",
-            color=discord.Color.gold()
-        )
-        await interaction.followup.send(embed=embed)
-
-    @app_commands.command(
-        name="view_reminders",
-        description="View all your active reminders"
-    )
-    async def view_reminders(self, interaction: discord.Interaction):
-        """View all your active reminders."""
-        await interaction.response.defer(ephemeral=True)
-        
-        # Filter reminders for the current user
-        user_reminders = [r for r in self.reminders if r["user_id"] == interaction.user.id]
-        
-        if not user_reminders:
-            await interaction.followup.send(
-                "📝 You don't have any active reminders set.",
-                ephemeral=True
-            )
+        if record is None and stream_info.get('id') and stream_info['id'] == self.ended_streams.get(login):
+            # Helix /streams lags EventSub: after stream.offline it can still list the stream for a while
             return
-        
-        # Sort reminders by time (earliest first)
-        user_reminders.sort(key=lambda x: x["remind_time"])
-        
-        embed = discord.Embed(
-            title="⏰ Your Active Reminders",
-            description=f"You have {len(user_reminders)} active reminder{'s' if len(user_reminders) != 1 else ''}:",
-            color=discord.Color.gold()
-        )
-        
-        for i, reminder in enumerate(user_reminders[:10], 1):  # Show max 10 reminders
-            remind_time = reminder["remind_time"]
-            text = reminder["text"]
-            
-            # Calculate time remaining
-            now = datetime.datetime.now()
-            time_diff = remind_time - now
-            
-            if time_diff.total_seconds() > 0:
-                # Future reminder
-                days = time_diff.days
-                hours, remainder = divmod(time_diff.seconds, 3600)
-                minutes, _ = divmod(remainder, 60)
-                
-                if days > 0:
-                    time_remaining = f"in {days}d {hours}h {minutes}m"
-                elif hours > 0:
-                    time_remaining = f"in {hours}h {minutes}m"
-                else:
-                    time_remaining = f"in {minutes}m"
-            else:
-                # Overdue reminder (shouldn't happen but just in case)
-                time_remaining = "⚠️ Overdue"
-            
-            embed.add_field(
-                name=f"{i}. {text[:50]}{'...' if len(text) > 50 else ''}",
-                value=f"📅 <t:{int(remind_time.timestamp())}:F>\n⏱️ {time_remaining}",
-                inline=False
-            )
-        
-        if len(user_reminders) > 10:
-            embed.add_field(
-                name="📝 Note",
-                value=f"Showing first 10 reminders. You have {len(user_reminders) - 10} more.",
-                inline=False
-            )
-        
-        embed.set_footer(text="Reminders are checked every 30 seconds")
-        
-        await interaction.followup.send(embed=embed, ephemeral=True)
-
-    @tasks.loop(seconds=30)
-    async def check_reminders(self):
-        now = datetime.datetime.now()
-        to_remove = []
-        for reminder in self.reminders:
-            if now >= reminder["remind_time"]:
-                user = self.bot.get_user(reminder["user_id"])
-                channel = self.bot.get_channel(reminder["channel_id"])
-                embed = discord.Embed(
-                    title="🔔 Reminder!",
-                    description=f"You asked to be reminded: **{reminder['text']}**",
-                    color=discord.Color.purple(),
-                    timestamp=datetime.datetime.utcnow()
-                )
-                if channel:
-                    await channel.send(content=f"{user.mention}", embed=embed)
-                elif user:
-                    try:
-                        await user.send(embed=embed)
-                    except:
-                        pass
-                to_remove.append(reminder)
-        for r in to_remove:
-            self.reminders.remove(r)
-
-    @check_reminders.before_loop
-    async def before_reminders(self):
-        await self.bot.wait_until_ready()
-
-class ConfessionButtons(discord.ui.View):
-    def __init__(self, bot):
-        super().__init__(timeout=None)  # Persistent view
-        self.bot = bot
 
-    @discord.ui.button(label="Submit a confession!", style=discord.ButtonStyle.blurple, emoji="💭")
-    async def submit_confession(self, interaction: discord.Interaction, button: discord.ui.Button):
-        """Button to submit a new confession"""
-        # Check if we're in the confessions channel
-        if str(interaction.channel_id) != str(CONFESS_CHANNEL_ID):
-            await interaction.response.send_message(
-                "❌ You can only submit confessions in the confessions channel.",
-                ephemeral=True
+        if self.is_new_stream(login, stream_info):
+            self.ended_streams.pop(login, None)
+            # Mark live before the sends so a concurrent poll or event doesn't notify twice
+            record = status[login] = {
+                'stream_id': stream_info.get('id'),
+                'started_at': stream_info.get('started_at'),
+                'peak_viewers': 0,
+                'messages': {}
+            }
+            self.remember_stream_details(record, stream_info)
+            started_at = self.parse_started_at(record['started_at'])
+            histogram = self.poll_schedule.record_go_live(
+                login, started_at.replace(tzinfo=None) if started_at else datetime.datetime.utcnow()
             )
-            return
-        
-        # Create a modal for confession input
-        modal = ConfessionModal(self.bot)
-        await interaction.response.send_modal(modal)
-
-class ConfessionModal(discord.ui.Modal):
-    def __init__(self, bot):
-        super().__init__(title="Submit Anonymous Confession")
-        self.bot = bot
-
-    confession_text = discord.ui.TextInput(
-        label="Your Confession",
-        placeholder="Type your anonymous confession here...",
-        style=discord.TextStyle.paragraph,
-        max_length=2000,
-        required=True
-    )
-
-    async def on_submit(self, interaction: discord.Interaction):
-        # Get the confession cog to access the counter methods
-        confess_cog = self.bot.get_cog('ConfessCog')
-        if not confess_cog:
-            await interaction.response.send_message("❌ Error: Confession system not available.", ephemeral=True)
+            await self.repo.save_streamer_schedule(login, histogram, self.poll_schedule.last_live[login])
+            await self.repo.delete_stream_notifications(login)
+            try:
+                # Marked live in the database together with the queued posts
+                await self.notify_live(login, stream_info, subscribers, record)
+            except Exception:
+                # Nothing was stored, so let the next poll or event announce it
+                if status.get(login) is record:
+                    del status[login]
+                raise
+            self.live_edited_at[login] = time.monotonic()
             return
 
-        # Increment confession counter and save to database
-        current_count = confess_cog.increment_confession_count()
-        
-        # Send anonymous confession to the confessions channel
-        confess_channel = self.bot.get_channel(int(CONFESS_CHANNEL_ID))
-        if confess_channel:
-            embed = discord.Embed(
-                title=f"💭 Anonymous Confession (#{current_count})",
-                description=self.confession_text.value,
-                color=discord.Color.blurple()
-            )
-            
-            # Add the buttons to the confession embed
-            view = ConfessionButtons(self.bot)
-            await confess_channel.send(embed=embed, view=view)
-        else:
-            await interaction.response.send_message(
-                "❌ Confessions channel not found.",
-                ephemeral=True
-            )
+        # Still live: refresh the announcement if anything visible changed, at most every GO_LIVE_EDIT_INTERVAL
+        if self.remember_stream_details(record, stream_info):
+            await self.repo.save_streamer_status(login, record['stream_id'], record['started_at'], record['peak_viewers'])
+        if time.monotonic() - self.live_edited_at.get(login, float('-inf')) < GO_LIVE_EDIT_INTERVAL:
             return
+        edited = await self.edit_notifications(login, record, self.build_stream_embed(login, stream_info, record))
+        if edited:
+            self.live_edited_at[login] = time.monotonic()
+            await self.repo.save_stream_notifications(login, edited)
+
+    async def handle_stream_online_event(self, login, user_id, event):
+        """EventSub stream.online: fetch title/game/viewers for the embed, then notify."""
+        stream_info = None
+        try:
+            stream_info = (await self.fetch_live_streams([user_id])).get(user_id)
+        except aiohttp.ClientError as e:
+            twitch_log.error("HTTP error while fetching stream info for %s: %s", login, e)
+        # Helix can lag the event by a few seconds; notify with what the event carries
+        await self.handle_stream_update(login, stream_info or {
+            'id': event.get('id'), 'started_at': event.get('started_at'), 'user_id': user_id, 'user_login': login
+        })
 
-        # Log confession with username to the log channel
-        log_channel = self.bot.get_channel(int(CONFESS_LOG_CHANNEL_ID))
-        if log_channel:
-            log_embed = discord.Embed(
-                title=f"Confession Log (#{current_count})",
-                description=self.confession_text.value,
-                color=discord.Color.red()
-            )
-            log_embed.set_footer(text=f"User: {interaction.user} ({interaction.user.id})")
-            await log_channel.send(embed=log_embed)
-
-        await interaction.response.send_message(
-            "✅ Your confession has been sent anonymously.",
-            ephemeral=True
-        )
+    @tasks.loop(minutes=5)
+    async def check_twitch_streams(self):
+        """Check the followed streamers that are due (EventSub-covered ones only to reconcile)."""
+        try:
+            logins = self.streamers.logins()
+            schedule = self.poll_schedule
+            now = time.monotonic()
+            eventsub_active = self.eventsub and self.eventsub.running
+            if eventsub_active:
+                # A streamer whose subscription lapsed goes back to its normal cadence straight away
+                user_ids = self.twitch_user_ids or {}
+                for login in logins:
+                    if schedule.intervals.get(login, (0, None))[1] == 'eventsub' and not self.eventsub.covers(user_ids.get(login)):
+                        schedule.forget(login)
+            due, early = schedule.due(logins, now)
+            if not due:
+                return
+            # Requests are billed per call, not per id: fill the last batch with streamers due soon
+            room = -len(due) % HELIX_BATCH_SIZE
+            due += early[:room]
 
-class ConfessCog(commands.Cog):
-    def __init__(self, bot: TwitchBot):
-        super().__init__()
-        self.bot = bot
-        # Load confession count from database on startup
-        self.load_confession_count()
+            with self.metrics.timer('meowbot_event_seconds', event='check_twitch_streams'):
+                await self.poll_streamers(due, now, eventsub_active)
 
-    def load_confession_count(self):
-        """Load the current confession count from database."""
-        try:
-            # Get or create the confession counter record
-            counter, created = ConfessionCounter.get_or_create(id=1, defaults={'count': 0})
-            self.confession_count = counter.count
-            print(f"Loaded confession count: {self.confession_count}")
+        except aiohttp.ClientError as e:
+            twitch_log.error("HTTP error while checking Twitch streams: %s", e)
         except Exception as e:
-            print(f"Error loading confession count: {e}")
-            self.confession_count = 0
-
-    def increment_confession_count(self):
-        """Increment and save the confession count to database."""
+            twitch_log.exception("Unexpected error while checking Twitch streams: %s", e)
+
+    async def poll_streamers(self, due, now, eventsub_active):
+        """Fetch live status for the due logins and apply it, rescheduling each one."""
+        schedule = self.poll_schedule
+        # Each streamer is polled once however many guilds follow them:
+        # one /users call per 100 unknown logins, then one /streams call per 100 streamers
+        user_ids = await self.resolve_twitch_user_ids(due)
+        if eventsub_active:
+            # Every tracked streamer, not just the due ones, or the rest would be unsubscribed
+            await self.eventsub.sync(self.tracked_user_ids())
+        live_streams = await self.fetch_live_streams(list(user_ids.values()))
+        schedule.requests += -(-len(user_ids) // HELIX_BATCH_SIZE)
+
+        utcnow = datetime.datetime.utcnow()
+        for login, user_id in user_ids.items():
+            stream_info = live_streams.get(user_id)
+            await self.handle_stream_update(login, stream_info)
+            pushed = eventsub_active and self.eventsub.covers(user_id)
+            schedule.checked(login, stream_info is not None, now, utcnow, pushed)
+        for login in set(due) - set(user_ids):
+            # Unknown login: no point asking again every minute
+            schedule.checked(login, False, now, utcnow)
+
+@commands.command(name="reload", hidden=True)
+@commands.is_owner()
+async def reload_extensions(ctx, *names):
+    """Reload cog extensions (all of them by default) without dropping the gateway connection."""
+    bot = ctx.bot
+    reloaded = []
+    for name in names or EXTENSIONS:
+        extension = name if name.startswith('cogs.') else f'cogs.{name}'
         try:
-            self.confession_count += 1
-            # Update the database
-            counter, created = ConfessionCounter.get_or_create(id=1, defaults={'count': self.confession_count})
-            counter.count = self.confession_count
-            counter.save()
-            return self.confession_count
-        except Exception as e:
-            print(f"Error updating confession count: {e}")
-            return self.confession_count
-
-    async def cog_load(self):
-        guild = discord.Object(id=int(os.getenv('DISCORD_GUILD_ID')))
-        # Remove explicit registration, let discord.py auto-discover
-        pass
-
-    @app_commands.command(
-        name="confess",
-        description="Send an anonymous confession to the confessions channel."
-    )
-    @app_commands.describe(
-        message="What do you want to confess?"
-    )
-    async def confess(self, interaction: discord.Interaction, message: str):
-        # Only allow in the confessions channel
-        if str(interaction.channel_id) != str(CONFESS_CHANNEL_ID):
-            await interaction.response.send_message(
-                "❌ You can only use this command in the confessions channel.",
-                ephemeral=True
-            )
+            await bot.reload_extension(extension)
+            reloaded.append(extension)
+        except commands.ExtensionError as e:
+            log.error("Error reloading %s: %s", extension, e)
+            await ctx.send(f"❌ Couldn't reload `{extension}`: {e}")
+    if reloaded:
+        # Only calls Discord if a reload changed the commands
+        await bot.sync_command_tree()
+        await ctx.send(f"🔄 Reloaded {', '.join(f'`{name}`' for name in reloaded)}")
+
+def create_bot(settings=None):
+    """Build a TwitchBot from settings (read from the environment if not given).
+
+    Nothing connects here: the database is opened by the first query in
+    setup_hook and Discord by bot.start().
+    """
+    settings = settings or Settings.from_env()
+    init_database(settings.database_path)
+    return TwitchBot(settings)
+
+async def run_bot(bot, token):
+    """Run the bot until it stops, always through close() so buffered counts and sessions are flushed.
+
+    Ctrl+C cancels this task and the `async with` closes the bot on the way
+    out; SIGTERM (systemd, docker stop) closes it the same way instead of
+    killing the process.
+    """
+    loop = asyncio.get_running_loop()
+    closing = []
+
+    def on_sigterm():
+        if not closing:
+            log.info("🛑 Received SIGTERM, shutting down")
+            closing.append(asyncio.create_task(bot.close()))
+
+    try:
+        loop.add_signal_handler(signal.SIGTERM, on_sigterm)
+    except NotImplementedError:
+        pass  # No loop signal handlers on Windows; Ctrl+C still closes cleanly
+    async with bot:
+        await bot.start(token)
+    # start() returns as soon as the gateway closes; let close() finish writing first
+    if closing:
+        await closing[0]
+
+def main():
+    settings = Settings.from_env()
+    listener = setup_logging(settings.log_level, json_output=settings.log_format == 'json')
+    try:
+        if not settings.discord_bot_token:
+            log.error("DISCORD_BOT_TOKEN not found in .env file!")
             return
-
-        # Increment confession counter and save to database
-        current_count = self.increment_confession_count()
-        
-        # Send anonymous confession to the confessions channel
-        confess_channel = self.bot.get_channel(int(CONFESS_CHANNEL_ID))
-        if confess_channel:
-            embed = discord.Embed(
-                title=f"💭 Anonymous Confession (#{current_count})",
-                description=message,
-                color=discord.Color.blurple()
-            )
-            # Add the buttons to the confession embed
-            view = ConfessionButtons(self.bot)
-            await confess_channel.send(embed=embed, view=view)
-        else:
-            await interaction.response.send_message(
-                "❌ Confessions channel not found.",
-                ephemeral=True
-            )
-            return
-
-        # Log confession with username to the log channel
-        log_channel = self.bot.get_channel(int(CONFESS_LOG_CHANNEL_ID))
-        if log_channel:
-            log_embed = discord.Embed(
-                title=f"Confession Log (#{current_count})",
-                description=message,
-                color=discord.Color.red()
-            )
-            log_embed.set_footer(text=f"User: {interaction.user} ({interaction.user.id})")
-            await log_channel.send(embed=log_embed)
-
-        await interaction.response.send_message(
-            "✅ Your confession has been sent anonymously.",
-            ephemeral=True
-        )
+        log.info("Starting bot...")
+        bot = create_bot(settings)
+        asyncio.run(run_bot(bot, settings.discord_bot_token))
+    except KeyboardInterrupt:
+        log.info("🛑 Bot stopped by user (Ctrl+C)")
+    except discord.LoginFailure as e:
+        log.error("Failed to log in: %s", e)
+    except Exception as e:
+        log.exception("An error occurred while starting the bot: %s", e)
+    finally:
+        log.info("Bot process ended")
+        # Write out whatever is still queued before the process exits
+        listener.stop()
 
 if __name__ == "__main__":
-    if not DISCORD_BOT_TOKEN:
-        print("Error: DISCORD_BOT_TOKEN not found in .env file!")
-    else:
-        try:
-            print("Starting bot...")
-            bot = TwitchBot()
-            asyncio.run(bot.start(DISCORD_BOT_TOKEN))
-        except KeyboardInterrupt:
-            print("\n🛑 Bot stopped by user (Ctrl+C)")
-        except discord.LoginFailure as e:
-            print(f"Failed to log in: {e}")
-        except Exception as e:
-            print(f"An error occurred while starting the bot: {e}")
-        finally:
-            print("Bot process ended")
+    # Run through the importable module, so cogs importing meowbot share its state
+    import meowbot
+    meowbot.main()
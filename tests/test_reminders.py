@@ -0,0 +1,179 @@
+"""Tests for the reminder cron parser, recurrence and timing wheel."""
+import datetime
+import random
+
+import pytest
+
+from cogs.reminders import CronSchedule, ReminderRecord, ReminderScheduler, next_occurrence
+
+# 2030-01-01 is a Tuesday
+START = datetime.datetime(2030, 1, 1, 0, 0)
+
+
+def at(*args):
+    return datetime.datetime(*args)
+
+
+def reminder(reminder_id, remind_time, user_id=1):
+    return ReminderRecord(reminder_id, user_id, 100, remind_time, f'reminder {reminder_id}')
+
+
+# CronSchedule parsing
+
+def test_cron_parses_lists_ranges_and_steps():
+    cron = CronSchedule('*/15 9-17 1,15 1-12/3 1-5')
+    assert cron.minutes == [0, 15, 30, 45]
+    assert cron.hours == list(range(9, 18))
+    assert cron.days == [1, 15]
+    assert cron.months == [1, 4, 7, 10]
+    # Monday-Friday in Python's weekday() numbering
+    assert cron.weekdays == {0, 1, 2, 3, 4}
+
+
+def test_cron_step_within_a_range():
+    assert CronSchedule('0 0 1-10/3 * *').days == [1, 4, 7, 10]
+
+
+@pytest.mark.parametrize('expression', [
+    '* * * *',          # Too few fields
+    '* * * * * *',      # Too many
+    '60 * * * *',       # Minute out of range
+    '0 24 * * *',       # Hour out of range
+    '0 0 0 * *',        # Days start at 1
+    '0 0 * 13 *',       # Month out of range
+    '0 0 * * 8',        # Weekday out of range
+    '0 0 10-5 * *',     # Backwards range
+    'x * * * *',        # Not a number
+])
+def test_cron_rejects_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_cron_sunday_is_0_or_7():
+    saturday = at(2030, 1, 5, 12, 0)
+    assert CronSchedule('0 9 * * 0').next_after(saturday) == at(2030, 1, 6, 9, 0)
+    assert CronSchedule('0 9 * * 7').next_after(saturday) == at(2030, 1, 6, 9, 0)
+
+
+def test_cron_next_after_is_strictly_later():
+    cron = CronSchedule('0 9 * * *')
+    assert cron.next_after(at(2030, 1, 1, 9, 0)) == at(2030, 1, 2, 9, 0)
+    assert cron.next_after(at(2030, 1, 1, 8, 59, 30)) == at(2030, 1, 1, 9, 0)
+
+
+def test_cron_restricted_day_fields_match_either():
+    # The 13th, or any Friday
+    cron = CronSchedule('0 0 13 * 5')
+    assert cron.next_after(START) == at(2030, 1, 4)             # Friday the 4th
+    assert cron.next_after(at(2030, 1, 11)) == at(2030, 1, 13)  # Sunday the 13th
+    assert cron.next_after(at(2030, 1, 13)) == at(2030, 1, 18)  # Next Friday
+
+
+def test_cron_unrestricted_day_field_requires_the_other():
+    # Day of month is '*', so only Mondays match
+    assert CronSchedule('0 0 * * 1').next_after(START) == at(2030, 1, 7)
+    # Weekday is '*', so only the 13th matches
+    assert CronSchedule('0 0 13 * *').next_after(START) == at(2030, 1, 13)
+
+
+def test_cron_february_29_waits_for_a_leap_year():
+    assert CronSchedule('0 12 29 2 *').next_after(at(2030, 3, 1)) == at(2032, 2, 29, 12, 0)
+
+
+def test_cron_impossible_date_never_matches():
+    assert CronSchedule('0 0 30 2 *').next_after(START) is None
+
+
+# next_occurrence
+
+def test_daily_repeat_moves_one_interval_on():
+    remind_time = at(2030, 1, 1, 9, 0)
+    assert next_occurrence('daily', remind_time, remind_time) == at(2030, 1, 2, 9, 0)
+
+
+def test_repeat_skips_occurrences_missed_while_offline():
+    remind_time = at(2030, 1, 1, 9, 0)
+    assert next_occurrence('daily', remind_time, at(2030, 1, 3, 10, 0)) == at(2030, 1, 4, 9, 0)
+    assert next_occurrence('weekly', remind_time, at(2030, 1, 20)) == at(2030, 1, 22, 9, 0)
+
+
+def test_cron_repeat_uses_the_schedule():
+    friday = at(2030, 1, 4, 9, 0)
+    assert next_occurrence('0 9 * * 1-5', friday, friday) == at(2030, 1, 7, 9, 0)
+
+
+# ReminderScheduler
+
+def test_scheduler_pops_each_level_at_its_time():
+    scheduler = ReminderScheduler(START)
+    # One reminder per wheel level: seconds, minutes, hours, days, months, years ahead
+    offsets = [5, 100, 5_000, 300_000, 20_000_000, 400_000_000]
+    for reminder_id, offset in enumerate(offsets):
+        scheduler.add(reminder(reminder_id, START + datetime.timedelta(seconds=offset)))
+
+    for reminder_id, offset in enumerate(offsets):
+        due_at = START + datetime.timedelta(seconds=offset)
+        assert scheduler.next_due() <= due_at
+        assert scheduler.pop_due(due_at - datetime.timedelta(seconds=1)) == []
+        assert [r.id for r in scheduler.pop_due(due_at)] == [reminder_id]
+    assert len(scheduler) == 0
+    assert scheduler.next_due() is None
+
+
+def test_scheduler_matches_a_brute_force_schedule():
+    rng = random.Random(7)
+    scheduler = ReminderScheduler(START)
+    pending = {}
+    for reminder_id in range(2_000):
+        remind_time = START + datetime.timedelta(seconds=rng.randrange(10 * 86_400))
+        pending[reminder_id] = remind_time
+        scheduler.add(reminder(reminder_id, remind_time))
+
+    now = START
+    while pending:
+        now += datetime.timedelta(seconds=rng.randrange(1, 3_600))
+        expected = sorted(reminder_id for reminder_id, remind_time in pending.items() if remind_time <= now)
+        due = scheduler.pop_due(now)
+        assert sorted(r.id for r in due) == expected
+        assert [r.remind_time for r in due] == sorted(r.remind_time for r in due)
+        for reminder_id in expected:
+            del pending[reminder_id]
+        if pending:
+            assert scheduler.next_due() <= min(pending.values())
+
+
+def test_scheduler_cancel():
+    scheduler = ReminderScheduler(START)
+    for reminder_id in range(3):
+        scheduler.add(reminder(reminder_id, START + datetime.timedelta(minutes=reminder_id + 1), user_id=9))
+
+    removed = scheduler.remove(1)
+    assert removed.id == 1
+    assert scheduler.remove(1) is None
+    assert scheduler.get(1) is None
+    assert [r.id for r in scheduler.for_user(9)] == [0, 2]
+    assert [r.id for r in scheduler.pop_due(START + datetime.timedelta(hours=1))] == [0, 2]
+    assert scheduler.for_user(9) == []
+
+
+def test_scheduler_cancel_after_cascading_to_a_finer_level():
+    scheduler = ReminderScheduler(START)
+    scheduler.add(reminder(1, START + datetime.timedelta(seconds=5_000)))
+    # Passing the start of its wide slot moves it down a level without making it due
+    assert scheduler.pop_due(START + datetime.timedelta(seconds=4_900)) == []
+    assert scheduler.remove(1) is not None
+    assert scheduler.pop_due(START + datetime.timedelta(days=1)) == []
+
+
+def test_scheduler_delivers_overdue_reminders_at_once():
+    scheduler = ReminderScheduler(START)
+    scheduler.wakeup.clear()
+    scheduler.add(reminder(1, START - datetime.timedelta(hours=2)))
+    scheduler.add(reminder(2, START - datetime.timedelta(days=3)))
+    scheduler.add(reminder(3, START + datetime.timedelta(hours=1)))
+
+    assert scheduler.wakeup.is_set()
+    assert scheduler.next_due() <= START
+    assert [r.id for r in scheduler.pop_due(START)] == [2, 1]
+    assert [r.id for r in scheduler.pop_due(START + datetime.timedelta(hours=1))] == [3]